@@ -1,4 +1,8 @@
 from .__version__ import __version__
+from .benchmark import benchmark
 from .condition import (Condition, Newer, Path, Previous, condition, newer,
                         path, previous)
-from .cricri import MetaServerTestState, MetaTestState, TestServer, TestState
+from .cricri import (MetaServerTestState, MetaTestState, TestServer, TestState,
+                     current_scenario)
+from .duration import DurationBudgetWarning, max_duration
+from .history import RunHistory
@@ -3,6 +3,9 @@ A collection of functions to perform operation on containers.
 """
 
 
+import itertools
+import math
+import random
 from collections import defaultdict
 
 
@@ -80,6 +83,38 @@ def all_longer_path(graph, start, path, sub_path_explored, out):
             out.append(tuple(e[0] for e in path) + (path[-1][-1],))
 
 
+def bounded_walk(graph, start, max_length):
+    """
+    Find all pathes through graph containing *max_length* nodes or
+    ending on a node without next node before.
+
+    Pathes which are a prefix of an other path are not returned, so each
+    path up to *max_length* nodes is traveled by a returned path.
+
+    >>> bounded_walk({'A': ['A', 'B'], 'B': []}, 'A', 3)
+    [('A', 'A', 'A'), ('A', 'A', 'B'), ('A', 'B')]
+
+    graph - must be a dict mappinp graph node to next graph node.
+    start - must be a first graph node
+    max_length - maximal number of nodes per path.
+    """
+    if max_length < 1:
+        raise ValueError('max_length must be greater or equal 1')
+
+    pathes = []
+    stack = [(start,)]
+    while stack:
+        path = stack.pop()
+        next_nodes = graph[path[-1]]
+        if len(path) == max_length or not next_nodes:
+            pathes.append(path)
+        else:
+            stack.extend(path + (next_node,)
+                         for next_node
+                         in reversed(next_nodes))
+    return pathes
+
+
 def walk(graph, start, nb_loop=0):
     """
     Find all longer pathes through graph.
@@ -110,3 +145,152 @@ def walk(graph, start, nb_loop=0):
         longer_pathes = insert_loop(longer_pathes, loops_from_start)
 
     return longer_pathes
+
+
+def coverage(path):
+    """
+    Return the set of nodes and edges - (node, next_node) tuples -
+    traveled by *path*.
+
+    >>> sorted(coverage(('A', 'B', 'A')), key=str)
+    [('A', 'B'), ('B', 'A'), 'A', 'B']
+    """
+    covered = set(path)
+    covered.update(zip(path, path[1:]))
+    return covered
+
+
+def count_coverage(covered):
+    """
+    Return the number of nodes and the number of edges in *covered*.
+
+    >>> count_coverage({'A', 'B', ('A', 'B')})
+    (2, 1)
+    """
+    nb_edges = sum(1 for element in covered if isinstance(element, tuple))
+    return len(covered) - nb_edges, nb_edges
+
+
+def graph_coverage(graph, start):
+    """
+    Return the set of nodes and edges reachable from *start*.
+    """
+    covered = {start}
+    nodes = [start]
+    while nodes:
+        node = nodes.pop()
+        for next_node in graph[node]:
+            covered.add((node, next_node))
+            if next_node not in covered:
+                covered.add(next_node)
+                nodes.append(next_node)
+    return covered
+
+
+def greedy_cover(pathes, cost, budget):
+    """
+    Select pathes from *pathes* whose total cost does not exceed *budget*.
+
+    The path adding the most uncovered nodes and edges per cost unit is
+    selected first. When no path adds coverage, the cheapest remaining
+    pathes are selected while the budget allows it.
+
+    cost - callable returning the expected cost of a path.
+    budget - maximal total cost of selected pathes.
+    """
+    remaining = {path: cost(path) for path in pathes}
+    covered = set()
+    selected = []
+
+    while remaining:
+        best_path = None
+        best_ratio = 0
+        for path, path_cost in remaining.items():
+            if path_cost > budget:
+                continue
+            new = len(coverage(path) - covered)
+            ratio = new / path_cost if path_cost > 0 else float('inf')
+            if new and ratio > best_ratio:
+                best_path, best_ratio = path, ratio
+
+        if best_path is None:
+            break
+
+        budget -= remaining.pop(best_path)
+        covered |= coverage(best_path)
+        selected.append(best_path)
+
+    for path, path_cost in sorted(remaining.items(), key=lambda item: item[1]):
+        if path_cost <= budget:
+            budget -= path_cost
+            selected.append(path)
+
+    return selected
+
+
+def iter_random_walk(graph, start, generator, weights=None):
+    """
+    Yield the nodes of a random walk through graph starting from *start*.
+    The walk stops on a node without next node having a positive weight.
+
+    graph - must be a dict mappinp graph node to next graph node.
+    start - must be a first graph node
+    generator - random.Random instance choosing the next nodes.
+    weights - dict mapping (node, next_node) to the relative probability
+              to choose next_node from node, 1 by default.
+    """
+    if weights is None:
+        weights = {}
+
+    node = start
+    yield node
+    while True:
+        next_nodes = graph[node]
+        next_weights = [weights.get((node, next_node), 1)
+                        for next_node in next_nodes]
+        if not any(next_weights):
+            return
+        node = generator.choices(next_nodes, next_weights)[0]
+        yield node
+
+
+def random_walk(graph, start, nb_walk, max_length, seed=0, weights=None):
+    """
+    Return distinct pathes found by *nb_walk* random walks through graph.
+
+    Each walk starts from *start* and stops on a node without next node
+    having a positive weight or when it contains *max_length* nodes.
+
+    graph - must be a dict mappinp graph node to next graph node.
+    start - must be a first graph node
+    nb_walk - number of random walks.
+    max_length - maximal number of nodes per path.
+    seed - seed of the random generator, the same seed gives the
+           same pathes.
+    weights - dict mapping (node, next_node) to the relative probability
+              to choose next_node from node, 1 by default.
+    """
+    if max_length < 1:
+        raise ValueError('max_length must be greater or equal 1')
+
+    generator = random.Random(seed)
+    pathes = {}
+    for _ in range(nb_walk):
+        path = itertools.islice(
+            iter_random_walk(graph, start, generator, weights), max_length)
+        pathes.setdefault(tuple(path), None)
+
+    return list(pathes)
+
+
+def percentile(sorted_values, rank):
+    """
+    Return the nearest-rank percentile of *sorted_values*.
+
+    >>> percentile([1, 2, 3, 4], 0.5)
+    2
+    >>> percentile([1, 2, 3, 4], 0.99)
+    4
+    """
+    index = max(math.ceil(rank * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
@@ -0,0 +1,145 @@
+"""
+Micro-benchmark input and test methods in the state reached by the
+scenario and compare their speed with a stored baseline.
+"""
+
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from .algo import percentile
+
+BenchmarkSpec = namedtuple('BenchmarkSpec', 'repeat warmup tolerance')
+
+BenchmarkResult = namedtuple('BenchmarkResult',
+                             'name repeat ops_per_sec p50 p90 p99 max')
+BenchmarkResult.__doc__ = """
+The method *name* has been called *repeat* times at *ops_per_sec* calls
+per second, the percentiles and the maximum of a call duration are in
+seconds.
+"""
+
+
+def benchmark(repeat=1000, warmup=50, tolerance=0.2):
+    """
+    This decorator runs the decorated `input` or test method *warmup*
+    times then *repeat* timed times instead of once. The body must
+    therefore be repeatable in the state reached by the scenario.
+
+    If the `benchmark_baseline` attribute of the TestState is a JSON file
+    path, the calls per second are compared with the baseline stored in
+    this file and the step fails when they are lower by more than
+    *tolerance*. The first result of a method is stored as its baseline.
+    A baseline is shared by every scenario path reaching the step, so the
+    method should be as fast in each state reaching it.
+    """
+    if repeat < 1:
+        raise ValueError('repeat must be at least 1 (got {})'.format(repeat))
+
+    def decorator(func):
+        """
+        Set benchmark attribute to decorated method.
+        """
+        func.benchmark = BenchmarkSpec(repeat, warmup, tolerance)
+        return func
+
+    return decorator
+
+
+def measure(name, method, test_case, spec):
+    """
+    Call *method* on *test_case* following *spec* and return the
+    BenchmarkResult.
+    """
+    for _ in range(spec.warmup):
+        method(test_case)
+
+    durations = []
+    for _ in range(spec.repeat):
+        start = time.perf_counter()
+        method(test_case)
+        durations.append(time.perf_counter() - start)
+
+    total = sum(durations)
+    durations.sort()
+    return BenchmarkResult(name, spec.repeat,
+                           len(durations) / total if total else math.inf,
+                           percentile(durations, 0.5),
+                           percentile(durations, 0.9),
+                           percentile(durations, 0.99), durations[-1])
+
+
+class Baseline:
+    """
+    Store the calls per second of benchmarked methods in a JSON file,
+    keyed by step and method name whatever the path reaching the step.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as baseline_file:
+                self._ops_per_sec = json.load(baseline_file)
+        else:
+            self._ops_per_sec = {}
+
+    @classmethod
+    def get(cls, path):
+        """
+        Return the Baseline shared by all benchmarks stored in *path*.
+        """
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(path)
+            return cls._instances[path]
+
+    def check(self, result, tolerance):
+        """
+        Raise AssertionError if *result* is slower than the baseline by
+        more than *tolerance*. Store *result* if it has no baseline.
+        """
+        with self._lock:
+            expected = self._ops_per_sec.get(result.name)
+            if expected is None:
+                self._ops_per_sec[result.name] = result.ops_per_sec
+                with open(self.path, 'w') as baseline_file:
+                    json.dump(self._ops_per_sec, baseline_file, indent=2,
+                              sort_keys=True)
+                return
+
+        if result.ops_per_sec < expected * (1 - tolerance):
+            raise AssertionError(
+                '{}: {:.1f} ops/s is {:.0%} slower than the baseline'
+                ' {:.1f} ops/s'.format(
+                    result.name, result.ops_per_sec,
+                    1 - result.ops_per_sec / expected, expected))
+
+
+def call(method, test_case, step_name, results):
+    """
+    Call *method* on *test_case* or benchmark it if it is decorated with
+    `benchmark`. The BenchmarkResult is appended to *results*.
+    """
+    spec = getattr(method, 'benchmark', None)
+    if spec is None:
+        return method(test_case)
+
+    result = measure('{}.{}'.format(step_name, method.__name__),
+                     method, test_case, spec)
+    results.append(result)
+    print('cricri: benchmark {}: {:.1f} ops/s, p50 {:.3f}ms, p99 {:.3f}ms'
+          .format(result.name, result.ops_per_sec, result.p50 * 1000,
+                  result.p99 * 1000), file=sys.stderr)
+
+    path = getattr(test_case, 'benchmark_baseline', None)
+    if path is not None:
+        Baseline.get(path).check(result, spec.tolerance)
+    return None
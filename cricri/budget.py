@@ -0,0 +1,167 @@
+"""
+Select the scenarios covering the most steps and transitions within a
+time budget and stop the run cleanly when the budget is spent.
+"""
+
+import atexit
+import sys
+import time
+import unittest
+
+from . import events
+from .algo import count_coverage, coverage, greedy_cover
+
+
+class TimeBudget:
+    """
+    Select and watch generated test cases to run them in *seconds*.
+
+    The expected duration of a scenario is its mean recorded duration or
+    the sum of the mean recorded durations of its steps. The duration of
+    steps that have never run is the mean duration of recorded steps or
+    *default_duration* when nothing is recorded.
+    """
+
+    def __init__(self, seconds, default_duration=1.0, stream=None):
+        self.seconds = seconds
+        self.default_duration = default_duration
+        self.stream = stream
+        self.deadline = None
+        self.start_time = None
+        self.reachable = set()
+        self.covered = set()
+        self.selected = 0
+        self.executed = 0
+        self._pending = 0
+        self._reported = False
+        self._watched = set()
+        self._started = set()
+        self._subscribed = False
+
+    def select(self, test_cases, history, reachable):
+        """
+        Return the test cases to run within the time budget, the test
+        cases adding the most uncovered steps and transitions per expected
+        second first.
+
+        reachable - the set of steps and transitions that can be covered.
+        """
+        all_stats = history.all_stats()
+        step_durations = history.step_durations()
+        if step_durations:
+            default = sum(step_durations.values()) / len(step_durations)
+        else:
+            default = self.default_duration
+
+        from_steps = {}
+        costs = {}
+        for test_case in test_cases:
+            scenario_info = test_case.__cricri_scenario__
+            from_steps[scenario_info.steps] = test_case
+            stats = all_stats.get(scenario_info.name)
+            if stats is not None:
+                costs[scenario_info.steps] = stats.mean_duration
+            else:
+                costs[scenario_info.steps] = sum(
+                    step_durations.get(step_name, default)
+                    for step_name
+                    in scenario_info.step_names)
+
+        selected = [from_steps[steps]
+                    for steps
+                    in greedy_cover(costs, costs.__getitem__, self.seconds)]
+
+        self.reachable = set(reachable)
+        self.selected = self._pending = len(selected)
+        for test_case in selected:
+            self.watch(test_case)
+        #  Selected test cases can be filtered out or the run interrupted.
+        atexit.register(self.print_report)
+        return selected
+
+    def listeners(self):
+        """
+        Return a list of tuples (event name, listener) watching the
+        selected test cases.
+        """
+        return [('scenario_start', self.on_scenario_start),
+                ('step_start', self.on_step_start),
+                ('scenario_end', self.on_scenario_end),
+                ('scenario_skipped', self.on_scenario_skipped)]
+
+    def watch(self, test_case):
+        """
+        Skip *test_case* if the time budget is spent when it starts
+        and report the coverage after the last watched test case. The
+        steps of *test_case* are covered once its first step starts.
+        """
+        if not self._subscribed:
+            for name, listener in self.listeners():
+                events.subscribe(name, listener)
+            self._subscribed = True
+        self._watched.add(test_case)
+
+    def on_scenario_start(self, test_case, time):
+        if test_case not in self._watched:
+            return
+        if self.deadline is None:
+            self.start_time = time
+            self.deadline = time + self.seconds
+        if time >= self.deadline:
+            raise unittest.SkipTest('time budget is spent')
+
+    def on_step_start(self, test_case, step, time):
+        test_case = type(test_case)
+        if test_case in self._watched and test_case not in self._started:
+            self._started.add(test_case)
+            self.executed += 1
+            self.covered |= coverage(test_case.__cricri_scenario__.steps)
+
+    def on_scenario_end(self, test_case, start, end, failed):
+        if test_case in self._watched:
+            self._watched.discard(test_case)
+            self._done()
+
+    def on_scenario_skipped(self, test_case, reason):
+        self.on_scenario_end(test_case, None, None, True)
+
+    def _done(self):
+        """
+        Called when a watched test case is over.
+        """
+        self._pending -= 1
+        if self._pending == 0:
+            self.print_report()
+
+    def print_report(self):
+        """
+        Write the report on *stream* - standard error by default - unless
+        it has already been written. It is called after the last selected
+        test case or at exit.
+        """
+        if self._reported:
+            return
+        self._reported = True
+        atexit.unregister(self.print_report)
+        if self._subscribed:
+            for name, listener in self.listeners():
+                events.unsubscribe(name, listener)
+            self._subscribed = False
+        print(self.report(), file=self.stream or sys.stderr)
+
+    def report(self):
+        """
+        Return a string describing the achieved coverage.
+        """
+        covered = count_coverage(self.covered)
+        reachable = count_coverage(self.reachable)
+        elapsed = 0.0
+        if self.start_time is not None:
+            elapsed = time.monotonic() - self.start_time
+
+        return ('cricri: time budget of {:g}s, {:.1f}s used:'
+                ' {}/{} states and {}/{} transitions covered'
+                ' by {}/{} selected scenarios'.format(
+                    self.seconds, elapsed,
+                    covered[0], reachable[0], covered[1], reachable[1],
+                    self.executed, self.selected))
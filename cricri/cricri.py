@@ -2,23 +2,56 @@
 Module to generate test scenarios from scenario step.
 """
 
+import atexit
+import gzip
+import hashlib
 import os
 import re
 import signal
 import socket
+import sys
+import threading
+import time
 import types
 import unittest
 from collections import defaultdict
 
-from voluptuous import ALLOW_EXTRA, Any, Invalid, Optional, Required, Schema
-
-from .algo import walk
-from .inet import Client, Server
+from voluptuous import (ALLOW_EXTRA, All, Any, Inclusive, Invalid, Optional,
+                        Range, Required, Schema)
+
+from . import events, results, trace
+from .algo import (bounded_walk, count_coverage, coverage, graph_coverage,
+                   random_walk, walk)
+from .benchmark import call as call_method
+from .budget import TimeBudget
+from .duration import check as check_duration
+from .duration import print_report as print_duration_report
+from .events import LISTENERS, emit
+from .history import RunHistory
+from .inet import Client, Server, port_def
+from .inet.server import (FD_NAMES, STDERR, STDOUT, expect, kill_all,
+                          start_all, wait_ready)
 from .inet.http_client import HTTPClient
 from .inet.tcp_client import TCPClient
+from .load import load as load_scenarios
+from .profiling import StepProfiles, profile_step
+from .shrink import shrink as shrink_scenario
+from .soak import soak as soak_scenario
+from .watchdog import WATCHDOG, StepTimeout, arm_step
 
 __all__ = ['MetaServerTestState', 'MetaTestState', 'TestServer', 'TestState']
 
+_CURRENT = threading.local()
+_NO_LISTENERS = dict.fromkeys(events.EVENTS, ())
+
+
+def current_scenario():
+    """
+    Return the description of the scenario whose start_scenario or
+    stop_scenario method is running in the current thread or None.
+    """
+    return getattr(_CURRENT, 'scenario', None)
+
 
 class MultiDict(dict):
     """
@@ -83,6 +116,13 @@ def to_underscore(name):
     return "".join(out)
 
 
+def _no_input(self):
+    """
+    Input of the steps which do not define any input.
+    """
+    return None
+
+
 class MetaTestState(type):
     """
     Generate all possible test scenarios from TestState subclass.
@@ -126,6 +166,14 @@ class MetaTestState(type):
             """
             return cls._regex.sub('', name)
 
+        @classmethod
+        def num(cls, name):
+            """
+            Returns num used to prefix name.
+            """
+            start = len(cls._prefix)
+            return int(name[start:start + cls._count_digit])
+
         @classmethod
         def len(cls):
             """
@@ -153,37 +201,123 @@ class MetaTestState(type):
     PrefixTestMethod.set_prefix_size(5)
 
     @staticmethod
-    def _build_test_method(input_method, names_and_methods, skipper):
+    def _build_test_method(input_method, names_and_methods, scenario_info,
+                           step_name):
         """
         Build and return test method for unittest.TestCase class.
         """
+        #  The events of a scenario built without instrumentation are not
+        #  emitted.
+        listeners = LISTENERS if scenario_info.instrument else _NO_LISTENERS
 
         def test(self):
             """
-            Execute input if exists, test methods
+            Execute the step if it is not skipped and record its duration.
+            """
+            if scenario_info.skip:
+                if listeners['step_skipped']:
+                    emit('step_skipped', test_case=self, step=step_name,
+                         reason=scenario_info.reason)
+                self.skipTest(scenario_info.reason)
+
+            start = time.monotonic()
+            if listeners['step_start']:
+                emit('step_start', test_case=self, step=step_name,
+                     time=start)
+            armed = arm_step(self, scenario_info, step_name, start)
+            try:
+                profile_step(self, step_name, lambda: run_step(self))
+            finally:
+                if armed:
+                    WATCHDOG.disarm()
+                end = time.monotonic()
+                scenario_info.durations.append((step_name, end - start))
+                if listeners['step_end']:
+                    emit('step_end', test_case=self, step=step_name,
+                         start=start, end=end)
+
+        def call(self, method, end_event='test_method_end'):
+            """
+            Call or benchmark method, emit its events and check its
+            duration budget.
+            """
+            if method is _no_input:
+                return
+
+            start = time.monotonic()
+            if end_event == 'step_input_end' \
+                    and listeners['step_input_start']:
+                emit('step_input_start', test_case=self, step=step_name,
+                     method=method.__name__, time=start)
+            error = None
+            try:
+                call_method(method, self, step_name,
+                            scenario_info.benchmarks)
+            except BaseException as exception:
+                error = exception
+                raise
+            finally:
+                end = time.monotonic()
+                if listeners[end_event]:
+                    emit(end_event, test_case=self, step=step_name,
+                         method=method.__name__, start=start, end=end,
+                         error=error)
+            duration = end - start
+            if getattr(method, 'benchmark', None) is not None:
+                #  The budget of a benchmarked method applies to one call.
+                duration = scenario_info.benchmarks[-1].p99
+            check_duration(method, self,
+                           '{}.{}'.format(step_name, method.__name__),
+                           duration)
+
+        def timed_out(method):
             """
-            if skipper.skip:
-                self.skipTest(skipper.reason)
+            Fail the scenario and skip its next steps.
+            """
+            scenario_info.skip = True
+            scenario_info.failed = True
+            scenario_info.reason = 'Timeout occurred in {}' \
+                .format(method.__qualname__)
 
+        def run_step(self):
+            """
+            Execute input if exists, test methods
+            """
             if input_method is not None:
                 try:
-                    input_method(self)
+                    call(self, input_method, 'step_input_end')
+                except StepTimeout:
+                    timed_out(input_method)
+                    raise
                 except Exception:
-                    skipper.skip = True
-                    skipper.reason = 'Exception occurred in {}' \
+                    scenario_info.skip = True
+                    scenario_info.failed = True
+                    scenario_info.reason = 'Exception occurred in {}' \
                         .format(input_method.__qualname__)
                     raise
 
                 for name, method in names_and_methods:
+                    if scenario_info.skip:
+                        break
                     with self.subTest(name=name):
-                        method(self)
+                        try:
+                            call(self, method)
+                        except unittest.SkipTest:
+                            raise
+                        except StepTimeout:
+                            timed_out(method)
+                            raise
+                        except Exception:
+                            scenario_info.failed = True
+                            raise
 
         return test
 
     @classmethod
-    def _generate_scenarios(mcs, subcls, max_loop):
+    def _build_graph(mcs, subcls):
         """
-        Return list of scenario, each scenario is a list of states.
+        Return the start step name and a dict mapping each step name
+        to the names of the next steps.
         """
         try:
             start_step = mcs.start_step[subcls]
@@ -202,6 +336,43 @@ class MetaTestState(type):
                                      format(previous_step, step.__qualname__))
                 step_from_previous[previous_step].append(step.__name__)
 
+        return start_step, step_from_previous
+
+    @classmethod
+    def _build_weights(mcs, subcls):
+        """
+        Return a dict mapping (previous step name, step name) to the weight
+        defined when `previous` keyword is a dict.
+        """
+        weights = {}
+        for step in mcs.steps[subcls].values():
+            if isinstance(step.previous, dict):
+                for previous_step, weight in step.previous.items():
+                    weights[previous_step, step.__name__] = weight
+        return weights
+
+    @classmethod
+    def _generate_scenarios(mcs, subcls, max_loop, random_walks=None,
+                            max_length=None, seed=0):
+        """
+        Return list of scenario, each scenario is a list of states.
+
+        If random_walks is set, scenarios are sampled using random_walks
+        seeded random walks of max_length steps instead of finding all
+        longer pathes. Else if max_length is set, scenarios are all pathes
+        up to max_length steps.
+        """
+        start_step, step_from_previous = mcs._build_graph(subcls)
+        if random_walks is not None:
+            if max_length is None:
+                max_length = count_coverage(
+                    graph_coverage(step_from_previous, start_step))[1] + 1
+            return random_walk(step_from_previous, start_step, random_walks,
+                               max_length, seed, mcs._build_weights(subcls))
+
+        if max_length is not None:
+            return bounded_walk(step_from_previous, start_step, max_length)
+
         return walk(step_from_previous, start_step, max_loop)
 
     @staticmethod
@@ -239,7 +410,9 @@ class MetaTestState(type):
 
     def _set_mtd(cls, mtd_name, attrs, key_name, super_at_start=True):
         """
-        Add mtd_name to attrs dict.
+        Add mtd_name to attrs dict. mtd_name stays bound to the class
+        defining it and can read the description of the running scenario
+        with `current_scenario`.
 
             attrs[key_name] = cls.mtd_name
         """
@@ -250,13 +423,21 @@ class MetaTestState(type):
                                 .format(cls, mtd_name))
             unbound_super = getattr(cls.base_class, key_name).__func__
 
+            def call_mtd(cls):
+                previous = current_scenario()
+                _CURRENT.scenario = getattr(cls, '__cricri_scenario__', None)
+                try:
+                    mtd()
+                finally:
+                    _CURRENT.scenario = previous
+
             if super_at_start:
                 def func(cls):
                     unbound_super(cls)
-                    mtd()
+                    call_mtd(cls)
             else:
                 def func(cls):
-                    mtd()
+                    call_mtd(cls)
                     unbound_super(cls)
 
             func.__name__ = key_name
@@ -292,64 +473,229 @@ class MetaTestState(type):
 
         attrs['__str__'] = __str__
 
-    def get_test_cases(cls, max_loop):
+    def scenario_name(cls, scenario):
         """
-        Build and return unittest.TestCase subclasses.
+        Return the name identifying *scenario* in a RunHistory.
+        """
+        return '{}.{}:{}'.format(cls.__module__, cls.__qualname__,
+                                 ','.join(scenario))
+
+    def build_step_method(cls, step_num, step_name, previous_steps_names,
+                          scenario_info):
+        """
+        Return a tuple (method name, test method) running the step
+        *step_name* at the position *step_num* of a scenario after the
+        *previous_steps_names* steps.
         """
         mcs = type(cls)
-        test_case_list = []
+        step = mcs.steps[cls][step_name]
 
-        for scenario in mcs._generate_scenarios(cls, max_loop):
-            attrs = {}
-            previous_steps_names = []
-            skipper = types.SimpleNamespace(skip=False, reason='')
+        if not step.inputs:
+            input_method = _no_input
+        else:
+            input_method = mcs._select_input_method(
+                step.inputs, previous_steps_names)
 
-            for step_num, step_name in enumerate(scenario):
-                step = mcs.steps[cls][step_name]
+        test_methods = tuple(
+            sorted((name, attr)
+                   for name, attr
+                   in vars(step).items()
+                   if name.startswith('test')
+                   and mcs.method_is_enable(attr,
+                                            previous_steps_names)))
 
-                if not step.inputs:
-                    def input_method(self):
-                        return None
-                else:
-                    input_method = mcs._select_input_method(
-                        step.inputs, previous_steps_names)
+        method_name = mcs.PrefixTestMethod.add(
+            step_num, to_underscore(step_name.split('.')[-1]))
 
-                test_methods = tuple(
-                    sorted((name, attr)
-                           for name, attr
-                           in vars(step).items()
-                           if name.startswith('test')
-                           and mcs.method_is_enable(attr,
-                                                    previous_steps_names)))
+        return method_name, mcs._build_test_method(
+            input_method, test_methods, scenario_info,
+            cls.scenario_name((step_name,)))
 
-                method_name = mcs.PrefixTestMethod.add(
-                    step_num, to_underscore(step_name.split('.')[-1]))
+    def build_test_case(cls, scenario, history=None, instrument=True):
+        """
+        Build and return the unittest.TestCase subclass executing
+        *scenario*, a sequence of step names.
 
-                attrs[method_name] = mcs._build_test_method(input_method,
-                                                            test_methods,
-                                                            skipper)
+        If *history* is a RunHistory, the outcome and the duration of
+        the scenario are recorded in it. If *instrument* is False, the
+        trace and the results files are not enabled and no event is
+        emitted for the scenario, so that it is not reported.
+        """
+        mcs = type(cls)
+        attrs = {}
+        previous_steps_names = []
+        if instrument:
+            trace_file = getattr(cls, 'trace_file', None)
+            if trace_file is not None:
+                trace.enable(trace_file)
+            results_file = getattr(cls, 'results_file', None)
+            if results_file is not None:
+                results.enable(results_file)
+        scenario_info = types.SimpleNamespace(
+            name=cls.scenario_name(scenario), steps=tuple(scenario),
+            step_names=tuple(cls.scenario_name((step_name,))
+                             for step_name in scenario),
+            skip=False, reason='', failed=False, durations=[],
+            benchmarks=[], deadline=None, instrument=instrument)
+
+        for step_num, step_name in enumerate(scenario):
+            step = mcs.steps[cls][step_name]
+            method_name, method = cls.build_step_method(
+                step_num, step_name, previous_steps_names, scenario_info)
+            attrs[method_name] = method
+            previous_steps_names.append(step_name)
+
+        cls._set_mtd('start_scenario', attrs, 'setUpClass', True)
+        cls._set_mtd('stop_scenario', attrs, 'tearDownClass', False)
+
+        for met_name in ('tearDown', 'setUp'):
+            mtd = getattr(cls, met_name, None)
+            if mtd is not None:
+                attrs[met_name] = mtd
+
+        attrs['__generated_by_cricri__'] = True
+        attrs['__cricri_scenario__'] = scenario_info
+        mcs._build_str_method(attrs)
+        test_case = type(''.join(scenario),
+                         (cls.base_class,) + step.__bases__,
+                         attrs)
+        if instrument:
+            events.watch(test_case)
+            if history is not None:
+                history.watch(test_case)
+        return test_case
+
+    def get_test_cases(cls, max_loop, history=None, random_walks=None,
+                       max_length=None, seed=0):
+        """
+        Build and return unittest.TestCase subclasses.
 
-                previous_steps_names.append(step_name)
+        If *history* is a RunHistory, the outcome and the duration of
+        each scenario are recorded in it.
+        """
+        return [cls.build_test_case(scenario, history)
+                for scenario
+                in type(cls)._generate_scenarios(cls, max_loop, random_walks,
+                                                 max_length, seed)]
 
-            cls._set_mtd('start_scenario', attrs, 'setUpClass', True)
-            cls._set_mtd('stop_scenario', attrs, 'tearDownClass', False)
+    def shrink(cls, scenario, jobs=1, match_message=False):
+        """
+        Return the shortest found scenario reproducing the failure of
+        *scenario* - a sequence of step names or a generated TestCase - and
+        write it on the standard error. Candidate scenarios are run in
+        *jobs* processes. If *match_message* is True, the failure message
+        must be the same.
+        """
+        return shrink_scenario(cls, scenario, jobs, match_message)
 
-            for met_name in ('tearDown', 'setUp'):
-                mtd = getattr(cls, met_name, None)
-                if mtd is not None:
-                    attrs[met_name] = mtd
+    def soak(cls, max_steps=None, duration=None, seed=0):
+        """
+        Run a seeded random walk through the steps as one long scenario
+        until *max_steps* steps have run or *duration* seconds have elapsed,
+        write the trends of server RSS and latencies on the standard error
+        and return a SoakResult.
+        """
+        return soak_scenario(cls, max_steps, duration, seed)
 
-            attrs['__generated_by_cricri__'] = True
-            mcs._build_str_method(attrs)
-            test_case_list.append(type(''.join(scenario),
-                                       (cls.base_class,) + step.__bases__,
-                                       attrs))
-        return test_case_list
+    def load(cls, users, duration=None, iterations=None, think_time=0,
+             ramp_up=0, scenarios=None, max_length=None, seed=0):
+        """
+        Run *users* concurrent virtual users following random walks - or
+        *scenarios* - during *duration* seconds or *iterations* scenarios
+        per user, write the latency and the error rate of each transition
+        on the standard error and return a LoadResult.
+        """
+        return load_scenarios(cls, users, duration, iterations, think_time,
+                              ramp_up, scenarios, max_length, seed)
 
-    def get_load_tests(cls, max_loop=0):
+    def coverage_report(cls, scenarios):
+        """
+        Return a string describing the steps and transitions of `cls`
+        covered by *scenarios*.
+        """
+        start_step, graph = type(cls)._build_graph(cls)
+        covered = set()
+        for scenario in scenarios:
+            covered |= coverage(tuple(scenario))
+        covered = count_coverage(covered)
+        reachable = count_coverage(graph_coverage(graph, start_step))
+        return ('cricri: {} scenarios cover {}/{} states and'
+                ' {}/{} transitions of {}'.format(
+                    len(scenarios), covered[0], reachable[0],
+                    covered[1], reachable[1], cls.__qualname__))
+
+    def get_load_tests(cls, max_loop=0, history=None, order=None,
+                       shard=None, time_budget=None, random_walks=None,
+                       max_length=None, seed=0):
         """
         Build and return load_tests function.
+
+        history - path of a SQLite file or RunHistory object used to
+                  record outcome and duration of each scenario.
+        order - None to keep the generated order or 'priority' to run
+                previously failing and fast scenarios first.
+        shard - (index, count) or (index, count, since) tuple to run only
+                the scenarios assigned to the worker *index* among *count*
+                workers from the durations recorded before *since*, a
+                time.time() value shared by the workers.
+        time_budget - number of seconds allowed to run scenarios. The
+                      scenarios adding the most uncovered steps and
+                      transitions per expected second are selected and the
+                      run stops when the budget is spent.
+        random_walks - number of seeded random walks used to sample
+                       scenarios instead of finding all longer pathes.
+                       The transition coverage of sampled scenarios is
+                       written on the standard error.
+        max_length - maximal number of steps per scenario. Without
+                     random_walks, the scenarios are all pathes up to
+                     max_length steps - max_loop is ignored. With
+                     random_walks, the number of transitions plus one
+                     by default.
+        seed - seed of random walks.
         """
+        if order not in (None, 'priority'):
+            raise ValueError("order must be None or 'priority'")
+
+        if isinstance(history, str):
+            history = RunHistory(history)
+
+        if history is None and (order is not None or shard is not None
+                                or time_budget is not None):
+            raise ValueError('history is required to sort, shard or'
+                             ' budget scenarios')
+
+        def get_test_cases():
+            """
+            Return the selected, sorted and sharded test cases.
+            """
+            test_cases = cls.get_test_cases(max_loop, history, random_walks,
+                                            max_length, seed)
+            if random_walks is not None:
+                print(cls.coverage_report(
+                    [test_case.__cricri_scenario__.steps
+                     for test_case in test_cases]), file=sys.stderr)
+
+            from_name = {test_case.__cricri_scenario__.name: test_case
+                         for test_case in test_cases}
+
+            names = list(from_name)
+            if shard is not None:
+                names = history.shard(names, *shard)
+
+            if time_budget is not None:
+                start_step, graph = type(cls)._build_graph(cls)
+                names = [
+                    test_case.__cricri_scenario__.name
+                    for test_case
+                    in TimeBudget(time_budget).select(
+                        [from_name[name] for name in names], history,
+                        graph_coverage(graph, start_step))]
+
+            if order == 'priority':
+                names = history.prioritize(names)
+
+            return [from_name[name] for name in names]
+
         def load_tests(loader, standard_tests, pattern):
             """
             unittest hook responsible for loading
@@ -358,7 +704,7 @@ class MetaTestState(type):
 
             if loader.__module__.startswith('nose2.'):
                 unittest_loader = unittest.TestLoader()
-                for test in cls.get_test_cases(max_loop):
+                for test in get_test_cases():
                     standard_tests.addTests(
                         unittest_loader.loadTestsFromTestCase(test))
 
@@ -368,7 +714,7 @@ class MetaTestState(type):
                 loader.suiteClass = suite_factory
 
             else:
-                for test in cls.get_test_cases(max_loop):
+                for test in get_test_cases():
                     standard_tests.addTests(loader.loadTestsFromTestCase(test))
 
             return standard_tests
@@ -435,7 +781,9 @@ class TestState(metaclass=MetaTestState):
 
     TestState subclass must define `start` or `previous` keyword. `start` is
     True if TestState is a start state otherwise `previous` must be define,
-    this is a list containing names of previous TestState.
+    this is a list containing names of previous TestState. `previous` can
+    also be a dict mapping names of previous TestState to weights used to
+    choose the next step when scenarios are sampled using random walks.
 
     Test authors can define one or several "test_*()" methods such as in
     unittest.TestCase subclass.
@@ -567,10 +915,33 @@ class MetaServerTestState(MetaTestState):
                     Required("name"): str,
                     Required("cmd"): [str],
                     Optional("kill-signal", default=signal.SIGINT): int,
+                    Optional("kill-timeout", default=10): Any(
+                        None, Range(0, min_included=False)),
                     Optional("env", default=None): Any(None, dict),
-                    Optional("extra-env", default=None): Any(None, dict)
+                    Optional("extra-env", default=None): Any(None, dict),
+                    Optional("history-max-size", default=None): Any(
+                        None, All(int, Range(min=1))),
+                    Optional("history-spill", default=False): bool,
+                    Optional("reuse", default=False): bool,
+                    Optional("prespawn", default=False): bool,
+                    Optional("sample", default=False): Any(
+                        bool, Range(0, min_included=False)),
+                    Optional("ready", default=None): Any(None, {
+                        Optional("stdout"): str,
+                        Optional("stderr"): str,
+                        Optional("tcp"): port_def,
+                        Inclusive("http", "http gate"): str,
+                        Inclusive("port", "http gate"): port_def,
+                        Optional("host", default="127.0.0.1"): str,
+                        Optional("timeout", default=10): Range(
+                            0, min_included=False)
+                    })
                 }
-            ]
+            ],
+            Optional("log_dir"): Any(None, str),
+            Optional("log_compress"): bool,
+            Optional("log_console"): Any('always', 'failed', 'never'),
+            Optional("log_tail"): Any(None, All(int, Range(min=1)))
         }
 
         for attr_name, class_client in mcs._class_clients.items():
@@ -626,8 +997,40 @@ class TestServer(metaclass=MetaServerTestState):
             element is a program.
         - kill-signal (optional) should be an enumeration members of
             :py:class: `signal.Signals`
+        - kill-timeout (optional) The number of seconds to wait after
+            kill-signal before sending SIGKILL, 10 by default. None waits
+            forever.
         - env (optional) A dict that defines the environment variables
         - extra-env (optional) A dict that add environment variables
+        - history-max-size (optional) The maximal number of characters kept
+            in memory per output and per step, older characters are dropped.
+        - history-spill (optional) If true, outputs of previous steps and
+            characters exceeding history-max-size are moved to a temporary
+            file closed when the server is stopped by stop_scenario.
+        - ready (optional) A dict defining gates to wait before building
+            clients: *stdout* or *stderr* regex, *tcp* port accepting
+            connections or *http* path served on *port* answering a 2xx
+            or 3xx status. *timeout* is 10 seconds by default.
+        - reuse (optional) If true, the process is kept running for the next
+            scenario and `reset_scenario` is called instead of restarting
+            it. The process is restarted if it crashed, if `reset_scenario`
+            raised an exception or if the scenario failed.
+        - prespawn (optional) If true, the process of the next scenario is
+            spawned on fresh virtual ports while the current scenario runs.
+            It is ignored when a command of the class has the reuse option.
+        - sample (optional) If true, the RSS, CPU time, open file descriptors
+            and threads of the process are sampled at the beginning of each
+            step and at the end of the scenario. If it is a number, they are
+            also sampled every *sample* seconds.
+
+    The outputs of servers are logged according to these attributes:
+        - log_dir (optional) A directory where the outputs of each server
+            are written in per-scenario files as they arrive.
+        - log_compress (optional) If true, log files are compressed by gzip.
+        - log_console (optional) 'failed' (default) to print the outputs of
+            failed scenarios, 'always' or 'never'.
+        - log_tail (optional) The number of last lines printed per output and
+            per step, every line is printed by default.
 
     Example::
 
@@ -659,13 +1062,28 @@ class TestServer(metaclass=MetaServerTestState):
     virtual_ports = {}
     clients = {}
     servers = {}
+    log_dir = None
+    log_compress = False
+    log_console = 'failed'
+    log_tail = None
+    log_files = {}
+    _reused_servers = {}
+    _prespawned_servers = {}
+    #  False when servers are shared by concurrent scenarios whose sections
+    #  would interleave.
+    _history_sections = True
 
     def setUp(self):
-        words = self.id().rsplit('.', 1)[-1].split('_')
-        del words[1]
-        name = '_'.join(words)
-        for server in self.servers.values():
-            server.history.new_section(name)
+        if self._history_sections:
+            words = self.id().rsplit('.', 1)[-1].split('_')
+            del words[1]
+            name = '_'.join(words)
+            for server in self.servers.values():
+                server.history.new_section(name)
+
+        for command in self.commands:
+            if command['sample'] and command['name'] in self.servers:
+                self.servers[command['name']].sample()
 
     @staticmethod
     def get_free_tcp_port():
@@ -678,62 +1096,378 @@ class TestServer(metaclass=MetaServerTestState):
         tcp.close()
         return port
 
+    @classmethod
+    def get_port(cls, port, virtual_ports=None):
+        """
+        Return *port* if it is an int else the TCP port bound to the
+        *port* virtual port - a string surrounded by curly brackets.
+        A free TCP port is bound to virtual port at the first call.
+
+        virtual_ports - dict storing the bound ports, `virtual_ports`
+                        attribute by default.
+        """
+        if isinstance(port, int):
+            return port
+
+        if virtual_ports is None:
+            virtual_ports = cls.virtual_ports
+
+        if virtual_ports.get(port) is None:
+            virtual_ports[port] = cls.get_free_tcp_port()
+        return virtual_ports[port]
+
+    @classmethod
+    def _build_server(cls, command, virtual_ports=None):
+        """
+        Return a Server, not started yet, from *command* description.
+        """
+        parameters = []
+        for parameter in command['cmd']:
+            for virtual_port in set(re.findall('{.+?}', parameter)):
+                port = cls.get_port(virtual_port, virtual_ports)
+                parameter = parameter.replace(virtual_port, str(port))
+
+            parameters.append(parameter)
+
+        if command['extra-env']:
+            command['env'] = os.environ.copy()
+            command['env'].update(command['extra-env'])
+
+        sample_interval = command['sample']
+        if isinstance(sample_interval, bool):
+            sample_interval = None
+
+        return Server(
+            parameters, command['kill-signal'], command['env'],
+            command['history-max-size'], command['history-spill'],
+            command['kill-timeout'], sample_interval, start=False,
+            name=command['name'])
+
     @classmethod
     def start_scenario(cls):
         """
         Builds Servers object from `commands` description and client from
         `*_client` description, and binds them to asyncio event loop.
+
+        All processes are spawned concurrently, then all readiness gates
+        are awaited concurrently.
         """
+        owner = cls._commands_owner()
+        virtual_ports, reused = cls._reused_servers.pop(owner, ({}, {}))
+        prespawned = {}
+        if not reused:
+            virtual_ports, prespawned = cls._prespawned_servers.pop(
+                owner, ({}, {}))
+        cls.virtual_ports.update(virtual_ports)
+
+        gates_from_name = {}
+        new_servers = {}
+        stale_servers = []
+        need_reset = False
         for command in cls.commands:
-            parameters = []
-            for parameter in command['cmd']:
-                for virtual_port in set(re.findall('{.+?}', parameter)):
-                    port = cls.virtual_ports.get(virtual_port)
-                    if port is None:
-                        port = cls.get_free_tcp_port()
-                        cls.virtual_ports[virtual_port] = port
-
-                    parameter = parameter.replace(virtual_port, str(port))
-
-                parameters.append(parameter)
+            server = reused.pop(command['name'], None)
+            if server is not None and server.running:
+                server.history.new_section('reset_scenario')
+                cls.servers[command['name']] = server
+                need_reset = True
+                continue
+
+            if server is None:
+                server = prespawned.pop(command['name'], None)
+
+            if server is not None and server.running:
+                cls.servers[command['name']] = server
+            else:
+                if server is not None:
+                    stale_servers.append(server)
+                server = cls.servers[command['name']] = cls._build_server(
+                    command)
+                new_servers[command['name']] = server
+
+            if command['ready'] is not None:
+                gates = command['ready'].copy()
+                for key in ('tcp', 'port'):
+                    if key in gates:
+                        gates[key] = cls.get_port(gates[key])
+                gates_from_name[command['name']] = (server, gates)
+
+        stale_servers.extend(reused.values())
+        stale_servers.extend(prespawned.values())
+        kill_all(stale_servers)
+        for server in stale_servers:
+            server.history.close()
+        if cls.log_dir is not None:
+            cls._open_log_files()
 
-            if command['extra-env']:
-                command['env'] = os.environ.copy()
-                command['env'].update(command['extra-env'])
+        try:
+            start_all(new_servers)
+            if gates_from_name:
+                wait_ready(gates_from_name)
+        except RuntimeError:
+            cls.stop_scenario(reuse=False, failed=True)
+            raise
+
+        cls.clients.update(cls.build_clients())
+        cls._prespawn(owner)
+        if need_reset:
+            try:
+                cls.reset_scenario()
+            except Exception as error:
+                print('cricri: reset_scenario failed ({!r}), restart servers'
+                      .format(error), file=sys.stderr)
+                cls.stop_scenario(reuse=False)
+                cls.start_scenario()
 
-            cls.servers[command['name']] = Server(
-                parameters, command['kill-signal'], command['env'])
+    @classmethod
+    def _prespawn(cls, owner):
+        """
+        Spawn the commands with the *prespawn* option on fresh virtual ports
+        for the next scenario.
+        """
+        commands = [command for command in cls.commands
+                    if command['prespawn']]
+        if not commands or any(command['reuse']
+                               for command in cls.commands):
+            return
+
+        virtual_ports = {}
+        servers = {command['name']: cls._build_server(command, virtual_ports)
+                   for command in commands}
+        try:
+            start_all(servers)
+        except RuntimeError:
+            kill_all(servers.values())
+            for server in servers.values():
+                server.history.close()
+            return
+        cls._prespawned_servers[owner] = (virtual_ports, servers)
 
+    @classmethod
+    def build_clients(cls):
+        """
+        Return a dict mapping client names to new clients built from
+        `*_clients` descriptions.
+        """
+        clients = {}
         for attr_name, class_client in type(cls)._class_clients.items():
             for client_init_values in getattr(cls, attr_name):
                 client_init_values = client_init_values.copy()
                 port = client_init_values.get('port')
                 if port is not None:
-                    if isinstance(port, str) and port.startswith(
-                            '{') and port.endswith('}'):
-                        client_init_values['port'] = cls.virtual_ports[port]
+                    client_init_values['port'] = cls.get_port(port)
 
                 client_name = client_init_values.pop('name')
-                cls.clients[client_name] = class_client(**client_init_values)
+                client = class_client(**client_init_values)
+                client.name = client_name
+                clients[client_name] = client
+        return clients
+
+    @classmethod
+    def reset_scenario(cls):
+        """
+        Called at the beginning of a scenario when servers with the *reuse*
+        option are still running from the previous scenario. Override it to
+        restore the initial state of the servers, servers are restarted if
+        it raises an exception.
+        """
 
     @classmethod
-    def stop_scenario(cls):
+    def _commands_owner(cls):
+        """
+        Return the class defining the `commands` attribute.
         """
-        Kill servers and print recorded log for each servers.
+        return next(klass for klass in cls.__mro__
+                    if 'commands' in vars(klass))
+
+    @classmethod
+    def kill_reused_servers(cls):
+        """
+        Kill the servers kept running by the *reuse* option and the servers
+        spawned by the *prespawn* option. This method is called at exit.
+        """
+        servers = [server
+                   for kept in (TestServer._reused_servers,
+                                TestServer._prespawned_servers)
+                   for _, pool in kept.values()
+                   for server in pool.values()]
+        TestServer._reused_servers.clear()
+        TestServer._prespawned_servers.clear()
+        kill_all(servers)
+        for server in servers:
+            server.history.close()
+
+    @classmethod
+    def wait_any(cls, patterns_from_server, timeout):
+        """
+        Wait until one of the patterns of one server is found before
+        *timeout* and return its OutputMatch.
+
+        patterns_from_server - dict mapping a server name to a pattern or a
+                               list of patterns. A pattern is a regex searched
+                               on stdout or a tuple (fd, regex).
+        """
+        found = expect({name: (cls.servers[name], patterns)
+                        for name, patterns
+                        in patterns_from_server.items()}, timeout)
+        return next(iter(found.values()))
+
+    @classmethod
+    def wait_all(cls, patterns_from_server, timeout):
+        """
+        Wait until one of the patterns of each server is found before
+        *timeout* and return a dict mapping server names to OutputMatch.
+
+        patterns_from_server - dict mapping a server name to a pattern or a
+                               list of patterns. A pattern is a regex searched
+                               on stdout or a tuple (fd, regex).
+        """
+        return expect({name: (cls.servers[name], patterns)
+                       for name, patterns
+                       in patterns_from_server.items()}, timeout,
+                      wait_all=True)
+
+    @classmethod
+    def stop_scenario(cls, reuse=True, failed=False):
+        """
+        Kill servers at once, print their recorded log according to the
+        `log_console` attribute and close their history.
+
+        Servers with the *reuse* option are kept running for the next
+        scenario unless *reuse* is False or the scenario *failed*.
         """
         for client in cls.clients.values():
             client.close()
 
+        scenario_info = current_scenario()
+        if scenario_info is None:
+            scenario_info = getattr(cls, '__cricri_scenario__', None)
+        if scenario_info is not None and scenario_info.failed:
+            failed = True
+        if failed:
+            reuse = False
+
+        for command in cls.commands:
+            server = cls.servers.get(command['name'])
+            if command['sample'] and server is not None:
+                server.sample()
+                growth = server.growth()
+                if growth and LISTENERS['process_growth']:
+                    emit('process_growth', server=server, growth=growth)
+
+        reused = {}
+        if reuse:
+            for command in cls.commands:
+                server = cls.servers.get(command['name'])
+                if command['reuse'] and server is not None and server.running:
+                    reused[command['name']] = server
+
+        kill_all([server for name, server in cls.servers.items()
+                  if name not in reused])
+
+        if (cls.log_console == 'always'
+                or cls.log_console == 'failed' and failed):
+            cls.print_logs()
+
+        for server_name, logs in cls.log_files.items():
+            cls.servers[server_name].history.set_logs({})
+            for log in logs.values():
+                log.close()
+
+        for server_name, server in cls.servers.items():
+            if server_name not in reused:
+                server.history.close()
+
+        for server in reused.values():
+            server.history.clear()
+
+        if reused:
+            cls._reused_servers[cls._commands_owner()] = (
+                cls.virtual_ports.copy(), reused)
+
+        cls.virtual_ports.clear()
+        cls.clients.clear()
+        cls.servers.clear()
+        cls.log_files.clear()
+
+    @classmethod
+    def print_logs(cls):
+        """
+        Print the recorded log of each server, only the `log_tail` last
+        lines of each output are printed if it is set.
+        """
         for server_name, server in cls.servers.items():
             print('{:=^78}'.format(' LOG: {} '.format(server_name)))
+            for fd, log in cls.log_files.get(server_name, {}).items():
+                print('{}: {}'.format(FD_NAMES[fd], log.name))
+
+            measures = defaultdict(list)
+            for measure in server.history.measures():
+                measures[measure.section].append(measure)
+
             for section, log in server.history:
                 print('{:-^78}'.format(' {} '.format(section)))
                 print('{:~^78}'.format(' stdout '))
-                print(log[1])
+                print(tail(log[STDOUT], cls.log_tail))
                 print('{:~^78}'.format(' stderr '))
-                print(log[2])
-            server.kill()
+                print(tail(log[STDERR], cls.log_tail))
+                if measures[section]:
+                    print('{:~^78}'.format(' measures '))
+                    for measure in measures[section]:
+                        print('{}: {}'.format(measure.name, measure.value))
+
+            growth = server.growth()
+            if growth:
+                print('{:-^78}'.format(' growth '))
+                for field, (first, last) in growth.items():
+                    print('{}: {} -> {} ({:+})'.format(
+                        field, first, last, round(last - first, 3)))
 
-        cls.virtual_ports.clear()
-        cls.clients.clear()
-        cls.servers.clear()
+    @classmethod
+    def _open_log_files(cls):
+        """
+        Open the log files of the scenario in `log_dir` and bind them to
+        the servers history.
+        """
+        scenario_info = current_scenario()
+        if scenario_info is None:
+            scenario_info = getattr(cls, '__cricri_scenario__', None)
+        name = cls.__qualname__ if scenario_info is None \
+            else scenario_info.name
+        file_name = re.sub(r'[^\w.,-]+', '_', name)
+        if len(file_name) > 100:
+            file_name = '{}-{}'.format(
+                file_name[:100],
+                hashlib.sha1(name.encode('utf-8')).hexdigest()[:12])
+
+        os.makedirs(cls.log_dir, exist_ok=True)
+        for server_name, server in cls.servers.items():
+            logs = cls.log_files[server_name] = {}
+            for fd in (STDOUT, STDERR):
+                path = os.path.join(cls.log_dir, '{}.{}.{}.log'.format(
+                    file_name, server_name, FD_NAMES[fd]))
+                if cls.log_compress:
+                    logs[fd] = gzip.open(path + '.gz', 'wt',
+                                         encoding='utf-8')
+                else:
+                    logs[fd] = open(path, 'w', encoding='utf-8')
+            server.history.set_logs(logs)
+
+
+def tail(text, nb_lines):
+    """
+    Return the *nb_lines* last lines of *text* or *text* if *nb_lines* is
+    None.
+
+    >>> tail('a\\nb\\nc\\n', 2)
+    'b\\nc'
+    """
+    if nb_lines is None:
+        return text
+    return '\n'.join(text.rstrip('\n').rsplit('\n', nb_lines)[-nb_lines:])
+
+
+atexit.register(TestServer.kill_reused_servers)
+atexit.register(print_duration_report)
+atexit.register(StepProfiles.write_all)
+atexit.register(trace.write)
+atexit.register(results.disable)
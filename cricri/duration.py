@@ -0,0 +1,171 @@
+"""
+Declare duration budgets on input and test methods so that performance
+expectations are checked by the same scenarios as functional ones.
+"""
+
+import sys
+import threading
+import warnings
+from collections import defaultdict, namedtuple
+
+from .algo import percentile
+
+DurationBudget = namedtuple('DurationBudget', 'seconds soft')
+DurationBudget.__doc__ = """
+A call must last at most *seconds* seconds. If *soft* is True, an exceeded
+budget is reported as a DurationBudgetWarning instead of a failure.
+"""
+
+Distribution = namedtuple('Distribution', 'count p50 p90 p99 max')
+Distribution.__doc__ = """
+*count* measured durations, their percentiles and their maximum in seconds.
+"""
+
+
+class DurationBudgetWarning(UserWarning):
+    """
+    Warning issued when a call exceeds a soft duration budget.
+    """
+
+
+def max_duration(seconds, soft=None):
+    """
+    This decorator sets the duration budget of the decorated `input` or
+    test method to *seconds* seconds. The step fails when a call lasts
+    longer, or only warns if *soft* is True. When *soft* is None, the
+    `max_duration_soft` attribute of the TestState is used.
+
+    The `default_max_duration` attribute of the TestState sets the budget
+    of methods which are not decorated. The budget of a method decorated
+    with `benchmark` is checked against the 99th percentile of one call.
+    Budgets are not checked when the `profile_dir` attribute is set.
+    """
+    def decorator(func):
+        """
+        Set max_duration attribute to decorated method.
+        """
+        func.max_duration = DurationBudget(seconds, soft)
+        return func
+
+    return decorator
+
+
+class Durations:
+    """
+    Collect the durations of the methods having a budget across
+    scenarios.
+
+    >>> durations = Durations()
+    >>> for duration in (0.1, 0.2, 0.3, 0.4):
+    ...     durations.record('Base:A.input', duration)
+    >>> durations.distribution('Base:A.input')
+    Distribution(count=4, p50=0.2, p90=0.4, p99=0.4, max=0.4)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = defaultdict(list)
+        self._budgets = {}
+        self._exceeded = defaultdict(int)
+
+    def record(self, name, duration, budget=None, exceeded=False):
+        """
+        Record a call of the method *name* lasting *duration* seconds.
+        """
+        with self._lock:
+            self._durations[name].append(duration)
+            if budget is not None:
+                self._budgets[name] = budget
+            if exceeded:
+                self._exceeded[name] += 1
+
+    def distribution(self, name):
+        """
+        Return the Distribution of the durations of the method *name*.
+        """
+        with self._lock:
+            durations = sorted(self._durations[name])
+        return Distribution(len(durations), percentile(durations, 0.5),
+                            percentile(durations, 0.9),
+                            percentile(durations, 0.99), durations[-1])
+
+    def clear(self):
+        """
+        Forget all recorded durations.
+        """
+        with self._lock:
+            self._durations.clear()
+            self._budgets.clear()
+            self._exceeded.clear()
+
+    def report(self):
+        """
+        Return a string describing the distribution of each method having
+        a budget or None if no duration has been recorded.
+        """
+        with self._lock:
+            names = sorted(self._durations)
+        if not names:
+            return None
+
+        lines = ['cricri: duration budgets']
+        for name in names:
+            distribution = self.distribution(name)
+            lines.append(
+                '  {}: {} calls, {} over the {:.1f}ms budget, p50 {:.1f}ms,'
+                ' p90 {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms'.format(
+                    name, distribution.count, self._exceeded[name],
+                    self._budgets[name] * 1000, distribution.p50 * 1000,
+                    distribution.p90 * 1000, distribution.p99 * 1000,
+                    distribution.max * 1000))
+        return '\n'.join(lines)
+
+
+DURATIONS = Durations()
+
+
+def print_report(stream=None):
+    """
+    Write the report of the durations recorded in DURATIONS on *stream* -
+    standard error by default - if a budget has been checked.
+    """
+    text = DURATIONS.report()
+    if text is not None:
+        print(text, file=sys.stderr if stream is None else stream)
+
+
+def check(method, test_case, name, duration):
+    """
+    Check that a call of *method* on *test_case* lasting *duration* seconds
+    respects its budget. *name* identifies the method in DURATIONS.
+    Budgets of profiled steps are not checked since the profilers slow
+    them down.
+    """
+    if getattr(test_case, 'profile_dir', None) is not None:
+        return
+
+    budget = getattr(method, 'max_duration', None)
+    if budget is None:
+        seconds = getattr(test_case, 'default_max_duration', None)
+        if seconds is None:
+            return
+        budget = DurationBudget(seconds, None)
+
+    exceeded = duration > budget.seconds
+    DURATIONS.record(name, duration, budget.seconds, exceeded)
+    if not exceeded:
+        return
+
+    distribution = DURATIONS.distribution(name)
+    message = ('{} took {:.1f}ms, more than its {:.1f}ms budget'
+               ' (p50 {:.1f}ms, p90 {:.1f}ms, max {:.1f}ms over {} calls)'
+               .format(name, duration * 1000, budget.seconds * 1000,
+                       distribution.p50 * 1000, distribution.p90 * 1000,
+                       distribution.max * 1000, distribution.count))
+    soft = budget.soft
+    if soft is None:
+        soft = getattr(test_case, 'max_duration_soft', False)
+    if soft:
+        warnings.warn(message, DurationBudgetWarning)
+    else:
+        raise AssertionError(message)
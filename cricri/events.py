@@ -0,0 +1,129 @@
+"""
+Publish the lifecycle of scenarios, steps, servers and clients to
+listeners, so that timing, profiling, reporting or tracing tools do not
+need to patch cricri.
+
+Listeners are called with keyword arguments in the thread emitting the
+event. Times are time.monotonic() values and *error* is the exception
+raised by a method or None.
+
+scenario_start - test_case, time
+scenario_end - test_case, start, end, failed
+scenario_skipped - test_case, reason
+step_start - test_case, step, time
+step_skipped - test_case, step, reason
+step_end - test_case, step, start, end
+step_input_start - test_case, step, method, time
+step_input_end - test_case, step, method, start, end, error
+test_method_end - test_case, step, method, start, end, error
+server_spawned - server, time
+server_exited - server, start, end
+server_output - server, fd, text, time
+server_wait - server, fd, expected, start, end, found
+client_request - client, request, start, end, details
+process_growth - server, growth
+
+Emitting an event without listener costs a dict lookup, hot paths check
+`LISTENERS[name]` before building the event arguments.
+
+    >>> calls = []
+    >>> def listener(**kwargs):
+    ...     calls.append(kwargs)
+    >>> subscribe('server_spawned', listener)
+    >>> emit('server_spawned', server='server', time=1.0)
+    >>> unsubscribe('server_spawned', listener)
+    >>> emit('server_spawned', server='server', time=2.0)
+    >>> calls
+    [{'server': 'server', 'time': 1.0}]
+"""
+
+import threading
+import time
+import unittest
+
+EVENTS = ('scenario_start', 'scenario_end', 'scenario_skipped',
+          'step_start', 'step_end', 'step_skipped', 'step_input_start',
+          'step_input_end', 'test_method_end', 'server_spawned',
+          'server_exited', 'server_output', 'server_wait', 'client_request',
+          'process_growth')
+
+LISTENERS = {name: () for name in EVENTS}
+_lock = threading.Lock()
+
+
+def _check(name):
+    if name not in LISTENERS:
+        raise ValueError('unknown event {!r}, events are: {}'
+                         .format(name, ', '.join(EVENTS)))
+
+
+def subscribe(name, listener):
+    """
+    Call *listener* with the arguments of each *name* event.
+    """
+    _check(name)
+    with _lock:
+        LISTENERS[name] = LISTENERS[name] + (listener,)
+
+
+def unsubscribe(name, listener):
+    """
+    Stop calling *listener* on *name* events.
+    """
+    _check(name)
+    with _lock:
+        listeners = list(LISTENERS[name])
+        listeners.remove(listener)
+        LISTENERS[name] = tuple(listeners)
+
+
+def emit(event, **kwargs):
+    """
+    Call the listeners of the *event* event with *kwargs*.
+    """
+    for listener in LISTENERS[event]:
+        listener(**kwargs)
+
+
+def watch(test_case):
+    """
+    Emit scenario_start and scenario_end events when the setUpClass and
+    tearDownClass methods of the generated *test_case* are called. The
+    scenario_end event is also emitted when setUpClass fails and the
+    scenario_skipped event when it raises unittest.SkipTest. A
+    scenario_start listener can raise unittest.SkipTest to skip the
+    scenario.
+    """
+    scenario_info = test_case.__cricri_scenario__
+    set_up = test_case.setUpClass
+    tear_down = test_case.tearDownClass
+
+    def setUpClass(cls):
+        scenario_info.start_time = time.monotonic()
+        try:
+            if LISTENERS['scenario_start']:
+                emit('scenario_start', test_case=cls,
+                     time=scenario_info.start_time)
+            set_up()
+        except unittest.SkipTest as skip:
+            if LISTENERS['scenario_skipped']:
+                emit('scenario_skipped', test_case=cls, reason=str(skip))
+            raise
+        except Exception:
+            if LISTENERS['scenario_end']:
+                emit('scenario_end', test_case=cls,
+                     start=scenario_info.start_time, end=time.monotonic(),
+                     failed=True)
+            raise
+
+    def tearDownClass(cls):
+        try:
+            tear_down()
+        finally:
+            if LISTENERS['scenario_end']:
+                emit('scenario_end', test_case=cls,
+                     start=scenario_info.start_time, end=time.monotonic(),
+                     failed=scenario_info.failed)
+
+    test_case.setUpClass = classmethod(setUpClass)
+    test_case.tearDownClass = classmethod(tearDownClass)
@@ -0,0 +1,268 @@
+"""
+Persist outcome and duration of executed scenarios in order to run
+previously failing and fast scenarios first and to share scenarios
+between parallel workers.
+"""
+
+import sqlite3
+import time
+from collections import namedtuple
+
+from . import events, results
+
+ScenarioStats = namedtuple('ScenarioStats',
+                           'runs failures last_failed mean_duration')
+
+
+class RunHistory:
+    """
+    Store per-scenario outcome and duration in a SQLite file.
+
+    >>> history = RunHistory(':memory:')
+    >>> history.record('Base:A,B', failed=False, duration=2.0)
+    >>> history.record('Base:A,C', failed=True, duration=4.0)
+    >>> history.record('Base:A,B', failed=False, duration=1.0)
+    >>> history.stats('Base:A,B')
+    ScenarioStats(runs=2, failures=0, last_failed=False, mean_duration=1.5)
+    >>> history.prioritize(['Base:A,B', 'Base:A,D', 'Base:A,C'])
+    ['Base:A,C', 'Base:A,D', 'Base:A,B']
+    """
+
+    SNAPSHOT_COLUMNS = (('previous_runs', 'INTEGER NOT NULL DEFAULT 0'),
+                        ('previous_duration', 'REAL NOT NULL DEFAULT 0.0'),
+                        ('updated', 'REAL NOT NULL DEFAULT 0.0'))
+
+    def __init__(self, path):
+        self.path = path
+        self.opened = time.time()
+        self._recorded = set()
+        self._watched = set()
+        self._subscribed = False
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS scenario ('
+                ' name TEXT PRIMARY KEY,'
+                ' runs INTEGER NOT NULL,'
+                ' failures INTEGER NOT NULL,'
+                ' last_failed INTEGER NOT NULL,'
+                ' total_duration REAL NOT NULL)')
+            columns = {row[1] for row in self._connection.execute(
+                'PRAGMA table_info(scenario)')}
+            for column, definition in self.SNAPSHOT_COLUMNS:
+                if column not in columns:
+                    self._connection.execute(
+                        'ALTER TABLE scenario ADD COLUMN {} {}'.format(
+                            column, definition))
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS step ('
+                ' name TEXT PRIMARY KEY,'
+                ' runs INTEGER NOT NULL,'
+                ' total_duration REAL NOT NULL)')
+
+    def record(self, scenario, failed, duration, steps=()):
+        """
+        Record a run of *scenario* and of its *steps*, a sequence of
+        tuples (step name, duration), in one transaction.
+
+        The statistics preceding the first run recorded by this RunHistory
+        are kept as the snapshot used by `shard`.
+        """
+        with self._connection:
+            self._connection.execute(
+                'INSERT OR IGNORE INTO scenario'
+                ' (name, runs, failures, last_failed, total_duration)'
+                ' VALUES (?, 0, 0, 0, 0.0)', (scenario,))
+            if scenario not in self._recorded:
+                self._connection.execute(
+                    'UPDATE scenario SET previous_runs = runs,'
+                    ' previous_duration = total_duration'
+                    ' WHERE name = ?', (scenario,))
+            self._connection.execute(
+                'UPDATE scenario SET runs = runs + 1,'
+                ' failures = failures + ?,'
+                ' last_failed = ?,'
+                ' total_duration = total_duration + ?,'
+                ' updated = ?'
+                ' WHERE name = ?',
+                (int(failed), int(failed), duration, time.time(), scenario))
+            self._record_steps(steps)
+        self._recorded.add(scenario)
+
+    def record_step(self, step, duration):
+        """
+        Record a run of *step*.
+        """
+        with self._connection:
+            self._record_steps([(step, duration)])
+
+    def _record_steps(self, steps):
+        steps = list(steps)
+        self._connection.executemany(
+            'INSERT OR IGNORE INTO step VALUES (?, 0, 0.0)',
+            [(step,) for step, _ in steps])
+        self._connection.executemany(
+            'UPDATE step SET runs = runs + 1,'
+            ' total_duration = total_duration + ?'
+            ' WHERE name = ?',
+            [(duration, step) for step, duration in steps])
+
+    def step_durations(self):
+        """
+        Return a dict mapping step name to its mean duration.
+        """
+        rows = self._connection.execute(
+            'SELECT name, total_duration / runs FROM step')
+        return dict(rows)
+
+    def stats(self, scenario):
+        """
+        Return the ScenarioStats of *scenario* or None if it has never run.
+        """
+        return self.all_stats().get(scenario)
+
+    def all_stats(self):
+        """
+        Return a dict mapping scenario name to ScenarioStats.
+        """
+        rows = self._connection.execute(
+            'SELECT name, runs, failures, last_failed, total_duration'
+            ' FROM scenario')
+        return {
+            name: ScenarioStats(runs, failures, bool(last_failed),
+                                total_duration / runs)
+            for name, runs, failures, last_failed, total_duration
+            in rows
+        }
+
+    def durations_before(self, since):
+        """
+        Return a dict mapping scenario name to its mean duration recorded
+        before the *since* time.time() value. The runs recorded later by
+        each RunHistory are ignored.
+        """
+        rows = self._connection.execute(
+            'SELECT name,'
+            ' CASE WHEN updated >= ? THEN previous_runs ELSE runs END,'
+            ' CASE WHEN updated >= ? THEN previous_duration'
+            ' ELSE total_duration END'
+            ' FROM scenario', (since, since))
+        return {name: total_duration / runs
+                for name, runs, total_duration in rows
+                if runs}
+
+    def prioritize(self, scenarios):
+        """
+        Sort *scenarios* to run previously failing scenarios first, then
+        scenarios without history and finally passing scenarios.
+        Each group is sorted from the fastest to the slowest scenario.
+        """
+        all_stats = self.all_stats()
+
+        def key(scenario):
+            stats = all_stats.get(scenario)
+            if stats is None:
+                return (1, 0.0)
+            if stats.last_failed:
+                return (0, stats.mean_duration)
+            return (2, stats.mean_duration)
+
+        return sorted(scenarios, key=key)
+
+    def shard(self, scenarios, index, count, since=None):
+        """
+        Split *scenarios* between *count* workers and return the scenarios
+        of the worker *index* keeping the *scenarios* order.
+
+        The slowest scenarios are assigned first, each to the least loaded
+        worker, so that every worker gets about the same amount of work.
+        Scenarios without history are assumed to last the mean duration
+        and ties are broken by a hash of the scenario name.
+
+        The durations are the ones recorded before *since* - a time.time()
+        value, the opening of this RunHistory by default - so that workers
+        loading the history while other workers record their outcomes
+        agree on the split. Parallel workers opening the history at
+        different times should pass the start time of the whole run.
+
+        >>> history = RunHistory(':memory:')
+        >>> for name, duration in (('a', 10), ('b', 9), ('c', 2),
+        ...                        ('d', 1), ('e', 1)):
+        ...     history.record(name, failed=False, duration=duration)
+        >>> names = ['a', 'b', 'c', 'd', 'e']
+        >>> since = time.time()
+        >>> history.shard(names, 0, 2, since), history.shard(names, 1, 2,
+        ...                                                  since)
+        (['a', 'd', 'e'], ['b', 'c'])
+        """
+        if not 0 <= index < count:
+            raise ValueError('shard index must be between 0 and {}'
+                             .format(count - 1))
+
+        durations = self.durations_before(
+            self.opened if since is None else since)
+        default = (sum(durations.values()) / len(durations)
+                   if durations else 1.0)
+
+        def key(scenario):
+            return (-durations.get(scenario, default),
+                    results.scenario_hash(scenario))
+
+        loads = [0.0] * count
+        selected = set()
+        for scenario in sorted(set(scenarios), key=key):
+            worker = loads.index(min(loads))
+            loads[worker] += durations.get(scenario, default)
+            if worker == index:
+                selected.add(scenario)
+
+        return [scenario for scenario in scenarios if scenario in selected]
+
+    def listeners(self):
+        """
+        Return a list of tuples (event name, listener) recording the
+        watched test cases.
+        """
+        return [('scenario_end', self.on_scenario_end)]
+
+    def watch(self, test_case):
+        """
+        Record the duration and the outcome of the generated *test_case*
+        and of its steps when its scenario_end event is emitted.
+        """
+        if not self._subscribed:
+            for name, listener in self.listeners():
+                events.subscribe(name, listener)
+            self._subscribed = True
+        self._watched.add(test_case)
+
+    def on_scenario_end(self, test_case, start, end, failed):
+        if test_case not in self._watched:
+            return
+        scenario_info = test_case.__cricri_scenario__
+        self.record(scenario_info.name, failed, end - start,
+                    scenario_info.durations)
+
+    def import_results(self, path):
+        """
+        Record the scenarios and the steps run in the *path* results file
+        written by cricri.results. Skipped scenarios and steps are ignored.
+        """
+        for record in results.read(path):
+            if record['outcome'] == 'skipped':
+                continue
+            self.record(record['scenario'], record['outcome'] == 'failed',
+                        record['duration'],
+                        [(step_result['step'], step_result['duration'])
+                         for step_result in record['step_results']
+                         if step_result['outcome'] != 'skipped'])
+
+    def close(self):
+        """
+        Stop watching test cases and close the SQLite connection.
+        """
+        if self._subscribed:
+            for name, listener in self.listeners():
+                events.unsubscribe(name, listener)
+            self._subscribed = False
+        self._connection.close()
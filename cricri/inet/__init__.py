@@ -16,6 +16,11 @@ class Client:
     intantiate clients. If attr_name is 'foo_clients', you can create a
     foo_clients list in TestServer sub class to instanciate FooClient.
 
+    Client sub-classes should set `action_time` attribute to the
+    time.monotonic() value when they send a request, so that the server
+    latency can be measured with `Server.latency`. The `name` attribute is
+    set by `cricri.inet.TestServer` and identifies the client in events.
+
     Example::
 
         class FooClient(Client):
@@ -33,6 +38,8 @@ class Client:
     """
 
     attr_name = NotImplemented
+    action_time = None
+    name = None
 
     def close(self):
         """
@@ -13,6 +13,7 @@ from xml.dom.minidom import parseString
 from voluptuous import (All, Any, Optional, Range, Required)
 
 from . import Client, port_def
+from ..events import LISTENERS, emit
 from ..__version__ import __version__
 
 
@@ -275,6 +276,7 @@ class HTTPClient(Client):
         self.response = None
         for _ in range(self.tries):
             start = time.time()
+            self.action_time = time.monotonic()
             try:
                 self.response = HTTPResponse(urlopen(request, timeout=timeout))
 
@@ -296,6 +298,14 @@ class HTTPClient(Client):
                 socket_error = None
                 break
 
+        if LISTENERS['client_request']:
+            emit('client_request', client=self,
+                 request='{} {}'.format(method, path),
+                 start=self.action_time,
+                 end=time.monotonic(),
+                 details={'status': getattr(self.response, 'status_code',
+                                            None)})
+
         if socket_error is not None:
             raise socket_error
 
@@ -1,16 +1,236 @@
 import asyncio
-import operator
+import bisect
+import codecs
+import functools
+import os
 import re
 import signal
+import tempfile
+import threading
 import time
-from typing import Dict, Optional, Callable, Union, List
+from collections import namedtuple
+from typing import Dict, Optional, TextIO, Union, List, Tuple
+
+from ..events import LISTENERS, emit
 
 STDOUT = 1
 STDERR = 2
+FD_NAMES = {STDOUT: 'stdout', STDERR: 'stderr'}
 
 Timeout = Union[int, float]
 
 
+class OutputChunks:
+    """
+    Store chunks written on an output.
+
+    The chunks are joined only when the text is read. If *max_size* is set,
+    only the last *max_size* characters are kept in memory, older chunks are
+    written in *spill_file* if it is set else they are dropped.
+
+    >>> output = OutputChunks(max_size=8)
+    >>> for chunk in ('Hello ', 'World', '!'):
+    ...     output.append(chunk)
+    >>> output.text_from(10)
+    (10, 'd!')
+    >>> output.text()
+    'o World!'
+    >>> output.length
+    12
+
+    Each chunk is stamped with its arrival time::
+
+    >>> output = OutputChunks()
+    >>> output.append('Hello ', timestamp=10.0)
+    >>> output.append('World', timestamp=12.5)
+    >>> output.time_at(8), output.offset_at(11.0)
+    (12.5, 6)
+    """
+
+    def __init__(self, max_size: Optional[int] = None, spill_file=None):
+        self.max_size = max_size
+        self.spill_file = spill_file
+        self.length = 0
+        self.start = 0
+        self._chunks = []
+        self._offsets = []
+        self._size = 0
+        self._spilled = []
+        self._spilled_text = ''
+        self._nb_read = 0
+        self._stamp_offsets = []
+        self._stamp_times = []
+
+    def append(self, chunk: str, timestamp: Optional[float] = None):
+        """
+        Add *chunk* received at *timestamp* - time.monotonic() by default.
+        """
+        if not chunk:
+            return
+
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self._stamp_offsets.append(self.length)
+        self._stamp_times.append(timestamp)
+        self._chunks.append(chunk)
+        self._offsets.append(self.length)
+        self._size += len(chunk)
+        self.length += len(chunk)
+        if self.max_size is not None and self._size > self.max_size:
+            self._evict(self._size - self.max_size)
+
+    def _evict(self, size: int):
+        """
+        Remove the *size* oldest characters from memory.
+        """
+        evicted = []
+        nb_chunks = 0
+        for chunk in self._chunks:
+            if len(chunk) > size:
+                break
+            evicted.append(chunk)
+            size -= len(chunk)
+            nb_chunks += 1
+
+        del self._chunks[:nb_chunks]
+        del self._offsets[:nb_chunks]
+        if size:
+            evicted.append(self._chunks[0][:size])
+            self._chunks[0] = self._chunks[0][size:]
+            self._offsets[0] += size
+
+        text = ''.join(evicted)
+        self._size -= len(text)
+        self.start += len(text)
+        index = bisect.bisect_right(self._stamp_offsets, self.start) - 1
+        del self._stamp_offsets[:index]
+        del self._stamp_times[:index]
+        if self.spill_file is not None:
+            self.spill(text)
+
+    def spill(self, text: Optional[str] = None):
+        """
+        Write *text* - by default the chunks in memory - to the spill file.
+        """
+        if text is None:
+            text = ''.join(self._chunks)
+            self.start = self.length
+            self._chunks.clear()
+            self._offsets.clear()
+            self._stamp_offsets.clear()
+            self._stamp_times.clear()
+            self._size = 0
+
+        if text:
+            data = text.encode('utf-8')
+            self.spill_file.seek(0, 2)
+            self._spilled.append((self.spill_file.tell(), len(data)))
+            self.spill_file.write(data)
+
+    def text(self) -> str:
+        """
+        Return the text kept in memory.
+        """
+        if len(self._chunks) > 1:
+            self._chunks = [''.join(self._chunks)]
+            self._offsets = [self.start]
+        return self._chunks[0] if self._chunks else ''
+
+    def text_from(self, offset: int):
+        """
+        Return a tuple (start, text) where text is the text kept in memory
+        from the *offset* character, or from the first character kept if
+        it is older. Only the chunks from the one containing it are joined.
+        """
+        offset = max(offset, self.start)
+        if offset >= self.length:
+            return self.length, ''
+        index = bisect.bisect_right(self._offsets, offset) - 1
+        return offset, ''.join(
+            [self._chunks[index][offset - self._offsets[index]:]]
+            + self._chunks[index + 1:])
+
+    def time_at(self, offset: int) -> Optional[float]:
+        """
+        Return the arrival time of the *offset* character or None if it
+        is no longer kept in memory.
+        """
+        index = bisect.bisect_right(self._stamp_offsets, offset) - 1
+        if index < 0 or not self.start <= offset < self.length:
+            return None
+        return self._stamp_times[index]
+
+    def offset_at(self, timestamp: float) -> int:
+        """
+        Return the offset of the first character kept in memory arrived
+        at or after *timestamp*.
+        """
+        index = bisect.bisect_left(self._stamp_times, timestamp)
+        if index == len(self._stamp_times):
+            return self.length
+        return max(self._stamp_offsets[index], self.start)
+
+    def full_text(self) -> str:
+        """
+        Return the spilled text followed by the text kept in memory. Only
+        the text spilled since the previous call is read from the spill
+        file.
+        """
+        if self._nb_read < len(self._spilled):
+            texts = [self._spilled_text]
+            for offset, size in self._spilled[self._nb_read:]:
+                self.spill_file.seek(offset)
+                texts.append(self.spill_file.read(size).decode('utf-8'))
+            self._spilled_text = ''.join(texts)
+            self._nb_read = len(self._spilled)
+        return self._spilled_text + self.text()
+
+
+Measure = namedtuple('Measure', 'section name value')
+Measure.__doc__ = """
+The *value* of the measure *name* taken during the *section*.
+"""
+
+Latency = namedtuple('Latency', 'pattern seconds')
+Latency.__doc__ = """
+The output matching *pattern* is written *seconds* after a client action.
+"""
+
+ProcessSample = namedtuple('ProcessSample', 'time rss cpu fds threads')
+ProcessSample.__doc__ = """
+Resources used by a process at *time* - a time.monotonic() value: the
+resident set size *rss* in bytes, the user and system *cpu* time in
+seconds, the number of open file descriptors *fds* and of *threads*.
+"""
+
+
+def read_process_sample(pid: int) -> Optional[ProcessSample]:
+    """
+    Read the resources used by the process *pid* from /proc or return None
+    if they cannot be read.
+    """
+    timestamp = time.monotonic()
+    proc = '/proc/{}'.format(pid)
+    try:
+        with open(proc + '/stat') as stat_file:
+            stat = stat_file.read()
+        with open(proc + '/statm') as statm_file:
+            statm = statm_file.read()
+        fds = len(os.listdir(proc + '/fd'))
+    except OSError:
+        return None
+
+    # Fields following the command name which can contain spaces.
+    fields = stat[stat.rindex(')') + 2:].split()
+    clock_ticks = os.sysconf('SC_CLK_TCK')
+    return ProcessSample(
+        time=timestamp,
+        rss=int(statm.split()[1]) * os.sysconf('SC_PAGE_SIZE'),
+        cpu=(int(fields[11]) + int(fields[12])) / clock_ticks,
+        fds=fds,
+        threads=int(fields[17]))
+
+
 class IOHistory:
     """
     Store Outputs of running server.
@@ -32,76 +252,248 @@ class IOHistory:
     'Chao'
     >>> history.get_history(STDOUT, 'First Section')
     'Hello World'
+
+    Chunks added before the first section are added to the first section.
+
+    max_size - if set, only the last *max_size* characters of each output
+               of each section are kept in memory.
+    spill - if True, the outputs of previous sections and the characters
+            exceeding *max_size* are moved to a temporary file instead of
+            being dropped.
     """
 
-    def __init__(self):
+    def __init__(self, max_size: Optional[int] = None, spill: bool = False):
+        self.max_size = max_size
+        self._spill_file = tempfile.TemporaryFile() if spill else None
         self._history = {}
-        self._current_section = {}
+        self._current_section = self._new_outputs()
+        self._section_name = None
+        self._measures = []
+        self._logs = {}
+        self._lock = threading.Lock()
 
-    def new_section(self, name: str):
-        self._current_section = {
-            STDERR: '',
-            STDOUT: ''
+    def _new_outputs(self):
+        return {
+            STDERR: OutputChunks(self.max_size, self._spill_file),
+            STDOUT: OutputChunks(self.max_size, self._spill_file)
         }
-        self._history[name] = self._current_section
 
-    def add_stdout_chunk(self, chunk: str):
-        try:
-            self._current_section[STDOUT] += chunk
-        except KeyError:
-            raise RuntimeError('new_section method should be called')
+    def set_logs(self, logs: Dict[int, TextIO]):
+        """
+        Write the current section outputs then each new chunk to *logs*,
+        a dict mapping STDOUT and STDERR to text files. An empty dict stops
+        writing.
+        """
+        with self._lock:
+            self._logs = logs
+            for fd, log in logs.items():
+                log.write(self._current_section[fd].full_text())
 
-    def add_stderr_chunk(self, chunk: str):
-        try:
-            self._current_section[STDERR] += chunk
-        except KeyError:
-            raise RuntimeError('new_section method should be called')
+    def new_section(self, name: str):
+        with self._lock:
+            for log in self._logs.values():
+                log.write('{:-^78}\n'.format(' {} '.format(name)))
+            if self._history:
+                if self._spill_file is not None:
+                    for output in self._current_section.values():
+                        output.spill()
+                self._current_section = self._new_outputs()
+            self._history[name] = self._current_section
+            self._section_name = name
+
+    def clear(self):
+        """
+        Remove every section, the next chunks are added to the next section.
+        """
+        with self._lock:
+            self._history = {}
+            self._section_name = None
+            self._measures = []
+            if self._spill_file is not None:
+                self._spill_file.truncate(0)
+            self._current_section = self._new_outputs()
 
-    def add_chunk(self, fd: int, chunk: str):
+    def add_stdout_chunk(self, chunk: str,
+                         timestamp: Optional[float] = None):
+        with self._lock:
+            self._current_section[STDOUT].append(chunk, timestamp)
+            if STDOUT in self._logs:
+                self._logs[STDOUT].write(chunk)
+
+    def add_stderr_chunk(self, chunk: str,
+                         timestamp: Optional[float] = None):
+        with self._lock:
+            self._current_section[STDERR].append(chunk, timestamp)
+            if STDERR in self._logs:
+                self._logs[STDERR].write(chunk)
+
+    def add_chunk(self, fd: int, chunk: str,
+                  timestamp: Optional[float] = None):
         if fd == STDOUT:
-            self.add_stdout_chunk(chunk)
+            self.add_stdout_chunk(chunk, timestamp)
         elif fd == STDERR:
-            self.add_stderr_chunk(chunk)
+            self.add_stderr_chunk(chunk, timestamp)
+
+    def get_time(self, fd: int, offset: int) -> Optional[float]:
+        """
+        Return the arrival time of the *offset* character of the current
+        section or None if it is no longer kept in memory.
+        """
+        with self._lock:
+            return self._current_section[fd].time_at(offset)
+
+    def get_offset(self, fd: int, timestamp: float) -> int:
+        """
+        Return the offset of the first character of the current section
+        arrived at or after *timestamp*.
+        """
+        with self._lock:
+            return self._current_section[fd].offset_at(timestamp)
+
+    def add_measure(self, name: str, value):
+        """
+        Attach the measure *name* to the current section.
+        """
+        with self._lock:
+            self._measures.append(
+                Measure(self._section_name, name, value))
+
+    def measures(self, name: Optional[str] = None) -> List['Measure']:
+        """
+        Return the list of Measure named *name* - every Measure by default.
+        """
+        with self._lock:
+            return [measure for measure in self._measures
+                    if name is None or measure.name == name]
 
     def get_history(self, fd: int, section=None):
-        if section is None:
-            return self._current_section[fd]
-        return self._history[section][fd]
+        with self._lock:
+            if section is None:
+                return self._current_section[fd].full_text()
+            return self._history[section][fd].full_text()
+
+    def get_history_from(self, fd: int, offset: int):
+        """
+        Return a tuple (start, text) where text is the current section
+        history from *start* offset, *start* being *offset* if this part
+        is kept in memory.
+        """
+        with self._lock:
+            return self._current_section[fd].text_from(offset)
+
+    def get_length(self, fd: int) -> int:
+        """
+        Return the number of characters written in the current section.
+        """
+        with self._lock:
+            return self._current_section[fd].length
 
     def __iter__(self):
-        return iter(self._history.items())
+        """
+        Yield (name, outputs) of each section, outputs being a dict
+        mapping STDOUT and STDERR to text. Outputs written before the
+        first section are yielded in a 'start' section.
+        """
+        with self._lock:
+            sections = list(self._history.items())
+            if not sections and any(output.length for output
+                                    in self._current_section.values()):
+                sections = [('start', self._current_section)]
+
+        for name, outputs in sections:
+            with self._lock:
+                texts = {fd: output.full_text()
+                         for fd, output in outputs.items()}
+            yield name, texts
+
+    def close(self):
+        """
+        Close the spill file.
+        """
+        if self._spill_file is not None:
+            self._spill_file.close()
+
+
+class EventLoopThread:
+    """
+    Run an asyncio event loop forever in a daemon thread.
+
+    Subprocess pipes bound to this loop are read as soon as data is
+    written even when no assert method is running.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever,
+                                        name='cricri-event-loop',
+                                        daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def get(cls) -> 'EventLoopThread':
+        """
+        Return the EventLoopThread shared by all servers.
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def run(self, coroutine):
+        """
+        Run *coroutine* in the loop thread and wait for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            coroutine, self.loop).result()
 
 
 class SubprocessProtocol(asyncio.SubprocessProtocol):
     class OutputWatcher:
         def __init__(self):
-            self._future_from_fd: Dict[int: Optional[asyncio.Future]] = {
-                STDOUT: None,
-                STDERR: None
+            self._futures_from_fd: Dict[int, List[asyncio.Future]] = {
+                STDOUT: [],
+                STDERR: []
             }
 
         def wait_for(self, fd: int) -> asyncio.Future:
             loop = asyncio.get_running_loop()
             future = loop.create_future()
-            self._future_from_fd[fd] = future
+            self._futures_from_fd[fd].append(future)
             return future
 
         def set_result_if_waiting(self, fd, result):
             """
-            Set result on future returned by the `wait_for` method.
+            Set result on futures returned by the `wait_for` method.
             """
-            future = self._future_from_fd[fd]
-            if future is not None:
+            futures = self._futures_from_fd[fd]
+            self._futures_from_fd[fd] = []
+            for future in futures:
                 if not future.cancelled():
-                    self._future_from_fd[fd].set_result(result)
-                self._future_from_fd[fd] = None
+                    future.set_result(result)
 
     def __init__(self,
                  on_exit: asyncio.Future,
-                 history: IOHistory):
+                 history: IOHistory,
+                 server: Optional['Server'] = None):
         self.on_exit = on_exit
         self.history = history
+        self.server = server
+        self.exit_time = None
         self._output_waiter = self.OutputWatcher()
+        self._decoders = {}
+        self.on_close = None
+
+    def connection_made(self, transport):
+        self.on_close = asyncio.get_running_loop().create_future()
+
+    def output_future(self, fd: int) -> asyncio.Future:
+        """
+        Return a future done when bytes are written on the output.
+        """
+        return self._output_waiter.wait_for(fd)
 
     async def wait_for_output(self, fd: int, timeout: Timeout = 3):
         """
@@ -116,64 +508,209 @@ class SubprocessProtocol(asyncio.SubprocessProtocol):
         )
 
     def pipe_data_received(self, fd, data):
-        message = data.decode()
-        self.history.add_chunk(fd, message)
+        timestamp = time.monotonic()
+        decoder = self._decoders.get(fd)
+        if decoder is None:
+            decoder = self._decoders[fd] = codecs.getincrementaldecoder(
+                'utf-8')(errors='replace')
+        message = decoder.decode(data)
+        self.history.add_chunk(fd, message, timestamp)
+        if LISTENERS['server_output']:
+            emit('server_output', server=self.server, fd=fd, text=message,
+                 time=timestamp)
         self._output_waiter.set_result_if_waiting(fd, message)
 
     def pipe_connection_lost(self, fd, exc):
         pass
 
     def process_exited(self):
+        self.exit_time = time.monotonic()
         self.on_exit.set_result(True)
 
+    def connection_lost(self, exc):
+        self.on_close.set_result(True)
+
+
+class OutputCursor:
+    """
+    Search an expected value in the current section of an output history
+    reading only the text written since the previous search.
+
+    exhausted is True when the expected value cannot be found anymore.
+    """
+
+    exhausted = False
+
+    def search(self, history: IOHistory, fd: int):
+        """
+        Returns a tuple (start, end, match) or None if expected value
+        is not found.
+        """
+        raise NotImplementedError
+
+
+class RegexCursor(OutputCursor):
+    """
+    Search *pattern* in new text and in the *overlap* last characters
+    already read in order to find matches spanning several chunks. Only
+    this tail of the text already read is scanned again.
+
+    >>> history = IOHistory()
+    >>> cursor = RegexCursor('wor+ld')
+    >>> history.add_stdout_chunk('Hello wo')
+    >>> cursor.search(history, STDOUT) is None
+    True
+    >>> history.add_stdout_chunk('rld')
+    >>> cursor.search(history, STDOUT)[:2]
+    (6, 11)
+    """
+
+    def __init__(self, pattern: str, overlap: int = 4096, start: int = 0):
+        """
+        start - the offset where the search begins.
+        """
+        self.regex = compile_pattern(pattern)
+        self.overlap = overlap
+        self.start = start
+        self.position = start
+
+    def search(self, history: IOHistory, fd: int):
+        scan_from = max(self.position - self.overlap, self.start)
+        # Read the character before scan_from so '^' only matches
+        # at the beginning of the history.
+        start, text = history.get_history_from(fd, max(scan_from - 1, 0))
+        match = self.regex.search(text, max(scan_from - start, 0))
+        self.position = start + len(text)
+        if match is None:
+            return None
+        return start + match.start(), start + match.end(), match
+
+
+class EqualCursor(OutputCursor):
+    """
+    Test that the history is *expected*. The history is read only when
+    its length is the *expected* length.
+    """
+
+    def __init__(self, expected: str):
+        self.expected = expected
+
+    def search(self, history: IOHistory, fd: int):
+        length = history.get_length(fd)
+        if length > len(self.expected):
+            self.exhausted = True
+        elif (length == len(self.expected)
+              and history.get_history(fd) == self.expected):
+            return 0, length, None
+        return None
+
+
+compile_pattern = functools.lru_cache(maxsize=256)(re.compile)
+
 
 class Server:
     """
     Wrap server process and provide assert methods.
+
+    The process is bound to the event loop running in the EventLoopThread,
+    so its outputs are recorded continuously and the process never blocks
+    on a full pipe. Assert methods can be called from any thread.
     """
 
     _protocol: SubprocessProtocol
     _on_subprocess_exist: asyncio.Future
     kill_signal: signal
+    kill_timeout: Optional[float]
     history: IOHistory
 
     def __init__(self,
                  parameters: List[str],
                  kill_signal=signal.SIGINT,
-                 env: Optional[Dict[str, str]] = None):
+                 env: Optional[Dict[str, str]] = None,
+                 history_max_size: Optional[int] = None,
+                 history_spill: bool = False,
+                 kill_timeout: Optional[float] = None,
+                 sample_interval: Optional[float] = None,
+                 start: bool = True,
+                 name: Optional[str] = None):
         """
         parameters - The list of Popen parameters.
         kill_signal - The signal used to kill the process.
         env - environment variables dict
+        history_max_size - maximal number of characters kept in memory
+                           per output and per section.
+        history_spill - move old outputs to a temporary file.
+        kill_timeout - seconds to wait after kill_signal before sending
+                       SIGKILL, None to wait forever.
+        sample_interval - if set, the process resources are sampled every
+                          *sample_interval* seconds - see `sample` method.
+        start - spawn the process now, otherwise the `start` coroutine
+                must be awaited on the EventLoopThread loop.
+        name - name of the server in events and traces.
         """
-        self.history = IOHistory()
+        self.name = name
+        self.start_time = None
+        self.parameters = parameters
+        self.env = env
+        self.history = IOHistory(history_max_size, history_spill)
         self.kill_signal = kill_signal
+        self.kill_timeout = kill_timeout
+        self.sample_interval = sample_interval
+        self._transport = None
+        self._sampler = None
+        self._loop_thread = EventLoopThread.get()
+        if start:
+            self._loop_thread.run(self.start())
 
-        loop = asyncio.get_event_loop()
+    async def start(self):
+        """
+        Launch the process bound to a SubprocessProtocol.
+        """
+        loop = asyncio.get_running_loop()
         self._on_subprocess_exist = loop.create_future()
-        (self._transport, self._protocol) = loop.run_until_complete(
-            loop.subprocess_exec(
-                lambda: SubprocessProtocol(
-                    self._on_subprocess_exist,
-                    self.history
-                ),
-                *parameters,
-                env=env
-            )
+        self.start_time = time.monotonic()
+        (self._transport, self._protocol) = await loop.subprocess_exec(
+            lambda: SubprocessProtocol(
+                self._on_subprocess_exist,
+                self.history,
+                self
+            ),
+            *self.parameters,
+            env=self.env
         )
+        if self.sample_interval is not None:
+            self._sampler = loop.create_task(self._sample_periodically())
+        if LISTENERS['server_spawned']:
+            emit('server_spawned', server=self, time=self.start_time)
+
+    async def _sample_periodically(self):
+        while not self._on_subprocess_exist.done():
+            self.sample()
+            await asyncio.wait([self._on_subprocess_exist],
+                               timeout=self.sample_interval)
+
+    @property
+    def running(self) -> bool:
+        """
+        True if the process is started and has not exited.
+        """
+        return (self._transport is not None
+                and not self._on_subprocess_exist.done())
 
     def assert_stdout_is(self, expected: str, timeout: Timeout):
         """
         Test that server logs *expected* on the stdout before *timeout*
         """
-        self._assert_output(operator.eq, '{read!r} != {expected!r}',
+        self._assert_output(EqualCursor(expected),
+                            '{read!r} != {expected!r}',
                             STDOUT, expected, timeout)
 
     def assert_stderr_is(self, expected: str, timeout: Timeout):
         """
         Test that server logs *expected* on the stderr before *timeout*
         """
-        self._assert_output(operator.eq, '{read!r} != {expected!r}',
+        self._assert_output(EqualCursor(expected),
+                            '{read!r} != {expected!r}',
                             STDERR, expected, timeout)
 
     def assert_stdout_regex(self, regex: str, timeout: Timeout):
@@ -181,7 +718,7 @@ class Server:
         Test that server logs on stdout before *timeout*
         and message matches *regex*
         """
-        self._assert_output(lambda a, b: re.search(b, a) is not None,
+        self._assert_output(RegexCursor(regex),
                             "The pattern {expected!r} is not found in the stdout: {read}",
                             STDOUT, regex, timeout)
 
@@ -190,50 +727,429 @@ class Server:
         Test that server logs on stderr before *timeout*
         and message matches *regex*
         """
-        self._assert_output(lambda a, b: re.search(b, a) is not None,
+        self._assert_output(RegexCursor(regex),
                             "The pattern {expected!r} is not found in the stderr: {read}",
                             STDERR, regex, timeout)
 
     def _assert_output(self,
-                       test_func: Callable[[str, str], bool],
+                       cursor: 'OutputCursor',
                        assert_msg: str,
                        fd: int,
                        expected: str,
                        timeout: Timeout):
 
-        start = time.time()
+        start = time.monotonic()
+        found = self._loop_thread.run(
+            self._wait_output(cursor, fd, timeout))
+        if LISTENERS['server_wait']:
+            emit('server_wait', server=self, fd=fd, expected=expected,
+                 start=start, end=time.monotonic(), found=found is not None)
 
-        remaining = timeout
-        data = self.history.get_history(fd)
-        if test_func(data, expected):
-            return
+        if found is None:
+            raise AssertionError(assert_msg.format(
+                expected=expected, read=self.history.get_history(fd)))
 
-        while remaining > 0:
-            loop = asyncio.get_event_loop()
+    async def _wait_output(self,
+                           cursor: 'OutputCursor',
+                           fd: int,
+                           timeout: Timeout):
+        """
+        Wait until *cursor* finds its expected value in the *fd* output.
+
+        Returns the (start, end, match) tuple found by the cursor or None
+        if the timeout is reached.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            found = cursor.search(self.history, fd)
+            if found is not None:
+                return found
+
+            remaining = deadline - loop.time()
+            if remaining <= 0 or cursor.exhausted:
+                return None
 
             try:
-                loop.run_until_complete(
-                    self._protocol.wait_for_output(fd, remaining)
-                )
+                await self._protocol.wait_for_output(fd, remaining)
             except asyncio.TimeoutError:
                 pass
 
-            remaining -= (time.time() - start)
-            data = self.history.get_history(fd)
-            if test_func(data, expected):
-                return
+    def wait_ready(self, timeout: Timeout = 10, **gates):
+        """
+        Wait until the server is ready - see the `ready` coroutine.
+        """
+        self._loop_thread.run(self.ready(timeout, **gates))
 
-        raise AssertionError(assert_msg.format(
-            expected=expected, read=data))
+    async def ready(self, timeout: Timeout = 10,
+                    stdout: Optional[str] = None,
+                    stderr: Optional[str] = None,
+                    tcp: Optional[int] = None,
+                    http: Optional[str] = None,
+                    port: Optional[int] = None,
+                    host: str = '127.0.0.1'):
+        """
+        Wait until all defined gates are open:
+            - stdout or stderr: the regex is found in the output.
+            - tcp: the port accepts TCP connections.
+            - http: the path served on port answers a 2xx or 3xx status.
+
+        Raises RuntimeError if the process exits or the timeout is reached
+        before.
+        """
+        gates = []
+        for fd, regex in ((STDOUT, stdout), (STDERR, stderr)):
+            if regex is not None:
+                gates.append(
+                    self._wait_output(RegexCursor(regex), fd, timeout))
+        if tcp is not None:
+            gates.append(probe_tcp(host, tcp))
+        if http is not None:
+            gates.append(probe_http(host, port, http))
+
+        all_gates = asyncio.ensure_future(asyncio.gather(*gates))
+        done, _ = await asyncio.wait(
+            [all_gates, self._on_subprocess_exist], timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED)
+
+        if all_gates in done and None not in all_gates.result():
+            return
+
+        all_gates.cancel()
+        if self._on_subprocess_exist in done:
+            raise RuntimeError('The process exited before being ready')
+        raise RuntimeError('The process is not ready after {}s'
+                           .format(timeout))
+
+    def sample(self) -> Optional['ProcessSample']:
+        """
+        Read the resources used by the process from /proc, attach them to
+        the current section history as a 'process' measure and return
+        the ProcessSample. Returns None if the process is not running or
+        /proc is not available.
+        """
+        if not self.running:
+            return None
+
+        sample = read_process_sample(self._transport.get_pid())
+        if sample is not None:
+            self.history.add_measure('process', sample)
+        return sample
+
+    def assert_rss_below(self, max_rss: int):
+        """
+        Test that the resident set size of the process is lower than
+        *max_rss* bytes.
+        """
+        sample = self.sample()
+        if sample is None:
+            raise AssertionError('The process resources cannot be read')
+        if sample.rss >= max_rss:
+            raise AssertionError('RSS is {} bytes, expected below {} bytes'
+                                 .format(sample.rss, max_rss))
+
+    def growth(self) -> Dict[str, Tuple[float, float]]:
+        """
+        Return a dict mapping each ProcessSample field to a tuple (first,
+        last) of values sampled since the history has been cleared.
+        """
+        samples = [measure.value
+                   for measure in self.history.measures('process')]
+        if not samples:
+            return {}
+        return {field: (getattr(samples[0], field),
+                        getattr(samples[-1], field))
+                for field in ProcessSample._fields
+                if field != 'time'}
+
+    def assert_growth_below(self, **max_growth: float):
+        """
+        Test that the growth of each ProcessSample field given as keyword
+        - rss, cpu, fds or threads - since the history has been cleared is
+        lower than its value. The process is sampled first.
+        """
+        self.sample()
+        growth = self.growth()
+        if not growth:
+            raise AssertionError('The process resources cannot be read')
+        for field, limit in sorted(max_growth.items()):
+            if field not in growth:
+                raise ValueError('unknown field {!r}, fields are: {}'.format(
+                    field, ', '.join(growth)))
+            first, last = growth[field]
+            if last - first > limit:
+                raise AssertionError(
+                    '{} grew from {} to {}, expected growth below {}'
+                    .format(field, first, last, limit))
+
+    def latency(self, since: float, regex: str, timeout: Timeout = 2,
+                fd: int = STDOUT) -> float:
+        """
+        Return the number of seconds between *since* - a time.monotonic()
+        value such as the `action_time` of a client - and the arrival of
+        the first output matching *regex* written after *since*.
+
+        The latency is attached to the current section history as a
+        'latency' measure. Raises AssertionError if no output matches
+        before *timeout* or if the matching output is no longer kept in
+        memory - see `history_max_size`.
+        """
+        cursor = RegexCursor(regex, start=self.history.get_offset(fd, since))
+        found = self._loop_thread.run(self._wait_output(cursor, fd, timeout))
+        if found is None:
+            raise AssertionError('Timeout: no output matching {} after {}s'
+                                 .format(regex, timeout))
+
+        arrival = self.history.get_time(fd, found[1] - 1)
+        if arrival is None:
+            raise AssertionError('The output matching {} has been evicted'
+                                 ' from memory before its arrival time was'
+                                 ' read, increase history_max_size'
+                                 .format(regex))
+        latency = arrival - since
+        self.history.add_measure('latency', Latency(regex, latency))
+        return latency
+
+    def assert_latency_below(self, since: float, regex: str,
+                             max_latency: float, timeout: Timeout = 2,
+                             fd: int = STDOUT):
+        """
+        Test that the first output matching *regex* is written less than
+        *max_latency* seconds after *since* - see `latency` method.
+        """
+        latency = self.latency(since, regex, timeout, fd)
+        if latency > max_latency:
+            raise AssertionError('{} is written after {:.3f}s, expected below'
+                                 ' {}s'.format(regex, latency, max_latency))
+
+    def expect_any(self, patterns: List['Pattern'],
+                   timeout: Timeout) -> 'OutputMatch':
+        """
+        Wait until one of *patterns* is found in the outputs before
+        *timeout* and return the OutputMatch of the first found pattern.
+
+        A pattern is a regex searched on stdout or a tuple (fd, regex).
+        """
+        return expect({None: (self, patterns)}, timeout)[None]
 
     def kill(self):
         """
         Kill the process using `kill_signal` attribute.
         """
+        self._loop_thread.run(self.stop())
 
-        subprocess = self._transport.get_extra_info('subprocess')
-        subprocess.send_signal(self.kill_signal)
+    async def stop(self):
+        """
+        Send `kill_signal` to the process and wait for its exit. The process
+        is killed with SIGKILL if it is still running after `kill_timeout`.
+        """
+        if self._transport is None:
+            return
+
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+
+        if not self._on_subprocess_exist.done():
+            subprocess = self._transport.get_extra_info('subprocess')
+            try:
+                subprocess.send_signal(self.kill_signal)
+            except ProcessLookupError:
+                pass
+            try:
+                await asyncio.wait_for(asyncio.shield(
+                    self._on_subprocess_exist), self.kill_timeout)
+            except asyncio.TimeoutError:
+                subprocess.kill()
+                await self._on_subprocess_exist
+
+        # Outputs can still be read after the process exit.
+        try:
+            await asyncio.wait_for(asyncio.shield(self._protocol.on_close), 1)
+        except asyncio.TimeoutError:
+            pass
 
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(self._on_subprocess_exist)
         self._transport.close()
+        self._transport = None
+        if LISTENERS['server_exited']:
+            emit('server_exited', server=self, start=self.start_time,
+                 end=self._protocol.exit_time)
+
+
+
+Pattern = Union[str, Tuple[int, str]]
+
+OutputMatch = namedtuple('OutputMatch',
+                         'name index pattern fd start end text')
+OutputMatch.__doc__ = """
+The pattern at *index* of the patterns expected from the server *name*
+matches the *text* between *start* and *end* offsets of *fd* output.
+"""
+
+
+def expect(patterns_from_name: Dict[str, Tuple[Server, List[Pattern]]],
+           timeout: Timeout, wait_all: bool = False):
+    """
+    Wait until one of the patterns of one server - or of each server if
+    *wait_all* is True - is found before *timeout*.
+
+    patterns_from_name - dict mapping a name to a tuple (server, patterns).
+                         A pattern is a regex searched on stdout or a tuple
+                         (fd, regex).
+
+    Returns a dict mapping names to OutputMatch. Raises an AssertionError
+    if the timeout is reached.
+    """
+    expectations = []
+    for name, (server, patterns) in patterns_from_name.items():
+        if isinstance(patterns, (str, tuple)):
+            patterns = [patterns]
+        for index, pattern in enumerate(patterns):
+            fd, regex = (STDOUT, pattern) if isinstance(pattern, str) \
+                else pattern
+            expectations.append(
+                (name, server, index, regex, fd, RegexCursor(regex)))
+
+    loop_thread = EventLoopThread.get()
+    found = loop_thread.run(
+        _wait_expectations(expectations, timeout, wait_all))
+
+    if not found or (wait_all and len(found) < len(patterns_from_name)):
+        missing = [name for name in patterns_from_name if name not in found]
+        raise AssertionError('Patterns not found before {}s: {}'.format(
+            timeout, '; '.join(
+                '{}{!r}'.format('' if name is None else name + ': ', regex)
+                for name, _, _, regex, _, _ in expectations
+                if name in missing)))
+    return found
+
+
+async def _wait_expectations(expectations, timeout, wait_all):
+    """
+    Wait for expectations using one loop wait for all servers.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    nb_names = len({expectation[0] for expectation in expectations})
+    found = {}
+    while True:
+        for name, server, index, regex, fd, cursor in expectations:
+            if name in found:
+                continue
+            result = cursor.search(server.history, fd)
+            if result is not None:
+                found[name] = OutputMatch(name, index, regex, fd,
+                                          result[0], result[1],
+                                          result[2].group())
+                if not wait_all:
+                    return found
+
+        remaining = deadline - loop.time()
+        if len(found) == nb_names or remaining <= 0:
+            return found
+
+        watched = {(server, fd)
+                   for name, server, _, _, fd, _ in expectations
+                   if name not in found}
+        futures = [server._protocol.output_future(fd)
+                   for server, fd in watched]
+        _, pending = await asyncio.wait(
+            futures, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for future in pending:
+            future.cancel()
+
+
+async def probe_tcp(host: str, port: int):
+    """
+    Wait until *port* accepts TCP connections.
+    """
+    delay = 0.01
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.25)
+        else:
+            writer.close()
+            return True
+
+
+async def probe_http(host: str, port: int, path: str):
+    """
+    Wait until a HTTP GET request on *path* answers a 2xx or 3xx status.
+    """
+    delay = 0.01
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write('GET {} HTTP/1.0\r\nHost: {}:{}\r\n\r\n'
+                         .format(path, host, port).encode('utf-8'))
+            status_line = await reader.readline()
+            writer.close()
+            if 200 <= int(status_line.split()[1]) < 400:
+                return True
+        except (OSError, ValueError, IndexError):
+            pass
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.25)
+
+
+def start_all(servers_from_name: Dict[str, Server]):
+    """
+    Spawn concurrently the processes of servers built with start=False.
+
+    Raises RuntimeError naming the servers which cannot be spawned, the
+    other servers are running.
+    """
+    async def spawn_all():
+        return await asyncio.gather(
+            *(server.start() for server in servers_from_name.values()),
+            return_exceptions=True)
+
+    results = EventLoopThread.get().run(spawn_all())
+    errors = ['{}: {}'.format(name, result)
+              for name, result in zip(servers_from_name, results)
+              if isinstance(result, Exception)]
+    if errors:
+        raise RuntimeError('Servers cannot be started - ' + '; '.join(errors))
+
+
+def kill_all(servers: List[Server]):
+    """
+    Send the kill signal to every server at once and wait until they exit.
+    The event loop thread of the servers is used, so that no thread is
+    started when there is no server to kill, for example at exit.
+    """
+    servers = list(servers)
+    if not servers:
+        return
+
+    async def stop_all():
+        await asyncio.gather(*(server.stop() for server in servers))
+
+    servers[0]._loop_thread.run(stop_all())
+
+
+def wait_ready(gates_from_name: Dict[str, Tuple[Server, dict]]):
+    """
+    Wait concurrently until each server is ready.
+
+    gates_from_name - dict mapping a name to a tuple (server, gates), gates
+                      is a dict of `Server.ready` parameters.
+
+    Raises RuntimeError naming the servers which are not ready.
+    """
+    async def wait_all():
+        return await asyncio.gather(
+            *(server.ready(**gates)
+              for server, gates in gates_from_name.values()),
+            return_exceptions=True)
+
+    results = EventLoopThread.get().run(wait_all())
+    errors = ['{}: {}'.format(name, result)
+              for name, result in zip(gates_from_name, results)
+              if isinstance(result, Exception)]
+    if errors:
+        raise RuntimeError('Servers are not ready - ' + '; '.join(errors))
@@ -9,6 +9,7 @@ import time
 from voluptuous import (All, Optional, Range, Required)
 
 from . import Client, port_def
+from ..events import LISTENERS, emit
 
 
 class TCPClient(Client):
@@ -66,7 +67,12 @@ class TCPClient(Client):
         """
         send *msg*
         """
+        self.action_time = time.monotonic()
         self.socket.send(msg.encode('utf-8'))
+        if LISTENERS['client_request']:
+            emit('client_request', client=self, request='send',
+                 start=self.action_time, end=time.monotonic(),
+                 details={'size': len(msg)})
 
     def assert_receive(self, expected, timeout=2):
         """
@@ -0,0 +1,276 @@
+"""
+Run the scenarios of a TestState subclass as concurrent virtual users in
+order to use the step graph as a workload model.
+"""
+
+import itertools
+import math
+import random
+import sys
+import threading
+import time
+import unittest
+from collections import defaultdict, namedtuple
+
+from .algo import (count_coverage, graph_coverage, iter_random_walk,
+                   percentile)
+
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+           1, 2, 5, 10, math.inf)
+
+TransitionStats = namedtuple('TransitionStats',
+                             'count errors p50 p90 p99 max histogram')
+TransitionStats.__doc__ = """
+*count* runs of a transition with *errors* failed runs, the percentiles and
+the maximum of its durations in seconds. *histogram* is a list of tuples
+(upper bound in seconds, number of runs) following BUCKETS.
+"""
+
+LoadResult = namedtuple('LoadResult',
+                        'duration iterations transitions setup_errors')
+LoadResult.__doc__ = """
+*iterations* scenarios have run in *duration* seconds. *transitions* is a
+dict mapping a tuple (previous step name, step name) to TransitionStats,
+the previous step name of the first step is None. *setup_errors* scenarios
+could not be set up or torn down, they are not counted in *transitions*.
+"""
+
+
+def transition_stats(durations, errors):
+    """
+    Return the TransitionStats of a transition which lasted *durations*
+    seconds and failed *errors* times.
+    """
+    durations = sorted(durations)
+    histogram = []
+    start = 0
+    for bound in BUCKETS:
+        end = start
+        while end < len(durations) and durations[end] <= bound:
+            end += 1
+        histogram.append((bound, end - start))
+        start = end
+
+    return TransitionStats(len(durations), errors,
+                           percentile(durations, 0.5),
+                           percentile(durations, 0.9),
+                           percentile(durations, 0.99),
+                           durations[-1], histogram)
+
+
+class VirtualUser(threading.Thread):
+    """
+    Run scenarios one after the other until the *deadline* or the number
+    of *iterations* is reached and record the duration and the outcome of
+    each transition.
+    """
+
+    def __init__(self, load, index, scenarios):
+        super().__init__(name='cricri-virtual-user-{}'.format(index),
+                         daemon=True)
+        self.load = load
+        self.scenarios = scenarios
+        self.durations = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.setup_errors = 0
+        self.iterations = 0
+
+    def run(self):
+        for scenario in self.scenarios:
+            if self.load.expired():
+                break
+            self.run_scenario(scenario)
+            self.iterations += 1
+
+    def run_scenario(self, scenario):
+        """
+        Run *scenario* and record its transitions. The servers of a
+        TestServer subclass are not started, the scenario uses its own
+        clients and no history section is started since the outputs of
+        the shared servers are written for every virtual user.
+        """
+        base = self.load.base
+        attrs = {'__generated_by_cricri__': True}
+        try:
+            if hasattr(base, 'build_clients'):
+                attrs['clients'] = base.build_clients()
+                attrs['_history_sections'] = False
+                test_case = type(base.__name__, (base.build_test_case(
+                    scenario),), attrs)
+                self.run_steps(test_case, scenario)
+            else:
+                test_case = base.build_test_case(scenario)
+                test_case.setUpClass()
+                try:
+                    self.run_steps(test_case, scenario)
+                finally:
+                    test_case.tearDownClass()
+        except Exception:
+            self.setup_errors += 1
+        finally:
+            for client in attrs.get('clients', {}).values():
+                client.close()
+
+    def run_steps(self, test_case, scenario):
+        """
+        Run the steps of *test_case* until a step fails or the deadline
+        is reached.
+        """
+        previous_step = None
+        method_names = unittest.TestLoader().getTestCaseNames(test_case)
+        for step_name, method_name in zip(scenario, method_names):
+            if self.load.expired():
+                break
+            result = unittest.TestResult()
+            start = time.monotonic()
+            test_case(method_name).run(result)
+            transition = (previous_step, step_name)
+            self.durations[transition].append(time.monotonic() - start)
+            if result.errors or result.failures:
+                self.errors[transition] += 1
+                break
+
+            previous_step = step_name
+            time.sleep(self.load.think_time)
+
+
+class Load:
+    """
+    Run *users* concurrent virtual users following the scenarios of the
+    *base* TestState subclass.
+
+    The servers of a TestServer subclass are started once and shared by
+    the virtual users, each virtual user has its own clients. The start
+    of the virtual users is spread over *ramp_up* seconds and each one
+    waits *think_time* seconds between its steps.
+
+    scenarios - sequence of scenarios followed in turn by each virtual
+                user. By default, each scenario is a seeded random walk of
+                at most *max_length* steps.
+    """
+
+    def __init__(self, base, users, duration=None, iterations=None,
+                 think_time=0, ramp_up=0, scenarios=None, max_length=None,
+                 seed=0):
+        if duration is None and iterations is None:
+            raise ValueError('duration or iterations must be set')
+
+        self.base = base
+        self.users = users
+        self.duration = duration
+        self.iterations = iterations
+        self.think_time = think_time
+        self.ramp_up = ramp_up
+        self.scenarios = scenarios
+        self.max_length = max_length
+        self.seed = seed
+        self.deadline = None
+
+    def expired(self):
+        """
+        Return True if the deadline is reached.
+        """
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def _user_scenarios(self, index):
+        """
+        Return the iterator of scenarios followed by the user *index*.
+        """
+        if self.scenarios is not None:
+            scenarios = itertools.islice(itertools.cycle(self.scenarios),
+                                         index, None)
+        else:
+            mcs = type(self.base)
+            start_step, graph = mcs._build_graph(self.base)
+            weights = mcs._build_weights(self.base)
+            max_length = self.max_length
+            if max_length is None:
+                max_length = count_coverage(
+                    graph_coverage(graph, start_step))[1] + 1
+
+            generator = random.Random('{}-{}'.format(self.seed, index))
+            scenarios = (tuple(itertools.islice(
+                iter_random_walk(graph, start_step, generator, weights),
+                max_length)) for _ in itertools.count())
+
+        return itertools.islice(scenarios, self.iterations)
+
+    def run(self):
+        """
+        Run the virtual users and return a LoadResult.
+        """
+        shared_servers = hasattr(self.base, 'build_clients')
+        if shared_servers:
+            self.base.start_scenario()
+
+        start = time.monotonic()
+        if self.duration is not None:
+            self.deadline = start + self.duration
+
+        virtual_users = []
+        try:
+            for index in range(self.users):
+                if index and self.ramp_up:
+                    time.sleep(self.ramp_up / self.users)
+                virtual_user = VirtualUser(self, index,
+                                           self._user_scenarios(index))
+                virtual_user.start()
+                virtual_users.append(virtual_user)
+
+            for virtual_user in virtual_users:
+                virtual_user.join()
+        finally:
+            if shared_servers:
+                self.base.stop_scenario()
+
+        durations = defaultdict(list)
+        errors = defaultdict(int)
+        for virtual_user in virtual_users:
+            for transition, values in virtual_user.durations.items():
+                durations[transition].extend(values)
+                errors[transition] += virtual_user.errors[transition]
+
+        return LoadResult(
+            time.monotonic() - start,
+            sum(virtual_user.iterations for virtual_user in virtual_users),
+            {transition: transition_stats(values, errors[transition])
+             for transition, values in durations.items()},
+            sum(virtual_user.setup_errors
+                for virtual_user in virtual_users))
+
+
+def report(base, users, load_result):
+    """
+    Return a string describing *load_result*.
+    """
+    lines = ['cricri: load of {} with {} users ran {} scenarios in {:.1f}s'
+             .format(base.__qualname__, users, load_result.iterations,
+                     load_result.duration)]
+    if load_result.setup_errors:
+        lines.append('  {} scenarios could not be set up'
+                     .format(load_result.setup_errors))
+    for (previous_step, step), stats in sorted(
+            load_result.transitions.items(),
+            key=lambda item: (str(item[0][0]), str(item[0][1]))):
+        lines.append(
+            '  {} -> {}: {} runs, {:.1%} errors, p50 {:.1f}ms,'
+            ' p90 {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms'.format(
+                previous_step or 'start', step, stats.count,
+                stats.errors / stats.count, stats.p50 * 1000,
+                stats.p90 * 1000, stats.p99 * 1000, stats.max * 1000))
+    return '\n'.join(lines)
+
+
+def load(base, users, duration=None, iterations=None, think_time=0,
+         ramp_up=0, scenarios=None, max_length=None, seed=0, stream=None):
+    """
+    Run a Load, write its report on *stream* - standard error by default -
+    and return its LoadResult.
+    """
+    if stream is None:
+        stream = sys.stderr
+
+    load_result = Load(base, users, duration, iterations, think_time,
+                       ramp_up, scenarios, max_length, seed).run()
+    print(report(base, users, load_result), file=stream)
+    return load_result
@@ -0,0 +1,137 @@
+"""
+Profile the CPU time and the memory allocations of each step and merge
+them per step across scenarios.
+"""
+
+import cProfile
+import os
+import pstats
+import re
+import threading
+import tracemalloc
+from collections import defaultdict
+
+TOP_ALLOCATIONS = 20
+
+
+class StepProfiles:
+    """
+    Merge the profiles of the steps written in the *directory* directory.
+
+    For each step, `<step name>.pstats` contains the cProfile statistics
+    readable with the pstats module and `<step name>.alloc.txt` the
+    source lines which allocated the most memory during the step.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._allocations = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+
+    @classmethod
+    def get(cls, directory):
+        """
+        Return the StepProfiles shared by all steps profiled in
+        *directory*.
+        """
+        with cls._instances_lock:
+            if directory not in cls._instances:
+                cls._instances[directory] = cls(directory)
+            return cls._instances[directory]
+
+    @classmethod
+    def write_all(cls):
+        """
+        Write the reports of every StepProfiles.
+        """
+        with cls._instances_lock:
+            instances = list(cls._instances.values())
+        for instance in instances:
+            instance.write()
+
+    def profile(self, step_name, func, cpu=True, memory=False):
+        """
+        Call *func* without argument and add its CPU profile if *cpu* is
+        True and its memory allocations if *memory* is True to the
+        profile of *step_name*.
+        """
+        if memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+        if cpu:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            return func()
+        finally:
+            if cpu:
+                profiler.disable()
+                self._add_stats(step_name, profiler)
+            if memory:
+                self._add_allocations(step_name, before,
+                                      tracemalloc.take_snapshot())
+
+    def _add_stats(self, step_name, profiler):
+        with self._lock:
+            stats = self._stats.get(step_name)
+            if stats is None:
+                self._stats[step_name] = pstats.Stats(profiler)
+            else:
+                stats.add(profiler)
+
+    def _add_allocations(self, step_name, before, after):
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__),
+                  tracemalloc.Filter(False, __file__))
+        differences = after.filter_traces(ignore).compare_to(
+            before.filter_traces(ignore), 'lineno')
+        with self._lock:
+            allocations = self._allocations[step_name]
+            for difference in differences:
+                if difference.size_diff or difference.count_diff:
+                    total = allocations[str(difference.traceback[0])]
+                    total[0] += difference.size_diff
+                    total[1] += difference.count_diff
+
+    def write(self):
+        """
+        Write the merged profile of each step.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            for step_name, stats in self._stats.items():
+                stats.dump_stats(self._path(step_name, 'pstats'))
+
+            for step_name, allocations in self._allocations.items():
+                top = sorted(allocations.items(),
+                             key=lambda item: item[1][0],
+                             reverse=True)[:TOP_ALLOCATIONS]
+                with open(self._path(step_name, 'alloc.txt'), 'w',
+                          encoding='utf-8') as report:
+                    for line, (size, count) in top:
+                        report.write('{}: {:+} B, {:+} blocks\n'.format(
+                            line, size, count))
+
+    def _path(self, step_name, extension):
+        return os.path.join(self.directory, '{}.{}'.format(
+            re.sub(r'[^\w.,-]+', '_', step_name), extension))
+
+
+def profile_step(test_case, step_name, func):
+    """
+    Call *func* without argument and profile it as the step *step_name*
+    if the `profile_dir` attribute of *test_case* is set. The
+    `profile_cpu` and `profile_memory` attributes enable cProfile -
+    default - and tracemalloc.
+    """
+    directory = getattr(test_case, 'profile_dir', None)
+    if directory is None:
+        return func()
+
+    return StepProfiles.get(directory).profile(
+        step_name, func, getattr(test_case, 'profile_cpu', True),
+        getattr(test_case, 'profile_memory', False))
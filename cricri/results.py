@@ -0,0 +1,224 @@
+"""
+Stream the results of the scenarios in a JSON lines file, one JSON object
+per scenario, so that dashboards and the run history can ingest huge runs
+without parsing the unittest output.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import unittest
+
+from . import events
+
+WRITER = None
+_lock = threading.Lock()
+
+
+def outcome(error):
+    """
+    Return the outcome of a method which raised *error*.
+
+    >>> outcome(None), outcome(AssertionError()), outcome(KeyError())
+    ('passed', 'failed', 'error')
+    >>> outcome(unittest.SkipTest('reason'))
+    'skipped'
+    """
+    if error is None:
+        return 'passed'
+    if isinstance(error, unittest.SkipTest):
+        return 'skipped'
+    if isinstance(error, AssertionError):
+        return 'failed'
+    return 'error'
+
+
+def scenario_hash(name):
+    """
+    Return a short stable identifier of the scenario *name*.
+
+    >>> scenario_hash('tests.Base:A,B')
+    '24714bdb0aae9374'
+    """
+    return hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]
+
+
+class ResultWriter:
+    """
+    Append a JSON object per scenario to the *path* file when the scenario
+    ends or is skipped. Each object contains:
+
+    scenario - name of the scenario as recorded by RunHistory.
+    hash - short stable identifier of the scenario.
+    steps - sequence of step names.
+    outcome - 'passed', 'failed' or 'skipped'.
+    duration - seconds between setUpClass start and tearDownClass end.
+    skip_reason - reason why the scenario or its last steps were skipped.
+    step_results - list of objects with the step name, its duration, its
+                   outcome, its skip reason, its input and its tests. The
+                   input and each test have a name, an outcome, a duration
+                   and an error message.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = {}
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def listeners(self):
+        """
+        Return a list of tuples (event name, listener) recording the
+        results.
+        """
+        return [('scenario_start', self.on_scenario_start),
+                ('scenario_end', self.on_scenario_end),
+                ('scenario_skipped', self.on_scenario_skipped),
+                ('step_start', self.on_step_start),
+                ('step_end', self.on_step_end),
+                ('step_skipped', self.on_step_skipped),
+                ('step_input_end', self.on_input_end),
+                ('test_method_end', self.on_test_method_end)]
+
+    @staticmethod
+    def _new_record(test_case):
+        scenario_info = test_case.__cricri_scenario__
+        return {'scenario': scenario_info.name,
+                'hash': scenario_hash(scenario_info.name),
+                'steps': list(scenario_info.steps),
+                'outcome': 'passed',
+                'duration': None,
+                'skip_reason': None,
+                'step_results': []}
+
+    def _step_result(self, test_case):
+        record = self._records.get(type(test_case))
+        if record is None or not record['step_results']:
+            return None
+        return record['step_results'][-1]
+
+    def on_scenario_start(self, test_case, time):
+        with self._lock:
+            self._records[test_case] = self._new_record(test_case)
+
+    def on_scenario_end(self, test_case, start, end, failed):
+        with self._lock:
+            record = self._records.pop(test_case, None)
+        if record is None:
+            return
+        record['duration'] = end - start
+        if failed:
+            record['outcome'] = 'failed'
+        self._write(record)
+
+    def on_scenario_skipped(self, test_case, reason):
+        with self._lock:
+            record = self._records.pop(test_case, None)
+        if record is None:
+            record = self._new_record(test_case)
+        record['outcome'] = 'skipped'
+        record['skip_reason'] = reason
+        self._write(record)
+
+    def on_step_start(self, test_case, step, time):
+        with self._lock:
+            record = self._records.get(type(test_case))
+            if record is not None:
+                record['step_results'].append({
+                    'step': step, 'outcome': 'passed', 'duration': None,
+                    'skip_reason': None, 'input': None, 'tests': []})
+
+    def on_step_end(self, test_case, step, start, end):
+        with self._lock:
+            step_result = self._step_result(test_case)
+            if step_result is not None:
+                step_result['duration'] = end - start
+
+    def on_step_skipped(self, test_case, step, reason):
+        with self._lock:
+            record = self._records.get(type(test_case))
+            if record is not None:
+                record['skip_reason'] = reason
+                record['step_results'].append({
+                    'step': step, 'outcome': 'skipped', 'duration': 0.0,
+                    'skip_reason': reason, 'input': None, 'tests': []})
+
+    def on_input_end(self, test_case, step, method, start, end, error):
+        self._add_method_result(test_case, 'input', method, start, end,
+                                error)
+
+    def on_test_method_end(self, test_case, step, method, start, end,
+                           error):
+        self._add_method_result(test_case, 'tests', method, start, end,
+                                error)
+
+    def _add_method_result(self, test_case, key, method, start, end, error):
+        result = {'name': method, 'outcome': outcome(error),
+                  'duration': end - start,
+                  'error': None if error is None else str(error)}
+        with self._lock:
+            step_result = self._step_result(test_case)
+            if step_result is None:
+                return
+            if key == 'input':
+                step_result['input'] = result
+            else:
+                step_result['tests'].append(result)
+            if result['outcome'] in ('failed', 'error'):
+                step_result['outcome'] = 'failed'
+
+    def _write(self, record):
+        line = json.dumps(record, sort_keys=True)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        """
+        Close the results file.
+        """
+        with self._lock:
+            self._file.close()
+
+
+def enable(path):
+    """
+    Append the results of the scenarios run by this process to *path*.
+    `{pid}` in *path* is replaced by the process id, so that each worker
+    of a parallel run writes its own file.
+    """
+    global WRITER
+    path = path.format(pid=os.getpid())
+    with _lock:
+        if WRITER is None or WRITER.path != path:
+            disable()
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            WRITER = ResultWriter(path)
+            for name, listener in WRITER.listeners():
+                events.subscribe(name, listener)
+    return WRITER
+
+
+def disable():
+    """
+    Stop writing results and close the results file.
+    """
+    global WRITER
+    if WRITER is not None:
+        for name, listener in WRITER.listeners():
+            events.unsubscribe(name, listener)
+        WRITER.close()
+        WRITER = None
+
+
+def read(path):
+    """
+    Yield the scenario results written in the *path* file.
+    """
+    with open(path, encoding='utf-8') as results_file:
+        for line in results_file:
+            if line.strip():
+                yield json.loads(line)
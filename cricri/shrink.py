@@ -0,0 +1,244 @@
+"""
+Search the shortest scenario reproducing the failure of a long scenario
+using delta debugging.
+"""
+
+import multiprocessing
+import sys
+import unittest
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+class _FailureRecorder(unittest.TestResult):
+    """
+    Record the first failure of a generated scenario.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.failure = None
+
+    def _record(self, test, subtest, err):
+        if self.failure is not None:
+            return
+
+        scenario_info = getattr(test, '__cricri_scenario__', None)
+        if scenario_info is None:
+            step_num = step_name = None
+        else:
+            step_num = type(test).PrefixTestMethod.num(test._testMethodName)
+            step_name = scenario_info.steps[step_num]
+
+        subtest_name = None
+        if subtest is not None:
+            subtest_name = subtest.params.get('name')
+
+        exc_type, exc_value, _ = err
+        self.failure = (step_num, step_name, subtest_name,
+                        exc_type.__qualname__, str(exc_value))
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self._record(test, None, err)
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._record(test, None, err)
+
+    def addSubTest(self, test, subtest, err):
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            self._record(test, subtest, err)
+
+
+def run_scenario(base, scenario):
+    """
+    Run *scenario* of the *base* TestState subclass and return its first
+    failure as a tuple (step index, step name, test method name,
+    exception type name, exception message) or None if it passes.
+    The scenario is not written in the trace and results files.
+    """
+    test_case = base.build_test_case(scenario, instrument=False)
+    result = _FailureRecorder()
+    unittest.TestLoader().loadTestsFromTestCase(test_case).run(result)
+    return result.failure
+
+
+def is_path(graph, scenario):
+    """
+    Return True if each step of *scenario* is a next step of the
+    previous one in *graph*.
+    """
+    return all(step in graph[previous_step]
+               for previous_step, step
+               in zip(scenario, scenario[1:]))
+
+
+def shortest_path(graph, start, end):
+    """
+    Return the shortest path from *start* to *end* through *graph*
+    or None if *end* cannot be reached.
+    """
+    previous_nodes = {start: None}
+    nodes = deque([start])
+    while nodes:
+        node = nodes.popleft()
+        for next_node in graph[node]:
+            if next_node == end:
+                path = [next_node, node]
+                while previous_nodes[path[-1]] is not None:
+                    path.append(previous_nodes[path[-1]])
+                return tuple(reversed(path))
+            if next_node not in previous_nodes:
+                previous_nodes[next_node] = node
+                nodes.append(next_node)
+    return None
+
+
+class Shrinker:
+    """
+    Shrink a failing scenario of *base* TestState subclass.
+
+    Candidate scenarios are built removing steps between the start step
+    and the failing step - ddmin algorithm - and are kept if they are a path
+    through the step graph and fail on the same step and test method with
+    the same exception type - and the same message if *match_message*.
+    Candidates having several valid input methods in a step are skipped.
+    Candidates of the same round are run in *jobs* processes.
+    """
+
+    def __init__(self, base, jobs=1, match_message=False):
+        self.base = base
+        self.jobs = jobs
+        self.match_message = match_message
+        self.start_step, self.graph = type(base)._build_graph(base)
+        self.nb_runs = 0
+        self._executor = None
+
+    def _run(self, scenarios):
+        """
+        Run *scenarios* and return their failures.
+        """
+        self.nb_runs += len(scenarios)
+        if self._executor is None:
+            return [run_scenario(self.base, scenario)
+                    for scenario in scenarios]
+        return list(self._executor.map(
+            run_scenario, [self.base] * len(scenarios), scenarios))
+
+    def _is_valid(self, candidate):
+        """
+        Return True if *candidate* starts with the start step, is a path
+        through the step graph and has one valid input method per step.
+        """
+        if candidate[0] != self.start_step or not is_path(self.graph,
+                                                          candidate):
+            return False
+
+        mcs = type(self.base)
+        steps = mcs.steps[self.base]
+        for position, step_name in enumerate(candidate):
+            inputs = steps[step_name].inputs
+            if not inputs:
+                continue
+            try:
+                mcs._select_input_method(inputs, list(candidate[:position]))
+            except AttributeError:
+                #  Multiple inputs methods are valid in the step.
+                return False
+        return True
+
+    def _first_reproducer(self, candidates, failure):
+        """
+        Return the first candidate failing with *failure* or None.
+        Without executor, candidates are run until a reproducer is found.
+        """
+        candidates = [candidate
+                      for candidate in candidates
+                      if self._is_valid(candidate)]
+        if self._executor is None:
+            failures = (self._run([candidate])[0]
+                        for candidate in candidates)
+        else:
+            failures = self._run(candidates)
+
+        end = None if self.match_message else -1
+        for candidate, candidate_failure in zip(candidates, failures):
+            if (candidate_failure is not None
+                    and candidate_failure[0] == len(candidate) - 1
+                    and candidate_failure[1:end] == failure[1:end]):
+                return candidate
+        return None
+
+    def shrink(self, scenario):
+        """
+        Return the shortest found scenario reproducing the failure
+        of *scenario*.
+        """
+        scenario = tuple(scenario)
+        if self.jobs > 1:
+            self._executor = ProcessPoolExecutor(
+                self.jobs, mp_context=multiprocessing.get_context('fork'))
+        try:
+            return self._shrink(scenario)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _shrink(self, scenario):
+        failure = self._run([scenario])[0]
+        if failure is None or failure[0] is None:
+            raise ValueError('The scenario {} does not fail in a step'
+                             .format(' -> '.join(scenario)))
+
+        scenario = scenario[:failure[0] + 1]
+        shortest = shortest_path(self.graph, self.start_step, scenario[-1])
+        if shortest is not None and len(shortest) < len(scenario):
+            reproducer = self._first_reproducer([shortest], failure)
+            if reproducer is not None:
+                scenario = reproducer
+
+        nb_chunks = 2
+        while len(scenario) > 2:
+            middle = scenario[1:-1]
+            nb_chunks = min(nb_chunks, len(middle))
+            bounds = [len(middle) * i // nb_chunks
+                      for i in range(nb_chunks + 1)]
+            candidates = [
+                scenario[:1] + middle[:start] + middle[end:] + scenario[-1:]
+                for start, end in zip(bounds, bounds[1:])]
+
+            reproducer = self._first_reproducer(candidates, failure)
+            if reproducer is not None:
+                scenario = reproducer
+                nb_chunks = max(nb_chunks - 1, 2)
+            elif nb_chunks < len(middle):
+                nb_chunks = min(nb_chunks * 2, len(middle))
+            else:
+                break
+
+        return scenario
+
+
+def shrink(base, scenario, jobs=1, match_message=False, stream=None):
+    """
+    Return the shortest found scenario of *base* reproducing the failure
+    of *scenario* and write it to *stream* - the standard error by default.
+
+    scenario - a sequence of step names or a generated TestCase.
+    jobs - number of processes running candidate scenarios.
+    match_message - if True, the failure message must be the same.
+    """
+    scenario_info = getattr(scenario, '__cricri_scenario__', None)
+    if scenario_info is not None:
+        scenario = scenario_info.steps
+
+    shrinker = Shrinker(base, jobs, match_message)
+    reproducer = shrinker.shrink(scenario)
+    print('cricri: minimal reproducer ({} steps instead of {}, {} runs):'
+          ' {}'.format(len(reproducer), len(scenario), shrinker.nb_runs,
+                       ' -> '.join(reproducer)),
+          file=stream or sys.stderr)
+    return reproducer
@@ -0,0 +1,149 @@
+"""
+Run one long random scenario against the same servers in order to reveal
+slow leaks that short scenarios never reveal.
+"""
+
+import random
+import sys
+import time
+import unittest
+from collections import defaultdict, namedtuple
+
+from .algo import iter_random_walk
+
+SoakResult = namedtuple('SoakResult', 'steps duration failure trends')
+SoakResult.__doc__ = """
+*steps* steps have run during *duration* seconds. *failure* is None or a
+tuple (step name, traceback) describing the first failure. *trends* is a
+dict mapping a measured value name to a Trend.
+"""
+
+Trend = namedtuple('Trend', 'first last growing')
+Trend.__doc__ = """
+The *first* and *last* window means of a measured value, *growing* is True
+if every window mean is greater than the previous one.
+"""
+
+
+def trend(values, windows=5):
+    """
+    Split *values* into *windows* windows and return the Trend of their
+    means. A Trend is growing only if there are at least two values per
+    window.
+
+    >>> trend([1, 1, 2, 2, 3, 3, 4, 4, 5, 5])
+    Trend(first=1.0, last=5.0, growing=True)
+    >>> trend([1, 1, 3, 3, 2, 2, 4, 4, 5, 5]).growing
+    False
+    """
+    size = len(values) // windows
+    if size < 2:
+        return Trend(values[0], values[-1], False)
+
+    means = [sum(values[index * size:(index + 1) * size]) / size
+             for index in range(windows)]
+    return Trend(means[0], means[-1],
+                 all(previous < mean
+                     for previous, mean in zip(means, means[1:])))
+
+
+def _take_measures(test_case, values):
+    """
+    Append the RSS and the latencies measured during the last step to the
+    *values* dict and clear the servers history.
+    """
+    for server_name, server in getattr(test_case, 'servers', {}).items():
+        sample = server.sample()
+        if sample is not None:
+            values['{} rss'.format(server_name)].append(sample.rss)
+        for measure in server.history.measures('latency'):
+            values['{} latency {}'.format(
+                server_name, measure.value.pattern)].append(
+                    measure.value.seconds)
+        server.history.clear()
+
+
+def soak(base, max_steps=None, duration=None, seed=0, stream=None):
+    """
+    Run a random walk through the steps of the *base* TestState subclass
+    as a single scenario until *max_steps* steps have run, *duration*
+    seconds have elapsed, a step fails or a step without next step is
+    reached. Servers of a TestServer subclass are started once.
+
+    After each step, the RSS of servers and the latencies measured by
+    `Server.latency` are recorded. The Trend of these values is written
+    on *stream* - standard error by default - and returned in a
+    SoakResult.
+    """
+    if max_steps is None and duration is None:
+        raise ValueError('max_steps or duration must be set')
+
+    if stream is None:
+        stream = sys.stderr
+
+    mcs = type(base)
+    start_step, graph = mcs._build_graph(base)
+    steps = iter_random_walk(graph, start_step, random.Random(seed),
+                             mcs._build_weights(base))
+
+    test_case = base.build_test_case([next(steps)])
+    scenario_info = test_case.__cricri_scenario__
+    previous_steps_names = []
+    values = defaultdict(list)
+    failure = None
+    step_num = 0
+    start = time.monotonic()
+
+    test_case.setUpClass()
+    try:
+        step_name = scenario_info.steps[0]
+        while True:
+            method_name, method = base.build_step_method(
+                step_num, step_name, previous_steps_names, scenario_info)
+            setattr(test_case, method_name, method)
+            result = unittest.TestResult()
+            test_case(method_name).run(result)
+            delattr(test_case, method_name)
+            scenario_info.durations.clear()
+            scenario_info.benchmarks.clear()
+            previous_steps_names.append(step_name)
+            step_num += 1
+
+            errors = result.errors + result.failures
+            if errors:
+                failure = (step_name, errors[0][1])
+                break
+
+            _take_measures(test_case, values)
+            if max_steps is not None and step_num >= max_steps:
+                break
+            if (duration is not None
+                    and time.monotonic() - start >= duration):
+                break
+
+            step_name = next(steps, None)
+            if step_name is None:
+                break
+    finally:
+        test_case.tearDownClass()
+
+    soak_result = SoakResult(step_num, time.monotonic() - start, failure,
+                             {name: trend(series)
+                              for name, series in values.items()})
+    print(report(base, soak_result), file=stream)
+    return soak_result
+
+
+def report(base, soak_result):
+    """
+    Return a string describing *soak_result*.
+    """
+    lines = ['cricri: soak of {} ran {} steps in {:.1f}s'.format(
+        base.__qualname__, soak_result.steps, soak_result.duration)]
+    for name, value_trend in sorted(soak_result.trends.items()):
+        lines.append('  {}: {:.6g} -> {:.6g}{}'.format(
+            name, value_trend.first, value_trend.last,
+            ' GROWING' if value_trend.growing else ''))
+    if soak_result.failure is not None:
+        lines.append('  failed at step {}:\n{}'.format(*soak_result.failure))
+    return '\n'.join(lines)
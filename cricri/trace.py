@@ -0,0 +1,176 @@
+"""
+Record a timeline of the scenarios - steps, test methods, client requests,
+server outputs and process lifetimes - in the Chrome trace event format
+readable by chrome://tracing or https://ui.perfetto.dev.
+"""
+
+import json
+import os
+import threading
+
+from . import events
+from .inet.server import FD_NAMES
+
+TRACER = None
+_lock = threading.Lock()
+
+
+class Tracer:
+    """
+    Collect trace events and write them in the *path* JSON file. Each
+    track - a runner thread, a client or a server - is displayed as a
+    thread of the current process. The `listeners` method returns the
+    cricri.events listeners recording the timeline.
+
+    Times are time.monotonic() values.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self._events = []
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def _track_id(self, track):
+        with self._lock:
+            track_id = self._tracks.get(track)
+            if track_id is None:
+                track_id = self._tracks[track] = len(self._tracks) + 1
+            return track_id
+
+    def span(self, track, name, start, end, args=None):
+        """
+        Record the *name* event lasting from *start* to *end* on *track*.
+        """
+        event = {'name': name, 'ph': 'X', 'ts': start * 1e6,
+                 'dur': (end - start) * 1e6, 'pid': self.pid,
+                 'tid': self._track_id(track)}
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+
+    def instant(self, track, name, time, args=None):
+        """
+        Record the *name* event happening at *time* on *track*.
+        """
+        event = {'name': name, 'ph': 'i', 's': 't', 'ts': time * 1e6,
+                 'pid': self.pid, 'tid': self._track_id(track)}
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+
+    def on_step_end(self, test_case, step, start, end):
+        self.span(runner_track(), step, start, end,
+                  {'scenario': test_case.__cricri_scenario__.name})
+
+    def on_method_end(self, test_case, step, method, start, end, error):
+        self.span(runner_track(), method, start, end,
+                  None if error is None else {'error': repr(error)})
+
+    def on_server_exited(self, server, start, end):
+        self.span('server {}'.format(server.name), 'process', start, end,
+                  {'cmd': ' '.join(server.parameters)})
+
+    def on_server_output(self, server, fd, text, time):
+        self.instant('server {}'.format(server.name), FD_NAMES[fd], time,
+                     {'size': len(text)})
+
+    def on_server_wait(self, server, fd, expected, start, end, found):
+        self.span(runner_track(),
+                  'wait {} of {}'.format(FD_NAMES[fd], server.name),
+                  start, end, {'expected': expected, 'found': found})
+
+    def on_client_request(self, client, request, start, end, details):
+        self.span('client {}'.format(client.name), request, start, end,
+                  details)
+
+    def listeners(self):
+        """
+        Return a list of tuples (event name, listener) recording the
+        timeline.
+        """
+        return [('step_end', self.on_step_end),
+                ('step_input_end', self.on_method_end),
+                ('test_method_end', self.on_method_end),
+                ('server_exited', self.on_server_exited),
+                ('server_output', self.on_server_output),
+                ('server_wait', self.on_server_wait),
+                ('client_request', self.on_client_request)]
+
+    def events(self):
+        """
+        Return the recorded events preceded by the track names.
+        """
+        with self._lock:
+            tracks = sorted(self._tracks.items(), key=lambda item: item[1])
+            recorded = list(self._events)
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+                     'args': {'name': 'cricri {}'.format(self.pid)}}]
+        for track, track_id in tracks:
+            metadata.append({'name': 'thread_name', 'ph': 'M',
+                             'pid': self.pid, 'tid': track_id,
+                             'args': {'name': track}})
+            metadata.append({'name': 'thread_sort_index', 'ph': 'M',
+                             'pid': self.pid, 'tid': track_id,
+                             'args': {'sort_index': track_id}})
+        return metadata + recorded
+
+    def write(self):
+        """
+        Write the recorded events in `path`.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as trace_file:
+            json.dump({'traceEvents': self.events(),
+                       'displayTimeUnit': 'ms'}, trace_file)
+
+
+def enable(path):
+    """
+    Record the timeline of the scenarios run by this process in *path*.
+    `{pid}` in *path* is replaced by the process id, so that each worker
+    of a parallel run writes its own file. The file is written when
+    the process exits, the timeline recorded in another file is written
+    before being replaced.
+    """
+    global TRACER
+    path = path.format(pid=os.getpid())
+    with _lock:
+        if TRACER is None or TRACER.path != path:
+            write()
+            disable()
+            TRACER = Tracer(path)
+            for name, listener in TRACER.listeners():
+                events.subscribe(name, listener)
+    return TRACER
+
+
+def disable():
+    """
+    Stop recording the timeline, it will not be written.
+    """
+    global TRACER
+    if TRACER is not None:
+        for name, listener in TRACER.listeners():
+            events.unsubscribe(name, listener)
+        TRACER = None
+
+
+def write():
+    """
+    Write the timeline if it is enabled.
+    """
+    if TRACER is not None:
+        TRACER.write()
+
+
+def runner_track():
+    """
+    Return the track name of the current thread running steps.
+    """
+    return 'steps {}'.format(threading.current_thread().name)
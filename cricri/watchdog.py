@@ -0,0 +1,172 @@
+"""
+Interrupt steps lasting longer than their timeout from a watchdog thread
+so that a hung input does not stall the whole test suite.
+"""
+
+import faulthandler
+import io
+import signal
+import sys
+import threading
+import time
+import traceback
+
+
+class StepTimeout(BaseException):
+    """
+    Raised in the thread running a step when its timeout is reached. It
+    derives from BaseException so that `except Exception` clauses of the
+    step do not swallow it.
+    """
+
+
+class Watchdog:
+    """
+    Call a function from a background thread when a deadline is reached.
+
+    Each thread arms its own deadline, the earliest one is watched first.
+    When the deadline is armed from the main thread, `SIGALRM` is sent to
+    the main thread after the function call in order to raise StepTimeout,
+    even while it blocks in a system call. Otherwise the step cannot be
+    interrupted and only the function is called. The SIGALRM handler is
+    installed by the first `arm` call and calls the previous handler when
+    no deadline has been reached.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._deadlines = {}
+        self._generation = 0
+        self._main_generation = 0
+        self._fired = None
+        self._previous_handler = None
+        self._installed = False
+        self._thread = None
+
+    def _update(self, deadline=None, on_timeout=None):
+        """
+        Set or remove the deadline of the current thread.
+        """
+        thread = threading.current_thread()
+        main_thread = thread is threading.main_thread()
+        with self._condition:
+            self._generation += 1
+            if main_thread:
+                self._main_generation = self._generation
+            if deadline is None:
+                self._deadlines.pop(thread.ident, None)
+            else:
+                self._deadlines[thread.ident] = (deadline, on_timeout,
+                                                 main_thread)
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name='cricri-watchdog', daemon=True)
+                    self._thread.start()
+            self._condition.notify()
+        return main_thread
+
+    def arm(self, deadline, on_timeout):
+        """
+        Call *on_timeout* without argument when the monotonic clock reaches
+        *deadline* unless `disarm` is called before from the same thread.
+        """
+        main_thread = self._update(deadline, on_timeout)
+        if main_thread and not self._installed:
+            self._previous_handler = signal.signal(signal.SIGALRM,
+                                                   self._interrupt)
+            self._installed = True
+
+    def disarm(self):
+        """
+        Cancel the deadline armed by the current thread.
+        """
+        self._update()
+
+    def _interrupt(self, signum, frame):
+        """
+        SIGALRM handler raising StepTimeout if the deadline of the main
+        thread is still armed or calling the previous handler.
+        """
+        with self._condition:
+            fired = self._fired == self._main_generation
+        if fired:
+            raise StepTimeout('step timed out')
+        if callable(self._previous_handler):
+            self._previous_handler(signum, frame)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._deadlines:
+                    self._condition.wait()
+                ident, (deadline, on_timeout, main_thread) = min(
+                    self._deadlines.items(), key=lambda item: item[1][0])
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+
+                del self._deadlines[ident]
+                if main_thread:
+                    generation = self._fired = self._main_generation
+
+            on_timeout()
+            with self._condition:
+                if main_thread and generation == self._main_generation:
+                    signal.pthread_kill(threading.main_thread().ident,
+                                        signal.SIGALRM)
+
+
+WATCHDOG = Watchdog()
+
+
+def dump(message, test_case):
+    """
+    Write *message*, the stack of every thread and the last outputs of the
+    servers of *test_case* on standard error.
+    """
+    print('cricri: {}'.format(message), file=sys.stderr)
+    try:
+        sys.stderr.flush()
+        faulthandler.dump_traceback(file=sys.stderr, all_threads=True)
+    except (AttributeError, ValueError, io.UnsupportedOperation):
+        #  sys.stderr has been replaced by an object without file descriptor.
+        for thread_id, frame in sys._current_frames().items():
+            print('Thread 0x{:x}:\n{}'.format(
+                thread_id, ''.join(traceback.format_stack(frame))),
+                  file=sys.stderr)
+    print_logs = getattr(test_case, 'print_logs', None)
+    if print_logs is not None:
+        print_logs()
+    sys.stderr.flush()
+
+
+def arm_step(test_case, scenario_info, step_name, start):
+    """
+    Arm WATCHDOG for the step *step_name* of the scenario described by
+    *scenario_info* started at *start* following the `step_timeout` and
+    `scenario_timeout` attributes of *test_case*. The scenario timeout
+    counts from the start of its first step.
+
+    Return True if WATCHDOG has been armed.
+    """
+    step_timeout = getattr(test_case, 'step_timeout', None)
+    scenario_timeout = getattr(test_case, 'scenario_timeout', None)
+    if scenario_timeout is not None and scenario_info.deadline is None:
+        scenario_info.deadline = start + scenario_timeout
+
+    deadlines = []
+    if step_timeout is not None:
+        deadlines.append((start + step_timeout, 'step {} timed out after'
+                          ' {}s'.format(step_name, step_timeout)))
+    if scenario_info.deadline is not None:
+        deadlines.append((scenario_info.deadline, 'scenario {} timed out'
+                          ' after {}s in step {}'.format(
+                              scenario_info.name, scenario_timeout,
+                              step_name)))
+    if not deadlines:
+        return False
+
+    deadline, message = min(deadlines)
+    WATCHDOG.arm(deadline, lambda: dump(message, type(test_case)))
+    return True
@@ -1,10 +1,22 @@
 import asyncio
+import io
 import unittest
 import signal
+import socket
+import subprocess
 import sys
+import tempfile
+import threading
+import time
 from textwrap import dedent
+from unittest import mock
 
-from cricri.inet.server import Server, SubprocessProtocol, IOHistory, STDERR, STDOUT
+from cricri.inet.server import (Server, SubprocessProtocol, IOHistory, STDERR,
+                                STDOUT, EqualCursor, EventLoopThread,
+                                RegexCursor, expect,
+                                Latency, Measure, OutputChunks, kill_all,
+                                start_all)
+from cricri.inet.tcp_client import TCPClient
 
 
 class TestServer(unittest.TestCase):
@@ -24,6 +36,46 @@ class TestServer(unittest.TestCase):
         loop.close()
 
 
+class TestServerOutputPump(unittest.TestCase):
+
+    PROG = """
+    import sys, time
+    for _ in range(2000):
+        print('x' * 1000)
+    print('done')
+    time.sleep(30)
+    """
+
+    def setUp(self):
+        self.server = Server([sys.executable, '-u', '-c', dedent(self.PROG)],
+                             kill_signal=signal.SIGTERM)
+        self.server.history.new_section('test-1')
+        self.addCleanup(self.server.kill)
+
+    def test_outputs_should_be_read_without_assert(self):
+        # Only the history is polled, no assert method reads the outputs.
+        deadline = time.monotonic() + 10
+        while not self.server.history.get_history(STDOUT).endswith('done\n'):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+
+    def test_assert_should_be_thread_safe(self):
+        errors = []
+
+        def assert_done():
+            try:
+                self.server.assert_stdout_regex('done', timeout=5)
+            except AssertionError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=assert_done) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
 class BaseTestSubprocessProtocol(unittest.TestCase):
     """
     Subclass this class and edit PROG class attribute.
@@ -100,3 +152,390 @@ class TestSubprocessProtocolWait(BaseTestSubprocessProtocol):
         )
         self.assertEqual(self.history.get_history(STDOUT), 'line-1\n')
         self.loop.run_until_complete(self.on_exit)
+
+
+class TestIOHistory(unittest.TestCase):
+
+    def test_chunks_should_be_joined_when_read(self):
+        history = IOHistory()
+        history.new_section('t1')
+        for _ in range(1000):
+            history.add_stdout_chunk('ab')
+        self.assertEqual(history.get_history(STDOUT), 'ab' * 1000)
+
+    def test_max_size_should_keep_last_characters(self):
+        history = IOHistory(max_size=5)
+        history.new_section('t1')
+        history.add_stdout_chunk('Hello ')
+        history.add_stdout_chunk('World')
+        self.assertEqual(history.get_history(STDOUT), 'World')
+
+    def test_spill_should_keep_all_characters(self):
+        history = IOHistory(max_size=5, spill=True)
+        self.addCleanup(history.close)
+        history.new_section('t1')
+        history.add_stdout_chunk('Hello ')
+        history.add_stdout_chunk('World')
+        history.new_section('t2')
+        history.add_stdout_chunk('Bye')
+        self.assertEqual(history.get_history(STDOUT, 't1'), 'Hello World')
+        self.assertEqual(history.get_history(STDOUT), 'Bye')
+        self.assertEqual(dict(history)['t1'], {STDOUT: 'Hello World',
+                                               STDERR: ''})
+
+    def test_spilled_text_should_be_read_once(self):
+        spill_file = tempfile.TemporaryFile()
+        output = OutputChunks(max_size=5, spill_file=spill_file)
+        output.append('Hello ')
+        output.append('World')
+        self.assertEqual(output.full_text(), 'Hello World')
+        spill_file.close()
+        self.assertEqual(output.full_text(), 'Hello World')
+
+    def test_logs_should_receive_chunks_as_they_arrive(self):
+        history = IOHistory()
+        history.add_stdout_chunk('early ')
+        logs = {STDOUT: io.StringIO(), STDERR: io.StringIO()}
+        history.set_logs(logs)
+        history.new_section('t1')
+        history.add_stdout_chunk('Hello')
+        history.add_stderr_chunk('Oops')
+        history.set_logs({})
+        history.add_stdout_chunk('ignored')
+        self.assertEqual(logs[STDOUT].getvalue(),
+                         'early {:-^78}\nHello'.format(' t1 '))
+        self.assertEqual(logs[STDERR].getvalue(),
+                         '{:-^78}\nOops'.format(' t1 '))
+
+
+class TestSubprocessProtocolSplitCharacter(BaseTestSubprocessProtocol):
+
+    PROG = """
+    import os, sys, time
+    os.write(1, b'caf\\xc3')
+    time.sleep(0.2)
+    os.write(1, b'\\xa9')
+    """
+
+    def test_character_split_between_chunks_should_be_decoded(self):
+        self.loop.run_until_complete(self.on_exit)
+        self.assertEqual(self.history.get_history(STDOUT), 'café')
+
+
+class TestOutputCursor(unittest.TestCase):
+
+    def setUp(self):
+        self.history = IOHistory()
+        self.history.new_section('t1')
+
+    def test_regex_should_only_scan_new_text_and_overlap(self):
+        cursor = RegexCursor('abc', overlap=2)
+        self.history.add_stdout_chunk('xxxxa')
+        self.assertIsNone(cursor.search(self.history, STDOUT))
+        self.history.add_stdout_chunk('bc')
+        self.assertEqual(cursor.search(self.history, STDOUT)[:2], (4, 7))
+
+    def test_regex_should_not_rescan_merged_text(self):
+        cursor = RegexCursor('abc', overlap=2)
+        self.history.add_stdout_chunk('x' * 10000)
+        self.assertIsNone(cursor.search(self.history, STDOUT))
+        self.history.get_history(STDOUT)
+        self.history.add_stdout_chunk('ab')
+        self.assertEqual(self.history.get_history_from(STDOUT, 9997),
+                         (9997, 'xxxab'))
+        self.history.add_stdout_chunk('c')
+        self.assertEqual(cursor.search(self.history, STDOUT)[:2],
+                         (10000, 10003))
+
+    def test_caret_should_match_beginning_of_history(self):
+        cursor = RegexCursor('^b', overlap=0)
+        self.history.add_stdout_chunk('a')
+        self.assertIsNone(cursor.search(self.history, STDOUT))
+        self.history.add_stdout_chunk('b')
+        self.assertIsNone(cursor.search(self.history, STDOUT))
+
+    def test_equal_should_be_exhausted_when_history_is_longer(self):
+        cursor = EqualCursor('ab')
+        self.history.add_stdout_chunk('a')
+        self.assertIsNone(cursor.search(self.history, STDOUT))
+        self.assertFalse(cursor.exhausted)
+        self.history.add_stdout_chunk('bc')
+        self.assertIsNone(cursor.search(self.history, STDOUT))
+        self.assertTrue(cursor.exhausted)
+
+
+class TestExpect(unittest.TestCase):
+
+    PROG = """
+    import sys, time
+    time.sleep({delay})
+    print({message!r})
+    time.sleep(30)
+    """
+
+    def _server(self, delay, message):
+        server = Server([sys.executable, '-u', '-c',
+                         dedent(self.PROG.format(delay=delay,
+                                                 message=message))],
+                        kill_signal=signal.SIGTERM)
+        server.history.new_section('t1')
+        self.addCleanup(server.kill)
+        return server
+
+    def test_expect_any_should_return_first_matching_pattern(self):
+        server = self._server(0.2, 'error: boom')
+        start = time.monotonic()
+        match = server.expect_any(['ready', 'error: (.*)'], timeout=10)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual((match.index, match.pattern, match.fd, match.text),
+                         (1, 'error: (.*)', STDOUT, 'error: boom'))
+
+    def test_expect_any_should_raise_on_timeout(self):
+        server = self._server(0, 'starting')
+        with self.assertRaises(AssertionError):
+            server.expect_any(['ready', (STDERR, 'error')], timeout=0.5)
+
+    def test_expect_all_servers(self):
+        servers = {'a': self._server(0.3, 'a ready'),
+                   'b': self._server(0.1, 'b ready')}
+        found = expect({name: (server, 'ready')
+                        for name, server in servers.items()},
+                       timeout=5, wait_all=True)
+        self.assertEqual({name: match.start for name, match in found.items()},
+                         {'a': 2, 'b': 2})
+
+    def test_expect_any_server(self):
+        servers = {'a': self._server(3, 'a ready'),
+                   'b': self._server(0.1, 'b ready')}
+        found = expect({name: (server, 'ready')
+                        for name, server in servers.items()}, timeout=5)
+        self.assertEqual(list(found), ['b'])
+
+
+class TestWaitReady(unittest.TestCase):
+
+    def _server(self, prog):
+        server = Server([sys.executable, '-u', '-c', dedent(prog)],
+                        kill_signal=signal.SIGTERM)
+        server.history.new_section('t1')
+        return server
+
+    def test_stdout_gate(self):
+        server = self._server("""
+        import time
+        time.sleep(0.2)
+        print('ready')
+        time.sleep(30)
+        """)
+        self.addCleanup(server.kill)
+        server.wait_ready(stdout='ready', timeout=5)
+
+    def test_tcp_and_http_gates(self):
+        port = socket_port()
+        server = self._server("""
+        import http.server, time
+        time.sleep(0.3)
+        http.server.test(http.server.SimpleHTTPRequestHandler,
+                         port={}, bind='127.0.0.1')
+        """.format(port))
+        self.addCleanup(server.kill)
+        start = time.monotonic()
+        server.wait_ready(tcp=port, http='/', port=port, timeout=5)
+        self.assertLess(time.monotonic() - start, 3)
+
+    def test_should_raise_if_process_exits(self):
+        server = self._server('pass')
+        with self.assertRaisesRegex(RuntimeError, 'exited'):
+            server.wait_ready(stdout='ready', timeout=5)
+
+    def test_should_raise_on_timeout(self):
+        server = self._server('import time; time.sleep(30)')
+        self.addCleanup(server.kill)
+        with self.assertRaisesRegex(RuntimeError, 'not ready'):
+            server.wait_ready(stdout='ready', timeout=0.3)
+
+
+class TestStartAndKillAll(unittest.TestCase):
+
+    def test_kill_all_should_not_start_loop_without_server(self):
+        with mock.patch.object(EventLoopThread, 'get') as get:
+            kill_all([])
+        get.assert_not_called()
+
+    def test_exit_should_not_start_loop_without_server(self):
+        process = subprocess.run(
+            [sys.executable, '-c', dedent("""
+            import atexit, sys
+            # Called after the exit handlers of cricri.
+            atexit.register(lambda: print(
+                sys.modules['cricri.inet.server'].EventLoopThread._instance))
+            import cricri
+            """)],
+            capture_output=True, text=True, timeout=30)
+        self.assertEqual((process.stdout, process.stderr), ('None\n', ''))
+
+    IGNORE_SIGINT = dedent("""
+    import signal, time
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    print('started')
+    time.sleep(30)
+    """)
+
+    def _server(self, prog, kill_timeout=None):
+        server = Server([sys.executable, '-u', '-c', prog],
+                        kill_timeout=kill_timeout, start=False)
+        server.history.new_section('t1')
+        return server
+
+    def test_start_all_should_spawn_servers(self):
+        servers = {name: self._server("print('started')")
+                   for name in ('s1', 's2')}
+        start_all(servers)
+        self.addCleanup(kill_all, servers.values())
+        for server in servers.values():
+            server.assert_stdout_is('started\n', 5)
+
+    def test_start_all_should_name_servers_which_cannot_start(self):
+        servers = {'s1': self._server("print('started')"),
+                   's2': Server(['/not/a/program'], start=False)}
+        with self.assertRaisesRegex(RuntimeError, 's2: '):
+            start_all(servers)
+        kill_all(servers.values())
+
+    def test_kill_all_should_escalate_to_sigkill_concurrently(self):
+        servers = [self._server(self.IGNORE_SIGINT, kill_timeout=0.5)
+                   for _ in range(3)]
+        start_all(dict(enumerate(servers)))
+        for server in servers:
+            server.assert_stdout_is('started\n', 5)
+
+        start = time.monotonic()
+        kill_all(servers)
+        self.assertLess(time.monotonic() - start, 1.4)
+
+    def test_kill_should_ignore_exited_process(self):
+        server = Server([sys.executable, '-c', 'pass'])
+        time.sleep(0.3)
+        server.kill()
+        server.kill()
+
+
+class TestLatency(unittest.TestCase):
+
+    def test_chunk_times_should_follow_eviction(self):
+        output = OutputChunks(max_size=4)
+        output.append('ab', timestamp=1.0)
+        output.append('cd', timestamp=2.0)
+        output.append('ef', timestamp=3.0)
+        self.assertIsNone(output.time_at(1))
+        self.assertEqual(output.time_at(2), 2.0)
+        self.assertEqual(output.offset_at(0.5), 2)
+        self.assertEqual(output.offset_at(2.5), 4)
+        self.assertEqual(output.offset_at(4.0), 6)
+
+    def test_latency_should_ignore_output_written_before(self):
+        server = Server([sys.executable, '-u', '-c', dedent("""
+        import time
+        print('tick')
+        time.sleep(0.3)
+        print('tick')
+        time.sleep(30)
+        """)], kill_signal=signal.SIGTERM)
+        self.addCleanup(server.kill)
+        server.history.new_section('t1')
+        server.assert_stdout_regex('tick', 5)
+        latency = server.latency(time.monotonic(), 'tick', 5)
+        self.assertGreater(latency, 0.1)
+        self.assertEqual(server.history.measures('latency'),
+                         [Measure('t1', 'latency', Latency('tick', latency))])
+        with self.assertRaisesRegex(AssertionError, 'expected below'):
+            server.assert_latency_below(time.monotonic() - 1, 'tick', 0.5)
+
+    def test_latency_should_raise_if_output_is_evicted(self):
+        server = Server([sys.executable, '-u', '-c', dedent("""
+        import time
+        print('tick')
+        time.sleep(30)
+        """)], kill_signal=signal.SIGTERM)
+        self.addCleanup(server.kill)
+        server.history.new_section('t1')
+        since = time.monotonic()
+        with mock.patch.object(server.history, 'get_time',
+                               return_value=None):
+            with self.assertRaisesRegex(AssertionError, 'evicted'):
+                server.latency(since, 'tick', 5)
+        self.assertEqual(server.history.measures('latency'), [])
+
+    def test_latency_should_be_measured_from_client_action(self):
+        port = socket_port()
+        server = Server([sys.executable, '-u', '-c', dedent("""
+        import socket
+        listener = socket.create_server(('127.0.0.1', {}))
+        print('listen')
+        connection, _ = listener.accept()
+        print('received', connection.recv(64))
+        """.format(port))], kill_signal=signal.SIGTERM)
+        self.addCleanup(server.kill)
+        server.history.new_section('t1')
+        server.assert_stdout_regex('listen', 5)
+
+        client = TCPClient(port, timeout=2, tries=3, wait=0.1)
+        self.addCleanup(client.close)
+        client.send('hello')
+        server.assert_latency_below(client.action_time, 'received', 2)
+
+
+class TestProcessSample(unittest.TestCase):
+
+    def _server(self, **kwargs):
+        server = Server([sys.executable, '-c', 'import time; time.sleep(30)'],
+                        kill_signal=signal.SIGTERM, **kwargs)
+        self.addCleanup(server.kill)
+        server.history.new_section('t1')
+        return server
+
+    def test_sample_should_be_attached_to_section(self):
+        server = self._server()
+        sample = server.sample()
+        self.assertGreater(sample.rss, 0)
+        self.assertGreaterEqual(sample.cpu, 0)
+        self.assertGreaterEqual(sample.fds, 3)
+        self.assertEqual(sample.threads, 1)
+        self.assertEqual(server.history.measures('process'),
+                         [Measure('t1', 'process', sample)])
+
+    def test_assert_rss_below(self):
+        server = self._server()
+        server.assert_rss_below(2 ** 40)
+        with self.assertRaisesRegex(AssertionError, 'expected below'):
+            server.assert_rss_below(1)
+
+    def test_assert_growth_below(self):
+        server = self._server()
+        server.sample()
+        server.assert_growth_below(rss=2 ** 40, fds=0, threads=0)
+        with self.assertRaisesRegex(AssertionError, 'cpu grew from'):
+            server.assert_growth_below(cpu=-1)
+        with self.assertRaises(ValueError):
+            server.assert_growth_below(time=0)
+
+    def test_sample_interval_should_sample_periodically(self):
+        server = self._server(sample_interval=0.05)
+        time.sleep(0.3)
+        self.assertGreater(len(server.history.measures('process')), 2)
+        self.assertEqual(set(server.growth()),
+                         {'rss', 'cpu', 'fds', 'threads'})
+
+    def test_sample_should_return_none_when_process_exited(self):
+        server = Server([sys.executable, '-c', 'pass'])
+        server.kill()
+        self.assertIsNone(server.sample())
+        self.assertEqual(server.growth(), {})
+
+
+def socket_port():
+    tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    tcp.bind(('', 0))
+    port = tcp.getsockname()[1]
+    tcp.close()
+    return port
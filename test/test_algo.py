@@ -1,5 +1,6 @@
 import unittest
-from cricri.algo import walk
+from cricri.algo import (bounded_walk, graph_coverage, greedy_cover,
+                         random_walk, walk)
 
 
 class TestWalk(unittest.TestCase):
@@ -102,3 +103,85 @@ class TestWalk(unittest.TestCase):
     def test_graph_4_loop_2(self):
         pathes = walk(self.graph_4, 'A', nb_loop=2)
         self.assertCountEqual(pathes, self.expected_4_loop_2)
+
+
+class TestGreedyCover(unittest.TestCase):
+
+    pathes = [
+        ('A', 'B'),
+        ('A', 'B', 'C', 'D'),
+        ('A', 'C'),
+    ]
+
+    def test_should_select_path_adding_most_coverage_per_cost(self):
+        selected = greedy_cover(self.pathes, len, 6)
+        self.assertEqual(selected, [('A', 'B', 'C', 'D'), ('A', 'C')])
+
+    def test_should_not_exceed_budget(self):
+        selected = greedy_cover(self.pathes, len, 3)
+        self.assertEqual(selected, [('A', 'B')])
+
+    def test_should_fill_budget_with_cheapest_pathes(self):
+        selected = greedy_cover(self.pathes, len, 8)
+        self.assertEqual(selected,
+                         [('A', 'B', 'C', 'D'), ('A', 'C'), ('A', 'B')])
+
+
+class TestGraphCoverage(unittest.TestCase):
+
+    def test_unreachable_node_should_not_be_covered(self):
+        graph = {'A': ['B'], 'B': ['A'], 'C': ['A']}
+        self.assertEqual(graph_coverage(graph, 'A'),
+                         {'A', 'B', ('A', 'B'), ('B', 'A')})
+
+
+class TestRandomWalk(unittest.TestCase):
+    graph = {
+        'A': ['B', 'C'],
+        'B': ['A'],
+        'C': [],
+    }
+
+    def test_same_seed_should_give_same_pathes(self):
+        self.assertEqual(random_walk(self.graph, 'A', 20, 6, seed=3),
+                         random_walk(self.graph, 'A', 20, 6, seed=3))
+
+    def test_pathes_should_be_distinct(self):
+        pathes = random_walk(self.graph, 'A', 50, 4)
+        self.assertEqual(len(pathes), len(set(pathes)))
+        self.assertLessEqual(set(pathes), {
+            ('A', 'C'),
+            ('A', 'B', 'A', 'C'),
+            ('A', 'B', 'A', 'B'),
+        })
+
+    def test_path_should_not_exceed_max_length(self):
+        pathes = random_walk(self.graph, 'A', 50, 3)
+        self.assertEqual(max(len(path) for path in pathes), 3)
+
+    def test_null_weight_should_disable_edge(self):
+        pathes = random_walk(self.graph, 'A', 50, 5,
+                             weights={('A', 'C'): 0})
+        self.assertEqual(pathes, [('A', 'B', 'A', 'B', 'A')])
+
+
+class TestBoundedWalk(unittest.TestCase):
+
+    def test_should_stop_at_max_length(self):
+        pathes = bounded_walk(TestWalk.graph_4, 'A', 4)
+        self.assertEqual(pathes, [('A', 'B', 'A', 'B')])
+
+    def test_should_enumerate_all_pathes_up_to_max_length(self):
+        pathes = bounded_walk(TestWalk.graph_2, 'A', 3)
+        self.assertCountEqual(pathes, [
+            ('A', 'A', 'A'), ('A', 'A', 'B'),
+            ('A', 'B', 'A'), ('A', 'B', 'B'),
+        ])
+
+    def test_should_keep_shorter_pathes_ending_on_dead_end(self):
+        pathes = bounded_walk(TestWalk.graph_1, 'A', 5)
+        self.assertEqual(pathes, [('A', 'B', 'C')])
+
+    def test_max_length_should_be_positive(self):
+        with self.assertRaises(ValueError):
+            bounded_walk(TestWalk.graph_1, 'A', 0)
@@ -0,0 +1,95 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from cricri import TestState, benchmark
+from cricri.benchmark import Baseline, BenchmarkSpec, measure
+
+
+class BaseTestState(TestState):
+
+    @classmethod
+    def start_scenario(cls):
+        cls.calls = 0
+
+
+class Start(BaseTestState, start=True):
+
+    @benchmark(repeat=20, warmup=5)
+    def input(self):
+        type(self).calls += 1
+
+    def test_input_should_run_warmup_and_repeat_times(self):
+        self.assertEqual(self.calls, 25)
+
+
+class Check(BaseTestState, previous=['Start']):
+
+    @benchmark(repeat=10, warmup=0, tolerance=0.5)
+    def test_calls(self):
+        self.assertGreaterEqual(self.calls, 25)
+
+
+def run(test_case):
+    result = unittest.TestResult()
+    with unittest.mock.patch('sys.stderr', new=io.StringIO()):
+        unittest.TestLoader().loadTestsFromTestCase(test_case).run(result)
+    return result
+
+
+class TestMeasure(unittest.TestCase):
+
+    def test_should_compute_percentiles(self):
+        calls = []
+        result = measure('name', calls.append, None,
+                         BenchmarkSpec(repeat=4, warmup=1, tolerance=0))
+        self.assertEqual(len(calls), 5)
+        self.assertEqual(result.repeat, 4)
+        self.assertLessEqual(result.p50, result.p99)
+        self.assertLessEqual(result.p99, result.max)
+        self.assertGreater(result.ops_per_sec, 0)
+
+
+class TestBenchmarkDecorator(unittest.TestCase):
+
+    def test_repeat_should_be_positive(self):
+        with self.assertRaises(ValueError):
+            benchmark(repeat=0)
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'baseline.json')
+        Baseline._instances.clear()
+        self.addCleanup(Baseline._instances.clear)
+        self.addCleanup(setattr, BaseTestState, 'benchmark_baseline', None)
+        BaseTestState.benchmark_baseline = self.path
+
+    def test_results_should_be_recorded_and_stored_as_baseline(self):
+        test_case = BaseTestState.build_test_case(('Start', 'Check'))
+        result = run(test_case)
+        self.assertTrue(result.wasSuccessful(), result.failures)
+        names = [benchmark_result.name for benchmark_result
+                 in test_case.__cricri_scenario__.benchmarks]
+        self.assertEqual(names, ['test.test_benchmark.BaseTestState:Start'
+                                 '.input',
+                                 'test.test_benchmark.BaseTestState:Check'
+                                 '.test_calls'])
+        with open(self.path) as baseline_file:
+            self.assertEqual(sorted(json.load(baseline_file)),
+                             sorted(names))
+
+    def test_regression_should_fail(self):
+        with open(self.path, 'w') as baseline_file:
+            json.dump({'test.test_benchmark.BaseTestState:Check.test_calls':
+                       float('inf')}, baseline_file)
+
+        result = run(BaseTestState.build_test_case(('Start', 'Check')))
+        self.assertEqual(len(result.failures), 1)
+        self.assertIn('slower than the baseline', result.failures[0][1])
@@ -0,0 +1,90 @@
+import io
+import unittest
+
+from cricri import TestState
+from cricri.budget import TimeBudget
+from cricri.history import RunHistory
+
+
+class BaseTestState(TestState):
+    fail_start = False
+
+    @classmethod
+    def start_scenario(cls):
+        if cls.fail_start:
+            raise RuntimeError('cannot start')
+
+
+class A(BaseTestState, start=True):
+    def input(self):
+        pass
+
+
+class B(BaseTestState, previous=['A']):
+    def input(self):
+        pass
+
+
+class C(BaseTestState, previous=['A']):
+    def input(self):
+        pass
+
+
+class D(BaseTestState, previous=['C']):
+    def input(self):
+        pass
+
+
+class TestTimeBudget(unittest.TestCase):
+
+    REACHABLE = {'A', 'B', 'C', 'D', ('A', 'B'), ('A', 'C'), ('C', 'D')}
+
+    def setUp(self):
+        self.history = RunHistory(':memory:')
+        self.history.record_step(BaseTestState.scenario_name(('A',)), 1)
+        self.history.record_step(BaseTestState.scenario_name(('B',)), 1)
+        self.history.record_step(BaseTestState.scenario_name(('C',)), 5)
+        self.history.record_step(BaseTestState.scenario_name(('D',)), 5)
+        self.stream = io.StringIO()
+        self.budget = TimeBudget(5, stream=self.stream)
+        self.test_cases = self.budget.select(
+            BaseTestState.get_test_cases(0, self.history), self.history,
+            self.REACHABLE)
+
+    def _run(self):
+        suite = unittest.TestSuite()
+        for test_case in self.test_cases:
+            suite.addTests(
+                unittest.TestLoader().loadTestsFromTestCase(test_case))
+        result = unittest.TestResult()
+        suite.run(result)
+        return result
+
+    def test_should_select_scenarios_within_budget(self):
+        self.assertEqual([test_case.__name__
+                          for test_case in self.test_cases], ['AB'])
+
+    def test_should_report_coverage(self):
+        self._run()
+        self.assertIn('2/4 states and 1/3 transitions covered'
+                      ' by 1/1 selected scenarios', self.stream.getvalue())
+
+    def test_should_skip_scenarios_when_budget_is_spent(self):
+        self.budget.deadline = 0
+        result = self._run()
+        self.assertEqual(len(result.skipped), 1)
+        self.assertIn('0/1 selected scenarios', self.stream.getvalue())
+
+    def test_failed_set_up_should_not_cover_steps(self):
+        BaseTestState.fail_start = True
+        self.addCleanup(setattr, BaseTestState, 'fail_start', False)
+        result = self._run()
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn('0/4 states and 0/3 transitions covered'
+                      ' by 0/1 selected scenarios', self.stream.getvalue())
+
+    def test_report_should_be_printed_once_if_scenarios_are_not_run(self):
+        self.budget.print_report()
+        self.budget.print_report()
+        self.assertEqual(self.stream.getvalue().count('cricri: time budget'),
+                         1)
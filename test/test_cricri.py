@@ -1,11 +1,20 @@
+import gzip
+import io
+import os
+import signal
+import sys
+import tempfile
+import types
 import unittest
 import unittest.mock
 
 import voluptuous
 
+from cricri import events
 from cricri.cricri import (MetaServerTestState, MetaTestState, MultiDict,
-                           TestServer)
+                           TestServer, TestState, current_scenario)
 from cricri.inet import Client
+from cricri.inet.server import STDOUT
 
 
 class TestMultiDict(unittest.TestCase):
@@ -40,6 +49,26 @@ class TestPrefixTestMethod(unittest.TestCase):
         self.assertEqual(MetaTestState.PrefixTestMethod.len(), 10)
 
 
+class TestStartScenario(unittest.TestCase):
+
+    def test_hooks_should_be_called_on_defining_class(self):
+        calls = []
+
+        class Base(TestState):
+            @classmethod
+            def start_scenario(cls):
+                calls.append((cls, current_scenario().steps))
+
+        class Start(Base, start=True):
+            pass
+
+        test_case = Base.build_test_case(('Start',))
+        unittest.TestLoader().loadTestsFromTestCase(test_case).run(
+            unittest.TestResult())
+        self.assertEqual(calls, [(Base, ('Start',))])
+        self.assertIsNone(current_scenario())
+
+
 class TestCustomClientCreation(unittest.TestCase):
 
     def setUp(self):
@@ -98,3 +127,299 @@ class TestCustomClientCreation(unittest.TestCase):
         MySubClass.start_scenario()
         MySubClass.stop_scenario()
         self.spy.assert_called_with('close')
+
+
+class TestReadyGate(unittest.TestCase):
+
+    def test_start_scenario_should_wait_ready_gate(self):
+
+        class MySubClass(TestServer):
+            commands = [{
+                "name": "server",
+                "cmd": [sys.executable, "-u", "-c",
+                        "import time; time.sleep(0.3); print('ready {p}');"
+                        " time.sleep(30)"],
+                "kill-signal": signal.SIGTERM,
+                "ready": {"stdout": r"ready \d+"}
+            }]
+
+        MySubClass.start_scenario()
+        self.addCleanup(MySubClass.stop_scenario)
+        self.assertRegex(
+            MySubClass.servers['server'].history.get_history(STDOUT),
+            r'ready \d+')
+
+    def test_start_scenario_should_raise_if_server_is_not_ready(self):
+
+        class MySubClass(TestServer):
+            commands = [{
+                "name": "server",
+                "cmd": [sys.executable, "-c", "pass"],
+                "ready": {"stdout": "ready", "timeout": 5}
+            }]
+
+        with self.assertRaisesRegex(RuntimeError, 'server: .* exited'):
+            MySubClass.start_scenario()
+        self.assertEqual(MySubClass.servers, {})
+
+    def test_http_gate_should_require_port(self):
+        with self.assertRaises(AttributeError):
+
+            class MySubClass(TestServer):
+                commands = [{
+                    "name": "server",
+                    "cmd": ["server"],
+                    "ready": {"http": "/health"}
+                }]
+
+
+class TestHistorySpill(unittest.TestCase):
+
+    def test_stop_scenario_should_close_spill_file(self):
+
+        class MySubClass(TestServer):
+            commands = [{
+                "name": "server",
+                "cmd": [sys.executable, "-u", "-c",
+                        "print('ready'); import time; time.sleep(30)"],
+                "kill-signal": signal.SIGTERM,
+                "history-spill": True,
+                "ready": {"stdout": "ready"}
+            }]
+
+        MySubClass.start_scenario()
+        history = MySubClass.servers['server'].history
+        self.assertFalse(history._spill_file.closed)
+        MySubClass.stop_scenario()
+        self.assertTrue(history._spill_file.closed)
+
+
+class TestReuseServer(unittest.TestCase):
+
+    def setUp(self):
+        self.resets = []
+        resets = self.resets
+
+        class MySubClass(TestServer):
+            commands = [{
+                "name": "server",
+                "cmd": [sys.executable, "-u", "-c",
+                        "import time; print('started {port-1}');"
+                        " time.sleep(30)"],
+                "kill-signal": signal.SIGTERM,
+                "ready": {"stdout": "started"},
+                "reuse": True
+            }]
+
+            @classmethod
+            def reset_scenario(cls):
+                resets.append(cls.servers['server'])
+
+        self.test_class = MySubClass
+        self.addCleanup(TestServer.kill_reused_servers)
+
+    def run_scenario(self, failed=False):
+        self.test_class.__cricri_scenario__ = types.SimpleNamespace(
+            failed=failed)
+        self.test_class.start_scenario()
+        server = self.test_class.servers['server']
+        port = self.test_class.get_port('{port-1}')
+        self.test_class.stop_scenario()
+        return server, port
+
+    def test_server_should_be_reused(self):
+        server, port = self.run_scenario()
+        self.assertEqual(self.resets, [])
+        self.assertEqual(self.run_scenario(), (server, port))
+        self.assertEqual(self.resets, [server])
+        self.assertEqual(list(server.history), [])
+
+    def test_server_should_restart_after_failed_scenario(self):
+        server, _ = self.run_scenario(failed=True)
+        self.assertFalse(server.running)
+        self.assertIsNot(self.run_scenario()[0], server)
+        self.assertEqual(self.resets, [])
+
+    def test_server_should_not_be_reused_after_failed_generated_scenario(self):
+
+        class Fail(self.test_class, start=True):
+            def test_fail(self):
+                raise AssertionError('fail')
+
+        test_case = self.test_class.build_test_case(('Fail',))
+        with unittest.mock.patch('sys.stdout', new=io.StringIO()):
+            unittest.TestLoader().loadTestsFromTestCase(test_case).run(
+                unittest.TestResult())
+        self.assertEqual(TestServer._reused_servers, {})
+
+    def test_server_should_restart_after_crash(self):
+        server, _ = self.run_scenario()
+        server.kill()
+        self.assertIsNot(self.run_scenario()[0], server)
+        self.assertEqual(self.resets, [])
+
+    def test_server_should_restart_if_reset_fails(self):
+
+        def reset_scenario():
+            raise RuntimeError('cannot reset')
+
+        server, _ = self.run_scenario()
+        self.test_class.reset_scenario = reset_scenario
+        with unittest.mock.patch('sys.stderr'):
+            self.assertIsNot(self.run_scenario()[0], server)
+        self.assertFalse(server.running)
+
+
+class TestPrespawnServer(unittest.TestCase):
+
+    def setUp(self):
+
+        class MySubClass(TestServer):
+            commands = [{
+                "name": "server",
+                "cmd": [sys.executable, "-u", "-c",
+                        "import time; print('started {port-1}');"
+                        " time.sleep(30)"],
+                "kill-signal": signal.SIGTERM,
+                "ready": {"stdout": "started"},
+                "prespawn": True
+            }]
+
+        self.test_class = MySubClass
+        self.addCleanup(TestServer.kill_reused_servers)
+
+    def run_scenario(self):
+        self.test_class.start_scenario()
+        server = self.test_class.servers['server']
+        port = self.test_class.get_port('{port-1}')
+        self.assertRegex(server.history.get_history(STDOUT),
+                         'started {}'.format(port))
+        pool_ports, pool = TestServer._prespawned_servers[self.test_class]
+        self.test_class.stop_scenario()
+        self.assertFalse(server.running)
+        return server, port, (dict(pool_ports), dict(pool))
+
+    def test_next_scenario_should_use_prespawned_server(self):
+        server, port, (pool_ports, pool) = self.run_scenario()
+        self.assertTrue(pool['server'].running)
+        self.assertNotEqual(pool_ports['{port-1}'], port)
+
+        next_server, next_port, _ = self.run_scenario()
+        self.assertIs(next_server, pool['server'])
+        self.assertEqual(next_port, pool_ports['{port-1}'])
+
+    def test_crashed_prespawned_server_should_be_replaced(self):
+        _, _, (_, pool) = self.run_scenario()
+        pool['server'].kill()
+        next_server, _, _ = self.run_scenario()
+        self.assertIsNot(next_server, pool['server'])
+
+
+class TestServerLogs(unittest.TestCase):
+
+    def build_test_class(self, **attributes):
+        attributes['commands'] = [{
+            "name": "server",
+            "cmd": [sys.executable, "-u", "-c",
+                    "import sys, time; sys.stdout.write('hello\\n');"
+                    " sys.stderr.write('oops\\n'); time.sleep(30)"],
+            "kill-signal": signal.SIGTERM,
+            "ready": {"stdout": "hello", "stderr": "oops"}
+        }]
+        return type('MySubClass', (TestServer,), attributes)
+
+    def run_scenario(self, test_class, failed=False):
+        test_class.__cricri_scenario__ = types.SimpleNamespace(
+            name='test.Base:A,B', failed=failed)
+        test_class.start_scenario()
+        with unittest.mock.patch('sys.stdout', new=io.StringIO()) as stdout:
+            test_class.stop_scenario()
+        return stdout.getvalue()
+
+    def test_logs_should_be_written_in_scenario_files(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            test_class = self.build_test_class(log_dir=log_dir,
+                                               log_console='never')
+            self.assertEqual(self.run_scenario(test_class, True), '')
+            with open(os.path.join(
+                    log_dir, 'test.Base_A,B.server.stdout.log')) as log:
+                self.assertEqual(log.read(), 'hello\n')
+            with open(os.path.join(
+                    log_dir, 'test.Base_A,B.server.stderr.log')) as log:
+                self.assertEqual(log.read(), 'oops\n')
+
+    def test_logs_can_be_compressed(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            test_class = self.build_test_class(log_dir=log_dir,
+                                               log_compress=True)
+            self.run_scenario(test_class)
+            with gzip.open(os.path.join(
+                    log_dir, 'test.Base_A,B.server.stdout.log.gz'),
+                    'rt') as log:
+                self.assertEqual(log.read(), 'hello\n')
+
+    def test_logs_should_be_printed_for_failed_scenario_only(self):
+        test_class = self.build_test_class()
+        self.assertEqual(self.run_scenario(test_class), '')
+        self.assertIn('hello', self.run_scenario(test_class, failed=True))
+
+    def test_generated_failed_scenario_should_print_and_write_logs(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            base = self.build_test_class(log_dir=log_dir)
+
+            class Start(base, start=True):
+                pass
+
+            class Fail(base, previous=['Start']):
+                def test_fail(self):
+                    raise AssertionError('fail')
+
+            outputs = []
+            for scenario in (('Start',), ('Start', 'Fail')):
+                test_case = base.build_test_case(scenario)
+                with unittest.mock.patch('sys.stdout',
+                                         new=io.StringIO()) as stdout:
+                    unittest.TestLoader().loadTestsFromTestCase(
+                        test_case).run(unittest.TestResult())
+                outputs.append(stdout.getvalue())
+
+            self.assertEqual(outputs[0], '')
+            self.assertIn('hello', outputs[1])
+            self.assertEqual(
+                sorted(name.rsplit(':', 1)[-1].rsplit('_', 1)[-1]
+                       for name in os.listdir(log_dir)),
+                ['Start,Fail.server.stderr.log',
+                 'Start,Fail.server.stdout.log',
+                 'Start.server.stderr.log',
+                 'Start.server.stdout.log'])
+
+    def test_growth_should_be_printed_for_sampled_servers(self):
+        test_class = self.build_test_class(log_console='always')
+        test_class.commands[0]['sample'] = True
+        self.assertRegex(self.run_scenario(test_class),
+                         r'rss: \d+ -> \d+ \([+-]\d+\)')
+
+    def test_growth_should_be_published_for_sampled_servers(self):
+        test_class = self.build_test_class(log_console='never')
+        test_class.commands[0]['sample'] = True
+        published = []
+
+        def on_growth(**kwargs):
+            published.append(kwargs)
+
+        events.subscribe('process_growth', on_growth)
+        self.addCleanup(events.unsubscribe, 'process_growth', on_growth)
+        self.run_scenario(test_class)
+        self.assertEqual(len(published), 1)
+        self.assertEqual(published[0]['server'].name, 'server')
+        self.assertEqual(set(published[0]['growth']),
+                         {'rss', 'cpu', 'fds', 'threads'})
+
+    def test_log_tail_should_limit_printed_lines(self):
+        test_class = self.build_test_class(log_console='always', log_tail=1)
+        test_class.commands[0]['cmd'][-1] = (
+            "import time; print('a'); print('b'); time.sleep(30)")
+        test_class.commands[0]['ready'] = {"stdout": "b"}
+        output = self.run_scenario(test_class)
+        self.assertIn('b', output)
+        self.assertNotIn('a\n', output)
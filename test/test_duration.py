@@ -0,0 +1,116 @@
+import time
+import unittest
+import unittest.mock
+import warnings
+
+from cricri import DurationBudgetWarning, TestState, benchmark, max_duration
+from cricri.duration import DURATIONS
+
+
+class BaseTestState(TestState):
+    default_max_duration = 0.05
+
+
+class Start(BaseTestState, start=True):
+
+    @max_duration(0.01)
+    def input(self):
+        time.sleep(type(self).sleep)
+
+    def test_default_budget(self):
+        time.sleep(type(self).sleep)
+
+
+class Default(BaseTestState, previous=['Start']):
+
+    def input(self):
+        time.sleep(0.06)
+
+
+class Soft(BaseTestState, previous=['Start']):
+
+    @max_duration(0.01, soft=True)
+    def input(self):
+        time.sleep(0.02)
+
+
+def run(test_case):
+    result = unittest.TestResult()
+    unittest.TestLoader().loadTestsFromTestCase(test_case).run(result)
+    return result
+
+
+class TestMaxDuration(unittest.TestCase):
+
+    def setUp(self):
+        DURATIONS.clear()
+        self.addCleanup(DURATIONS.clear)
+
+    def test_call_within_budget_should_pass(self):
+        test_case = BaseTestState.build_test_case(('Start',))
+        test_case.sleep = 0
+        self.assertTrue(run(test_case).wasSuccessful())
+        self.assertEqual(
+            DURATIONS.distribution(
+                'test.test_duration.BaseTestState:Start.input').count, 1)
+
+    def test_exceeded_input_budget_should_fail(self):
+        test_case = BaseTestState.build_test_case(('Start',))
+        test_case.sleep = 0.02
+        result = run(test_case)
+        self.assertEqual(len(result.errors + result.failures), 1)
+        self.assertIn('Start.input took', (result.errors
+                                           + result.failures)[0][1])
+
+    def test_exceeded_default_budget_should_fail(self):
+        test_case = BaseTestState.build_test_case(('Start', 'Default'))
+        test_case.sleep = 0
+        result = run(test_case)
+        self.assertEqual(len(result.failures), 1)
+        self.assertIn('Default.input took', result.failures[0][1])
+        self.assertIn('more than its 50.0ms budget', result.failures[0][1])
+
+    def test_soft_budget_should_warn(self):
+        test_case = BaseTestState.build_test_case(('Start', 'Soft'))
+        test_case.sleep = 0
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            result = run(test_case)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual([warning.category for warning in caught],
+                         [DurationBudgetWarning])
+
+    def test_report_should_contain_distribution(self):
+        test_case = BaseTestState.build_test_case(('Start',))
+        test_case.sleep = 0
+        run(test_case)
+        run(test_case)
+        report = DURATIONS.report()
+        self.assertIn('BaseTestState:Start.input: 2 calls, 0 over the 10.0ms'
+                      ' budget, p50', report)
+        self.assertIn('BaseTestState:Start.test_default_budget: 2 calls',
+                      report)
+
+
+class BenchmarkedTestState(TestState):
+    default_max_duration = 0.05
+
+
+class Repeat(BenchmarkedTestState, start=True):
+
+    @benchmark(repeat=10, warmup=0)
+    def input(self):
+        time.sleep(0.01)
+
+
+class TestBenchmarkedBudget(unittest.TestCase):
+
+    def test_budget_should_apply_to_one_call(self):
+        DURATIONS.clear()
+        self.addCleanup(DURATIONS.clear)
+        with unittest.mock.patch('sys.stderr'):
+            result = run(BenchmarkedTestState.build_test_case(('Repeat',)))
+        self.assertTrue(result.wasSuccessful(), result.failures)
+        self.assertLess(DURATIONS.distribution(
+            'test.test_duration.BenchmarkedTestState:Repeat.input').max,
+                        0.05)
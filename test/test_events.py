@@ -0,0 +1,85 @@
+import signal
+import sys
+import unittest
+
+from cricri import TestState, events
+from cricri.inet.server import STDOUT, Server
+
+
+class BaseTestState(TestState):
+    pass
+
+
+class Start(BaseTestState, start=True):
+
+    def input(self):
+        pass
+
+    def test_fail(self):
+        raise AssertionError('fail')
+
+
+class Next(BaseTestState, previous=['Start']):
+    pass
+
+
+class TestEvents(unittest.TestCase):
+
+    def record(self, *names):
+        recorded = []
+        for name in names:
+            def listener(name=name, **kwargs):
+                recorded.append((name, kwargs))
+            events.subscribe(name, listener)
+            self.addCleanup(events.unsubscribe, name, listener)
+        return recorded
+
+    def test_scenario_events(self):
+        recorded = self.record(*events.EVENTS)
+        test_case = BaseTestState.build_test_case(('Start', 'Next'))
+        unittest.TestLoader().loadTestsFromTestCase(test_case).run(
+            unittest.TestResult())
+
+        self.assertEqual(
+            [(name, kwargs.get('step', '').split(':')[-1],
+              kwargs.get('method')) for name, kwargs in recorded],
+            [('scenario_start', '', None),
+             ('step_start', 'Start', None),
+             ('step_input_start', 'Start', 'input'),
+             ('step_input_end', 'Start', 'input'),
+             ('test_method_end', 'Start', 'test_fail'),
+             ('step_end', 'Start', None),
+             ('step_start', 'Next', None),
+             ('step_end', 'Next', None),
+             ('scenario_end', '', None)])
+        self.assertIsNone(recorded[3][1]['error'])
+        self.assertIsInstance(recorded[4][1]['error'], AssertionError)
+        self.assertTrue(recorded[-1][1]['failed'])
+
+    def test_server_events(self):
+        recorded = self.record('server_spawned', 'server_output',
+                               'server_wait', 'server_exited')
+        server = Server([sys.executable, '-u', '-c',
+                         'import sys, time; sys.stdout.write("ready\\n");'
+                         ' time.sleep(30)'],
+                        signal.SIGTERM, name='server')
+        server.assert_stdout_regex('ready', 2)
+        server.kill()
+
+        names = [name for name, _ in recorded]
+        self.assertEqual(names[0], 'server_spawned')
+        self.assertEqual(names[-1], 'server_exited')
+        self.assertIn('server_wait', names)
+        outputs = [kwargs for name, kwargs in recorded
+                   if name == 'server_output']
+        self.assertEqual({(output['server'], output['fd'])
+                          for output in outputs}, {(server, STDOUT)})
+        self.assertEqual(''.join(output['text'] for output in outputs),
+                         'ready\n')
+
+    def test_unknown_event_should_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            events.subscribe('unknown', print)
+
+    def test_no_listener(self):
+        self.assertEqual(events.LISTENERS['client_request'], ())
@@ -454,3 +454,33 @@ class TestShouldRaiseIfPreviousStepDoesntExist(unittest.TestCase):
                          "The previous `X` defined in"
                          " TestShouldRaiseIfPreviousStepDoesntExist.B class"
                          " doesn't exist")
+
+
+class TestRandomWalkScenarios(unittest.TestCase):
+
+    class BaseTestState(TestState):
+        ...
+
+    class A(BaseTestState, start=True):
+        def input(self):
+            pass
+
+    class B(BaseTestState, previous={'A': 1, 'C': 0}):
+        def input(self):
+            pass
+
+    class C(BaseTestState, previous=['A', 'B']):
+        def input(self):
+            pass
+
+    def test_scenarios_should_follow_weighted_previous(self):
+        test_cases = self.BaseTestState.get_test_cases(
+            0, random_walks=30, max_length=4, seed=1)
+        self.assertCountEqual([test.__name__ for test in test_cases],
+                              ['ABC', 'AC'])
+
+    def test_coverage_report(self):
+        self.assertEqual(
+            self.BaseTestState.coverage_report([('A', 'C')]),
+            'cricri: 1 scenarios cover 2/3 states and 1/4 transitions'
+            ' of TestRandomWalkScenarios.BaseTestState')
@@ -0,0 +1,161 @@
+import os
+import tempfile
+import time
+import types
+import unittest
+
+from cricri import TestState, events
+from cricri.history import RunHistory
+
+
+class TestRunHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.history = RunHistory(':memory:')
+        self.addCleanup(self.history.close)
+
+    def test_watched_scenario_should_be_recorded_on_scenario_end(self):
+        class TestCase(unittest.TestCase):
+            __cricri_scenario__ = types.SimpleNamespace(
+                name='Base:A,B', failed=True, durations=[('A', 1.0)])
+
+        events.watch(TestCase)
+        self.history.watch(TestCase)
+        TestCase.setUpClass()
+        TestCase.tearDownClass()
+        self.assertEqual(self.history.stats('Base:A,B')[:3], (1, 1, True))
+        self.assertEqual(self.history.step_durations(), {'A': 1.0})
+        self.history.close()
+        self.assertNotIn(self.history.on_scenario_end,
+                         events.LISTENERS['scenario_end'])
+
+    def test_history_should_be_persisted_in_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.sqlite')
+            history = RunHistory(path)
+            history.record('A,B', failed=True, duration=3)
+            history.close()
+
+            history = RunHistory(path)
+            self.assertEqual(history.stats('A,B'), (1, 1, True, 3))
+            history.close()
+
+    def test_prioritize_should_run_failing_and_fast_scenarios_first(self):
+        self.history.record('slow-failing', failed=True, duration=8)
+        self.history.record('fast-failing', failed=True, duration=1)
+        self.history.record('slow', failed=False, duration=9)
+        self.history.record('fast', failed=False, duration=2)
+        self.assertEqual(
+            self.history.prioritize(
+                ['slow', 'fast', 'new', 'slow-failing', 'fast-failing']),
+            ['fast-failing', 'slow-failing', 'new', 'fast', 'slow'])
+
+    def test_scenario_and_steps_should_be_recorded_in_one_transaction(self):
+        statements = []
+        self.history._connection.set_trace_callback(statements.append)
+        self.history.record('A,B,A', failed=False, duration=6,
+                            steps=[('A', 1), ('B', 2), ('A', 3)])
+        self.assertEqual(statements.count('COMMIT'), 1)
+        self.assertEqual(self.history.step_durations(), {'A': 2, 'B': 2})
+
+    def test_shard_should_spread_slow_scenarios(self):
+        for name, duration in (('a', 10), ('b', 9), ('c', 2),
+                               ('d', 1), ('e', 1)):
+            self.history.record(name, failed=False, duration=duration)
+
+        names = ['a', 'b', 'c', 'd', 'e']
+        since = time.time()
+        self.assertEqual(self.history.shard(names, 0, 2, since),
+                         ['a', 'd', 'e'])
+        self.assertEqual(self.history.shard(names, 1, 2, since), ['b', 'c'])
+
+    def test_shard_should_not_depend_on_history_load_time(self):
+        names = ['Base:A,{}'.format(step) for step in 'BCDEFGHIJK']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.sqlite')
+            history = RunHistory(path)
+            for duration, name in enumerate(names, 1):
+                history.record(name, failed=False, duration=duration)
+            history.close()
+
+            first_worker = RunHistory(path)
+            self.addCleanup(first_worker.close)
+            first = first_worker.shard(names, 0, 2)
+            #  The first worker records outcomes before the second one
+            #  loads the history.
+            for name in first:
+                first_worker.record(name, failed=False, duration=1000)
+
+            second_worker = RunHistory(path)
+            self.addCleanup(second_worker.close)
+            second = second_worker.shard(names, 1, 2, first_worker.opened)
+
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(sorted(first + second), names)
+
+    def test_skipped_scenario_should_not_be_recorded_as_failed(self):
+        class TestCase(unittest.TestCase):
+            __cricri_scenario__ = types.SimpleNamespace(
+                name='Base:A,B', failed=False, durations=[])
+
+            @classmethod
+            def setUpClass(cls):
+                raise unittest.SkipTest('not now')
+
+        events.watch(TestCase)
+        self.history.watch(TestCase)
+        with self.assertRaises(unittest.SkipTest):
+            TestCase.setUpClass()
+        self.assertIsNone(self.history.stats('Base:A,B'))
+
+    def test_shard_should_raise_if_index_is_out_of_range(self):
+        with self.assertRaises(ValueError):
+            self.history.shard(['a'], 2, 2)
+
+
+class TestLoadTestsWithHistory(unittest.TestCase):
+
+    class BaseTestState(TestState):
+        ...
+
+    class A(BaseTestState, start=True):
+        def input(self):
+            pass
+
+    class B(BaseTestState, previous=['A']):
+        def input(self):
+            pass
+
+        def test_1(self):
+            self.fail('B is broken')
+
+    class C(BaseTestState, previous=['A']):
+        def input(self):
+            pass
+
+    def _run(self, history, **kwargs):
+        load_tests = self.BaseTestState.get_load_tests(history=history,
+                                                       **kwargs)
+        suite = load_tests(unittest.TestLoader(), unittest.TestSuite(), None)
+        names = [type(test).__name__ for test in suite]
+        suite.run(unittest.TestResult())
+        return names
+
+    def test_outcome_should_be_recorded(self):
+        history = RunHistory(':memory:')
+        self._run(history)
+        scenario_name = self.BaseTestState.scenario_name
+        self.assertTrue(history.stats(scenario_name(('A', 'B'))).last_failed)
+        self.assertFalse(history.stats(scenario_name(('A', 'C'))).last_failed)
+
+    def test_failing_scenario_should_run_first(self):
+        history = RunHistory(':memory:')
+        scenario_name = self.BaseTestState.scenario_name
+        history.record(scenario_name(('A', 'C')), False, 0.1)
+        history.record(scenario_name(('A', 'B')), True, 0.1)
+        self.assertEqual(self._run(history, order='priority'),
+                         ['AB', 'AB', 'AC', 'AC'])
+
+    def test_order_should_require_history(self):
+        with self.assertRaises(ValueError):
+            self.BaseTestState.get_load_tests(order='priority')
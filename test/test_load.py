@@ -0,0 +1,169 @@
+import io
+import signal
+import sys
+import time
+import unittest
+from unittest import mock
+
+from cricri import TestServer, TestState
+from cricri.inet.server import IOHistory
+from cricri.load import BUCKETS, load, transition_stats
+
+
+class BaseTestState(TestState):
+    fail_start = False
+
+    @classmethod
+    def start_scenario(cls):
+        if cls.fail_start:
+            raise RuntimeError('cannot start')
+
+
+class Start(BaseTestState, start=True):
+    pass
+
+
+class Work(BaseTestState, previous=['Start']):
+    def input(self):
+        pass
+
+
+class Fail(BaseTestState, previous=['Start']):
+    def test_should_fail(self):
+        self.fail('always fails')
+
+
+class TimeoutTestState(TestState):
+    step_timeout = 0.2
+
+
+class TimeoutStart(TimeoutTestState, start=True):
+    pass
+
+
+class Hang(TimeoutTestState, previous=['TimeoutStart']):
+    def input(self):
+        time.sleep(0.6)
+
+
+class Quick(TimeoutTestState, previous=['TimeoutStart', 'Quick']):
+    def input(self):
+        time.sleep(0.01)
+
+
+ECHO_SERVER = """
+import socket, sys, threading
+
+def echo(connection):
+    while True:
+        data = connection.recv(256)
+        if not data:
+            break
+        connection.send(data)
+
+listener = socket.create_server(('127.0.0.1', int(sys.argv[1])))
+print('listen', flush=True)
+while True:
+    connection, _ = listener.accept()
+    threading.Thread(target=echo, args=(connection,), daemon=True).start()
+"""
+
+
+class BaseTestServer(TestServer):
+    commands = [{
+        "name": "echo",
+        "cmd": [sys.executable, "-c", ECHO_SERVER, "{port}"],
+        "kill-signal": signal.SIGTERM,
+        "ready": {"tcp": "{port}"}
+    }]
+
+    tcp_clients = [{"name": "user", "port": "{port}"}]
+
+
+class Connect(BaseTestServer, start=True):
+    pass
+
+
+class Echo(BaseTestServer, previous=['Connect', 'Echo']):
+    def input(self):
+        self.clients['user'].send(str(id(self.clients)))
+
+    def test_should_echo_on_own_connection(self):
+        self.clients['user'].assert_receive(str(id(self.clients)))
+
+
+class TestTransitionStats(unittest.TestCase):
+
+    def test_histogram_should_count_durations_per_bucket(self):
+        stats = transition_stats([0.0005, 0.0015, 0.003, 20], 1)
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(stats.errors, 1)
+        self.assertEqual(stats.p50, 0.0015)
+        self.assertEqual(stats.max, 20)
+        self.assertEqual([count for _, count in stats.histogram],
+                         [1, 1, 1] + [0] * (len(BUCKETS) - 4) + [1])
+
+
+class TestLoad(unittest.TestCase):
+
+    def test_should_record_error_rate_per_transition(self):
+        stream = io.StringIO()
+        result = load(BaseTestState, users=3, iterations=4,
+                      scenarios=[('Start', 'Work'), ('Start', 'Fail')],
+                      stream=stream)
+        self.assertEqual(result.iterations, 12)
+        self.assertEqual(result.transitions[None, 'Start'].count, 12)
+        self.assertEqual(result.transitions['Start', 'Work'].errors, 0)
+        self.assertEqual(result.transitions['Start', 'Fail'],
+                         result.transitions['Start', 'Fail']._replace(
+                             count=6, errors=6))
+        self.assertIn('Start -> Fail: 6 runs, 100.0% errors',
+                      stream.getvalue())
+
+    def test_setup_errors_should_not_be_transitions(self):
+        BaseTestState.fail_start = True
+        self.addCleanup(setattr, BaseTestState, 'fail_start', False)
+        stream = io.StringIO()
+        result = load(BaseTestState, users=2, iterations=3,
+                      scenarios=[('Start', 'Work')], stream=stream)
+        self.assertEqual(result.setup_errors, 6)
+        self.assertEqual(result.transitions, {})
+        self.assertIn('6 scenarios could not be set up', stream.getvalue())
+
+    def test_deadline_should_be_checked_between_steps(self):
+        result = load(BaseTestState, users=1, duration=0.1, think_time=0.3,
+                      scenarios=[('Start', 'Work')], stream=io.StringIO())
+        self.assertEqual(result.transitions[None, 'Start'].count, 1)
+        self.assertNotIn(('Start', 'Work'), result.transitions)
+
+    def test_step_timeouts_should_be_watched_per_virtual_user(self):
+        stderr = io.StringIO()
+        with mock.patch('sys.stderr', new=stderr):
+            result = load(TimeoutTestState, users=2, iterations=1,
+                          scenarios=[('TimeoutStart', 'Hang'),
+                                     ('TimeoutStart',) + ('Quick',) * 40],
+                          stream=io.StringIO())
+        self.assertEqual(result.transitions['Quick', 'Quick'].errors, 0)
+        self.assertIn('step test.test_load.TimeoutTestState:Hang timed out',
+                      stderr.getvalue())
+        self.assertNotIn('Quick timed out', stderr.getvalue())
+
+    def test_should_require_a_limit(self):
+        with self.assertRaises(ValueError):
+            load(BaseTestState, users=1)
+
+    def test_virtual_users_should_share_servers_with_own_clients(self):
+        result = load(BaseTestServer, users=4, iterations=3, max_length=3,
+                      think_time=0.01, ramp_up=0.1, stream=io.StringIO())
+        self.assertEqual(result.iterations, 12)
+        self.assertEqual(result.transitions[None, 'Connect'].count, 12)
+        self.assertEqual(result.transitions['Connect', 'Echo'].errors, 0)
+        self.assertEqual(result.transitions['Echo', 'Echo'].count, 12)
+        self.assertEqual(BaseTestServer.servers, {})
+
+    def test_virtual_users_should_not_start_history_sections(self):
+        with mock.patch.object(IOHistory, 'new_section') as new_section:
+            result = load(BaseTestServer, users=2, iterations=2,
+                          max_length=3, stream=io.StringIO())
+        self.assertEqual(result.transitions['Connect', 'Echo'].errors, 0)
+        new_section.assert_not_called()
@@ -0,0 +1,79 @@
+import os
+import pstats
+import tempfile
+import tracemalloc
+import unittest
+
+from cricri import TestState, max_duration
+from cricri.profiling import StepProfiles
+
+
+class BaseTestState(TestState):
+    profile_memory = True
+
+
+class Start(BaseTestState, start=True):
+
+    def input(self):
+        type(self).data = []
+
+
+class Allocate(BaseTestState, previous=['Start', 'Allocate']):
+
+    def input(self):
+        self.data.append(bytearray(100000))
+
+
+class Slow(BaseTestState, previous=['Start']):
+
+    @max_duration(0)
+    def input(self):
+        pass
+
+
+def run(test_case):
+    result = unittest.TestResult()
+    unittest.TestLoader().loadTestsFromTestCase(test_case).run(result)
+    return result
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        BaseTestState.profile_dir = self.directory
+        self.addCleanup(setattr, BaseTestState, 'profile_dir', None)
+        self.addCleanup(StepProfiles._instances.clear)
+        self.addCleanup(tracemalloc.stop)
+
+    def test_profiles_should_be_merged_per_step(self):
+        for scenario in (('Start', 'Allocate'),
+                         ('Start', 'Allocate', 'Allocate')):
+            self.assertTrue(run(BaseTestState.build_test_case(scenario))
+                            .wasSuccessful())
+        StepProfiles.write_all()
+
+        prefix = os.path.join(self.directory,
+                              'test.test_profiling.BaseTestState_Allocate')
+        stats = pstats.Stats(prefix + '.pstats')
+        calls = [call_count for (_, _, name), (call_count, *_)
+                 in stats.stats.items() if name == 'input']
+        self.assertEqual(calls, [3])
+
+        with open(prefix + '.alloc.txt') as report:
+            first_line = report.readline()
+        self.assertIn('test_profiling.py', first_line)
+        self.assertIn('+3', first_line)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.directory, 'test.test_profiling.BaseTestState_Start.pstats')))
+
+    def test_budgets_should_not_be_checked(self):
+        result = run(BaseTestState.build_test_case(('Start', 'Slow')))
+        self.assertTrue(result.wasSuccessful())
+
+    def test_no_profile_dir_should_not_profile(self):
+        BaseTestState.profile_dir = None
+        run(BaseTestState.build_test_case(('Start', 'Allocate')))
+        self.assertEqual(StepProfiles._instances, {})
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+
+from cricri import RunHistory, TestState, results
+
+
+class BaseTestState(TestState):
+
+    @classmethod
+    def start_scenario(cls):
+        if getattr(cls, 'skip_scenario', False):
+            raise unittest.SkipTest('not today')
+
+
+class Start(BaseTestState, start=True):
+
+    def input(self):
+        pass
+
+    def test_ok(self):
+        pass
+
+
+class Fail(BaseTestState, previous=['Start']):
+
+    def test_fail(self):
+        raise AssertionError('boom')
+
+    def test_skip(self):
+        self.skipTest('later')
+
+
+class Crash(BaseTestState, previous=['Start']):
+
+    def input(self):
+        raise KeyError('crash')
+
+
+class End(BaseTestState, previous=['Fail', 'Crash']):
+    pass
+
+
+class TestResults(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'results.jsonl')
+        BaseTestState.results_file = self.path
+        self.addCleanup(delattr, BaseTestState, 'results_file')
+        self.addCleanup(results.disable)
+
+    def run_scenarios(self, *scenarios):
+        for scenario in scenarios:
+            test_case = BaseTestState.build_test_case(scenario)
+            unittest.TestLoader().loadTestsFromTestCase(test_case).run(
+                unittest.TestResult())
+        return list(results.read(self.path))
+
+    def test_one_line_should_be_written_per_scenario(self):
+        records = self.run_scenarios(('Start', 'Fail', 'End'),
+                                     ('Start', 'Crash', 'End'))
+        self.assertEqual([(record['steps'], record['outcome'])
+                          for record in records],
+                         [(['Start', 'Fail', 'End'], 'failed'),
+                          (['Start', 'Crash', 'End'], 'failed')])
+        self.assertEqual(records[0]['scenario'],
+                         'test.test_results.BaseTestState:Start,Fail,End')
+        self.assertEqual(records[0]['hash'],
+                         results.scenario_hash(records[0]['scenario']))
+
+        start, fail, end = records[0]['step_results']
+        self.assertEqual((start['outcome'], start['input']['outcome'],
+                          start['tests'][0]['name']),
+                         ('passed', 'passed', 'test_ok'))
+        self.assertEqual([(test['name'], test['outcome'], test['error'])
+                          for test in fail['tests']],
+                         [('test_fail', 'failed', 'boom'),
+                          ('test_skip', 'skipped', 'later')])
+        self.assertEqual(fail['outcome'], 'failed')
+        self.assertEqual(end['outcome'], 'passed')
+
+        crash, end = records[1]['step_results'][1:]
+        self.assertEqual(crash['input']['outcome'], 'error')
+        self.assertEqual(end['outcome'], 'skipped')
+        self.assertEqual(end['skip_reason'],
+                         'Exception occurred in Crash.input')
+        self.assertEqual(records[1]['skip_reason'], end['skip_reason'])
+
+    def test_skipped_scenario_should_be_written(self):
+        BaseTestState.skip_scenario = True
+        self.addCleanup(delattr, BaseTestState, 'skip_scenario')
+        records = self.run_scenarios(('Start', 'Fail', 'End'))
+        self.assertEqual([(record['outcome'], record['skip_reason'],
+                           record['step_results']) for record in records],
+                         [('skipped', 'not today', [])])
+
+    def test_results_should_feed_run_history(self):
+        self.run_scenarios(('Start', 'Fail', 'End'),
+                           ('Start', 'Crash', 'End'))
+        history = RunHistory(':memory:')
+        self.addCleanup(history.close)
+        history.import_results(self.path)
+        stats = history.stats('test.test_results.BaseTestState:'
+                              'Start,Crash,End')
+        self.assertEqual((stats.runs, stats.failures), (1, 1))
+        self.assertEqual(
+            sorted(history.step_durations()),
+            ['test.test_results.BaseTestState:{}'.format(step)
+             for step in ('Crash', 'End', 'Fail', 'Start')])
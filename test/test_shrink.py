@@ -0,0 +1,156 @@
+import io
+import unittest
+import unittest.mock
+
+from cricri import Path, TestState, condition, events, previous
+from cricri.shrink import Shrinker, is_path, shortest_path, shrink
+
+
+class BaseTestState(TestState):
+
+    @classmethod
+    def start_scenario(cls):
+        cls.counter = 0
+
+
+class Start(BaseTestState, start=True):
+    pass
+
+
+class Increment(BaseTestState, previous=['Start', 'Increment', 'Noop']):
+    def input(self):
+        type(self).counter += 1
+
+
+class Noop(BaseTestState, previous=['Start', 'Increment', 'Noop']):
+    def input(self):
+        pass
+
+
+class Check(BaseTestState, previous=['Increment', 'Noop']):
+    def test_counter_should_be_lower_than_2(self):
+        self.assertLess(self.counter, 2)
+
+
+class AmbiguousTestState(TestState):
+
+    @classmethod
+    def start_scenario(cls):
+        cls.counter = 0
+
+
+class AmbiguousStart(AmbiguousTestState, start=True):
+    pass
+
+
+class AmbiguousIncrement(AmbiguousTestState,
+                         previous=['AmbiguousStart', 'AmbiguousIncrement',
+                                   'AmbiguousNoop']):
+    def input(self):
+        type(self).counter += 1
+
+
+class AmbiguousNoop(AmbiguousTestState,
+                    previous=['AmbiguousStart', 'AmbiguousIncrement',
+                              'AmbiguousNoop']):
+    def input(self):
+        pass
+
+
+class AmbiguousCheck(AmbiguousTestState,
+                     previous=['AmbiguousIncrement', 'AmbiguousNoop']):
+
+    @previous('AmbiguousIncrement')
+    def input(self):
+        pass
+
+    @condition(-Path('AmbiguousNoop'))
+    def input(self):
+        pass
+
+    def test_counter_should_be_lower_than_2(self):
+        self.assertLess(self.counter, 2)
+
+
+LONG_SCENARIO = ('Start', 'Noop', 'Increment', 'Noop', 'Noop',
+                 'Increment', 'Noop', 'Increment', 'Check')
+
+
+class TestGraphFunctions(unittest.TestCase):
+
+    graph = {'A': ['B', 'C'], 'B': ['C'], 'C': []}
+
+    def test_is_path(self):
+        self.assertTrue(is_path(self.graph, ('A', 'B', 'C')))
+        self.assertFalse(is_path(self.graph, ('A', 'C', 'B')))
+
+    def test_shortest_path(self):
+        self.assertEqual(shortest_path(self.graph, 'A', 'C'), ('A', 'C'))
+        self.assertIsNone(shortest_path(self.graph, 'C', 'A'))
+
+
+class TestShrink(unittest.TestCase):
+
+    def test_should_find_minimal_reproducer(self):
+        stream = io.StringIO()
+        reproducer = shrink(BaseTestState, LONG_SCENARIO, stream=stream)
+        self.assertEqual(reproducer,
+                         ('Start', 'Increment', 'Increment', 'Check'))
+        self.assertIn('Start -> Increment -> Increment -> Check',
+                      stream.getvalue())
+
+    def test_should_accept_generated_test_case(self):
+        test_case = BaseTestState.build_test_case(LONG_SCENARIO)
+        reproducer = shrink(BaseTestState, test_case, stream=io.StringIO())
+        self.assertEqual(len(reproducer), 4)
+
+    def test_candidates_should_run_in_parallel(self):
+        reproducer = Shrinker(BaseTestState, jobs=2).shrink(LONG_SCENARIO)
+        self.assertEqual(reproducer,
+                         ('Start', 'Increment', 'Increment', 'Check'))
+
+    def test_should_stop_at_first_reproducer(self):
+        shrinker = Shrinker(BaseTestState)
+        failure = shrinker._run([LONG_SCENARIO])[0]
+        reproducer = ('Start', 'Increment', 'Increment', 'Check')
+        self.assertEqual(
+            shrinker._first_reproducer(
+                [reproducer, ('Start', 'Noop', 'Increment', 'Increment',
+                              'Check')], failure),
+            reproducer)
+        self.assertEqual(shrinker.nb_runs, 2)
+
+    def test_should_skip_candidates_with_multiple_valid_inputs(self):
+        scenario = ('AmbiguousStart', 'AmbiguousNoop', 'AmbiguousIncrement',
+                    'AmbiguousNoop', 'AmbiguousIncrement', 'AmbiguousCheck')
+        reproducer = shrink(AmbiguousTestState, scenario,
+                            stream=io.StringIO())
+        self.assertEqual(reproducer,
+                         ('AmbiguousStart', 'AmbiguousIncrement',
+                          'AmbiguousNoop', 'AmbiguousIncrement',
+                          'AmbiguousCheck'))
+
+    def test_candidates_should_not_be_reported(self):
+        calls = []
+
+        def listener(**kwargs):
+            calls.append(kwargs)
+
+        for name in ('scenario_start', 'step_start'):
+            events.subscribe(name, listener)
+            self.addCleanup(events.unsubscribe, name, listener)
+        BaseTestState.results_file = 'unused.jsonl'
+        self.addCleanup(delattr, BaseTestState, 'results_file')
+        with unittest.mock.patch('cricri.results.enable') as enable:
+            shrink(BaseTestState, LONG_SCENARIO, stream=io.StringIO())
+        enable.assert_not_called()
+        self.assertEqual(calls, [])
+
+    def test_should_raise_if_scenario_does_not_fail(self):
+        with self.assertRaises(ValueError):
+            shrink(BaseTestState, ('Start', 'Increment', 'Check'))
+
+    def test_should_match_message(self):
+        reproducer = Shrinker(BaseTestState,
+                              match_message=True).shrink(LONG_SCENARIO)
+        self.assertEqual(reproducer.count('Increment'), 3)
@@ -0,0 +1,111 @@
+import io
+import signal
+import sys
+import time
+import unittest
+import unittest.mock
+
+from cricri import TestServer, TestState
+from cricri.soak import soak, trend
+
+
+class BaseTestState(TestState):
+
+    @classmethod
+    def start_scenario(cls):
+        cls.counter = 0
+        cls.started = getattr(cls, 'started', 0) + 1
+
+
+class Start(BaseTestState, start=True):
+    pass
+
+
+class Increment(BaseTestState, previous=['Start', 'Increment', 'Decrement']):
+    def input(self):
+        type(self).counter += 1
+
+
+class Decrement(BaseTestState, previous=['Increment', 'Decrement']):
+    def input(self):
+        type(self).counter -= 1
+
+    def test_counter_should_be_positive(self):
+        self.assertGreaterEqual(self.counter, 0)
+
+
+class BaseDeadEnd(TestState):
+    pass
+
+
+class First(BaseDeadEnd, start=True):
+    pass
+
+
+class Last(BaseDeadEnd, previous=['First']):
+    pass
+
+
+class BaseTestServer(TestServer):
+    commands = [{
+        "name": "leaky",
+        "cmd": [sys.executable, "-c",
+                "import time\n"
+                "leak = []\n"
+                "while True:\n"
+                "    leak.append(' ' * 200000)\n"
+                "    time.sleep(0.005)"],
+        "kill-signal": signal.SIGTERM
+    }]
+
+
+class Wait(BaseTestServer, start=True):
+    pass
+
+
+class WaitAgain(BaseTestServer, previous=['Wait', 'WaitAgain']):
+    def input(self):
+        time.sleep(0.02)
+
+
+class TestTrend(unittest.TestCase):
+
+    def test_short_series_should_not_grow(self):
+        self.assertFalse(trend([1, 2, 3, 4, 5]).growing)
+
+    def test_first_and_last_are_window_means(self):
+        self.assertEqual(trend(list(range(10)), windows=2),
+                         (2.0, 7.0, True))
+
+
+class TestSoak(unittest.TestCase):
+
+    def test_should_stop_at_first_failure(self):
+        stream = io.StringIO()
+        result = soak(BaseTestState, max_steps=1000, seed=1, stream=stream)
+        self.assertEqual(result.failure[0], 'Decrement')
+        self.assertIn('AssertionError', result.failure[1])
+        self.assertIn('failed at step Decrement', stream.getvalue())
+
+    def test_should_start_scenario_once(self):
+        BaseTestState.started = 0
+        with unittest.mock.patch('sys.stderr', new=io.StringIO()):
+            result = BaseTestState.soak(max_steps=3)
+        self.assertEqual(result.steps, 3)
+        self.assertEqual(BaseTestState.started, 1)
+
+    def test_should_stop_on_dead_end(self):
+        result = soak(BaseDeadEnd, duration=60, stream=io.StringIO())
+        self.assertEqual(result.steps, 2)
+        self.assertIsNone(result.failure)
+
+    def test_should_require_a_limit(self):
+        with self.assertRaises(ValueError):
+            soak(BaseTestState)
+
+    def test_should_flag_growing_rss(self):
+        stream = io.StringIO()
+        result = soak(BaseTestServer, max_steps=40, stream=stream)
+        self.assertTrue(result.trends['leaky rss'].growing)
+        self.assertIn('leaky rss', stream.getvalue())
+        self.assertIn('GROWING', stream.getvalue())
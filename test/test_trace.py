@@ -0,0 +1,100 @@
+import json
+import os
+import signal
+import sys
+import tempfile
+import unittest
+
+from cricri import TestServer, TestState, trace
+
+ECHO_SERVER = '''
+import socket, sys
+server = socket.socket()
+server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+server.bind(('127.0.0.1', int(sys.argv[1])))
+server.listen()
+while True:
+    connection, _ = server.accept()
+    data = connection.recv(256)
+    while data:
+        print('received', data.decode(), flush=True)
+        connection.send(data)
+        data = connection.recv(256)
+'''
+
+
+class BaseTestServer(TestServer):
+    commands = [{
+        'name': 'echo',
+        'cmd': [sys.executable, '-c', ECHO_SERVER, '{port}'],
+        'kill-signal': signal.SIGTERM,
+        'ready': {'tcp': '{port}'}
+    }]
+    tcp_clients = [{'name': 'alice', 'port': '{port}'}]
+
+
+class Echo(BaseTestServer, start=True):
+
+    def input(self):
+        self.clients['alice'].send('hello')
+
+    def test_echo(self):
+        self.clients['alice'].assert_receive('hello')
+        self.servers['echo'].assert_stdout_regex('received hello', 2)
+
+
+class BaseTestState(TestState):
+    pass
+
+
+class Start(BaseTestState, start=True):
+    pass
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'trace-{pid}.json')
+        trace.disable()
+        self.addCleanup(trace.disable)
+
+    def run_and_load(self, base, scenario):
+        base.trace_file = self.path
+        self.addCleanup(delattr, base, 'trace_file')
+        test_case = base.build_test_case(scenario)
+        result = unittest.TestResult()
+        unittest.TestLoader().loadTestsFromTestCase(test_case).run(result)
+        self.assertTrue(result.wasSuccessful(), result.errors)
+        trace.write()
+        with open(self.path.format(pid=os.getpid())) as trace_file:
+            events = json.load(trace_file)['traceEvents']
+        tracks = {event['tid']: event['args']['name'] for event in events
+                  if event['name'] == 'thread_name'}
+        return [(tracks[event['tid']], event['ph'], event['name'])
+                for event in events if event['ph'] != 'M']
+
+    def test_steps_should_be_traced(self):
+        events = self.run_and_load(BaseTestState, ('Start',))
+        self.assertEqual(events, [('steps MainThread', 'X',
+                                   'test.test_trace.BaseTestState:Start')])
+
+    def test_clients_and_servers_should_have_tracks(self):
+        events = self.run_and_load(BaseTestServer, ('Echo',))
+        self.assertIn(('client alice', 'X', 'send'), events)
+        self.assertIn(('server echo', 'i', 'stdout'), events)
+        self.assertIn(('server echo', 'X', 'process'), events)
+        self.assertIn(('steps MainThread', 'X', 'input'), events)
+        self.assertIn(('steps MainThread', 'X', 'test_echo'), events)
+        self.assertIn(('steps MainThread', 'X', 'wait stdout of echo'),
+                      events)
+
+    def test_replaced_tracer_should_be_written(self):
+        first = trace.enable(self.path.replace('trace-', 'first-'))
+        first.span('track', 'span', 1.0, 2.0)
+        trace.enable(self.path)
+        with open(first.path) as trace_file:
+            events = json.load(trace_file)['traceEvents']
+        self.assertEqual([event['name'] for event in events
+                          if event['ph'] == 'X'], ['span'])
@@ -0,0 +1,147 @@
+import io
+import socket
+import threading
+import time
+import unittest
+import unittest.mock
+
+from cricri import TestState
+from cricri.watchdog import Watchdog
+
+
+class BaseTestState(TestState):
+    step_timeout = 0.2
+
+    @classmethod
+    def start_scenario(cls):
+        cls.sockets = socket.socketpair()
+
+    @classmethod
+    def stop_scenario(cls):
+        for sock in cls.sockets:
+            sock.close()
+
+
+class Start(BaseTestState, start=True):
+    pass
+
+
+class Hang(BaseTestState, previous=['Start']):
+
+    def input(self):
+        self.sockets[0].recv(1)
+
+
+class HangCatchingErrors(BaseTestState, previous=['Start']):
+
+    def input(self):
+        try:
+            self.sockets[0].recv(1)
+        except Exception:
+            pass
+
+
+class HangInTest(BaseTestState, previous=['Start']):
+
+    def test_1_hang(self):
+        self.sockets[0].recv(1)
+
+    def test_2_not_run(self):
+        raise AssertionError('should not run')
+
+
+class Slow(BaseTestState, previous=['Start', 'Slow']):
+
+    def input(self):
+        time.sleep(0.15)
+
+
+class End(BaseTestState,
+          previous=['Hang', 'HangCatchingErrors', 'HangInTest', 'Slow']):
+    pass
+
+
+def run(test_case):
+    result = unittest.TestResult()
+    stderr = io.StringIO()
+    with unittest.mock.patch('sys.stderr', new=stderr):
+        unittest.TestLoader().loadTestsFromTestCase(test_case).run(result)
+    return result, stderr.getvalue()
+
+
+class TestStepTimeout(unittest.TestCase):
+
+    def test_hung_input_should_fail_and_skip_next_steps(self):
+        test_case = BaseTestState.build_test_case(('Start', 'Hang', 'End'))
+        start = time.monotonic()
+        result, stderr = run(test_case)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn('StepTimeout', result.errors[0][1])
+        self.assertEqual(len(result.skipped), 1)
+        self.assertIn('Timeout occurred in Hang.input', result.skipped[0][1])
+        self.assertTrue(test_case.__cricri_scenario__.failed)
+        self.assertIn('cricri: step test.test_watchdog.BaseTestState:Hang'
+                      ' timed out after 0.2s', stderr)
+        self.assertIn('Thread 0x', stderr)
+
+        result, _ = run(BaseTestState.build_test_case(('Start', 'End')))
+        self.assertTrue(result.wasSuccessful())
+
+    def test_timeout_should_not_be_caught_by_step(self):
+        result, _ = run(BaseTestState.build_test_case(
+            ('Start', 'HangCatchingErrors', 'End')))
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn('StepTimeout', result.errors[0][1])
+        self.assertEqual(len(result.skipped), 1)
+
+    def test_hung_test_method_should_stop_step(self):
+        test_case = BaseTestState.build_test_case(
+            ('Start', 'HangInTest', 'End'))
+        result, _ = run(test_case)
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn('test_1_hang', str(result.errors[0][0]))
+        self.assertEqual(len(result.skipped), 1)
+
+    def test_scenario_timeout(self):
+        test_case = BaseTestState.build_test_case(
+            ('Start', 'Slow', 'Slow', 'End'))
+        test_case.scenario_timeout = 0.2
+        result, stderr = run(test_case)
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn('slow  (3/4)', str(result.errors[0][0]))
+        self.assertIn('timed out after 0.2s in step', stderr)
+
+
+class TestWatchdog(unittest.TestCase):
+
+    def test_disarmed_deadline_should_not_fire(self):
+        watchdog = Watchdog()
+        called = threading.Event()
+        watchdog.arm(time.monotonic() + 0.05, called.set)
+        watchdog.disarm()
+        self.assertFalse(called.wait(0.2))
+
+    def test_threads_should_have_own_deadline(self):
+        watchdog = Watchdog()
+        called = threading.Event()
+        watchdog.arm(time.monotonic() + 0.1, called.set)
+        self.addCleanup(watchdog.disarm)
+        thread = threading.Thread(target=lambda: (
+            watchdog.arm(time.monotonic() + 10, called.set),
+            watchdog.disarm()))
+        thread.start()
+        thread.join()
+        with unittest.mock.patch('signal.pthread_kill') as pthread_kill:
+            self.assertTrue(called.wait(1))
+            time.sleep(0.05)
+        pthread_kill.assert_called_once()
+
+    def test_other_thread_should_only_call_function(self):
+        watchdog = Watchdog()
+        called = threading.Event()
+        thread = threading.Thread(target=watchdog.arm,
+                                  args=(time.monotonic() + 0.05, called.set))
+        thread.start()
+        thread.join()
+        self.assertTrue(called.wait(1))